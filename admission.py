@@ -0,0 +1,213 @@
+#!/usr/bin/env python3
+"""
+Admission
+Caps the model calls in flight per worker. Callers beyond the cap wait in
+a bounded FIFO queue, each with a deadline; a caller is turned away at
+once (Overloaded) when the queue is full or its deadline would pass
+before a slot frees up and the call completes, so overload sheds requests
+instead of slowing every one of them down.
+
+Usage:
+    with controller.admit():              # threads
+        reply = call_model()
+    async with controller.admit_async():  # asyncio tasks
+        reply = await call_model_async()
+
+Benchmark (queueing vs shedding under a burst):
+    python admission.py --requests 400
+"""
+
+import argparse
+import asyncio
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import asynccontextmanager, contextmanager
+
+
+class Overloaded(Exception):
+    """Raised instead of queueing a call that could not finish in time"""
+
+    def __init__(self, reason, retry_after):
+        super().__init__(f"Overloaded ({reason})")
+        self.reason = reason
+        self.retry_after = retry_after
+
+
+class _Waiter:
+    """A queued caller; granted once a finishing call hands it its slot"""
+
+    def __init__(self, wake):
+        self.wake = wake
+        self.granted = False
+
+
+class AdmissionController:
+    """In-flight cap with a bounded, deadline-aware wait queue"""
+
+    def __init__(self, max_in_flight=32, max_queue=64, deadline_seconds=30, window=1000):
+        self.max_in_flight = max_in_flight
+        self.max_queue = max_queue
+        self.deadline_seconds = deadline_seconds
+        self.in_flight = 0
+        self.admitted = 0
+        self.shed = {'queue_full': 0, 'deadline': 0, 'cancelled': 0}
+        self.service_seconds = None  # Moving average of how long a call holds its slot
+        self.waits = deque(maxlen=window)
+        self._queue = deque()
+        self._lock = threading.Lock()
+
+    def _expected_wait(self, position):
+        """Seconds until the caller at queue position gets a slot"""
+        service = self.service_seconds or 0
+        return (position // self.max_in_flight + 1) * service
+
+    def _enter(self, wake):
+        """Take a slot (None) or join the queue (a _Waiter); raise Overloaded if neither makes sense"""
+        with self._lock:
+            if self.in_flight < self.max_in_flight and not self._queue:
+                self.in_flight += 1
+                self.admitted += 1
+                self.waits.append(0)
+                return None
+
+            if len(self._queue) >= self.max_queue:
+                reason = 'queue_full'
+            elif self._expected_wait(len(self._queue)) + (self.service_seconds or 0) > self.deadline_seconds:
+                reason = 'deadline'
+            else:
+                waiter = _Waiter(wake)
+                self._queue.append(waiter)
+                return waiter
+            self.shed[reason] += 1
+            raise Overloaded(reason, self._expected_wait(len(self._queue)) or 1)
+
+    def _budget(self, started):
+        """Seconds a queued caller may still wait: its deadline minus the time its call will take"""
+        return started + self.deadline_seconds - (self.service_seconds or 0) - time.monotonic()
+
+    def _left_queue(self, waiter, started, reason='deadline'):
+        """After waking or timing out: True if waiter holds a slot, else it has been shed"""
+        with self._lock:
+            if waiter.granted:
+                self.admitted += 1
+                self.waits.append(time.monotonic() - started)
+                return True
+            self._queue.remove(waiter)
+            self.shed[reason] += 1
+            return False
+
+    def _release(self, held_since=None):
+        """Record the call's duration and hand its slot to the next queued caller"""
+        with self._lock:
+            if held_since is not None:
+                held = time.monotonic() - held_since
+                self.service_seconds = held if self.service_seconds is None else 0.9 * self.service_seconds + 0.1 * held
+            if self._queue:
+                waiter = self._queue.popleft()
+                waiter.granted = True
+                waiter.wake()
+            else:
+                self.in_flight -= 1
+
+    @contextmanager
+    def admit(self):
+        started = time.monotonic()
+        event = threading.Event()
+        waiter = self._enter(event.set)
+        if waiter is not None:
+            event.wait(max(0, self._budget(started)))
+            if not self._left_queue(waiter, started):
+                raise Overloaded('deadline', self._expected_wait(len(self._queue)) or 1)
+        held_since = time.monotonic()
+        try:
+            yield
+        finally:
+            self._release(held_since)
+
+    @asynccontextmanager
+    async def admit_async(self):
+        started = time.monotonic()
+        loop = asyncio.get_running_loop()
+        granted = loop.create_future()
+
+        def wake():
+            loop.call_soon_threadsafe(lambda: granted.done() or granted.set_result(None))
+
+        waiter = self._enter(wake)
+        if waiter is not None:
+            try:
+                await asyncio.wait_for(asyncio.shield(granted), max(0, self._budget(started)))
+            except asyncio.TimeoutError:
+                pass
+            except BaseException:
+                # Cancelled while queued: give back a slot it may just have been handed
+                if self._left_queue(waiter, started, 'cancelled'):
+                    self._release()
+                raise
+            if not self._left_queue(waiter, started):
+                raise Overloaded('deadline', self._expected_wait(len(self._queue)) or 1)
+        held_since = time.monotonic()
+        try:
+            yield
+        finally:
+            self._release(held_since)
+
+    def stats(self):
+        """Slots in use, queue depth, wait times (ms) and shed counts"""
+        with self._lock:
+            waits = sorted(self.waits)
+            pick = lambda percent: round(waits[min(len(waits) - 1, int(percent / 100 * len(waits)))] * 1000, 1)
+            return {
+                'in_flight': self.in_flight,
+                'max_in_flight': self.max_in_flight,
+                'queue_depth': len(self._queue),
+                'max_queue': self.max_queue,
+                'admitted': self.admitted,
+                'shed': dict(self.shed),
+                'wait_p50_ms': pick(50) if waits else None,
+                'wait_p95_ms': pick(95) if waits else None,
+                'service_ms': round(self.service_seconds * 1000, 1) if self.service_seconds is not None else None
+            }
+
+
+def benchmark(requests=400, rate=60, call_ms=200, max_in_flight=8, deadline_seconds=2):
+    """Arrivals faster than upstream capacity, with and without admission control"""
+    def run(controller):
+        def one(_):
+            start = time.monotonic()
+            try:
+                if controller:
+                    with controller.admit():
+                        time.sleep(call_ms / 1000)
+                else:
+                    with unlimited:
+                        time.sleep(call_ms / 1000)
+                return time.monotonic() - start, True
+            except Overloaded:
+                return time.monotonic() - start, False
+
+        with ThreadPoolExecutor(max_workers=requests) as pool:
+            futures = []
+            for i in range(requests):
+                futures.append(pool.submit(one, i))
+                time.sleep(1 / rate)
+            results = [future.result() for future in futures]
+        served = sorted(seconds for seconds, ok in results if ok)
+        pick = lambda percent: served[min(len(served) - 1, int(percent / 100 * len(served)))] * 1000
+        return f"served {len(served):4d}  p50 {pick(50):7.1f} ms  p99 {pick(99):7.1f} ms  shed {requests - len(served)}"
+
+    # Without admission control the same upstream capacity is a plain semaphore
+    unlimited = threading.BoundedSemaphore(max_in_flight)
+    capacity = max_in_flight * 1000 / call_ms
+    print(f"🚦 {requests} requests at {rate}/s, {call_ms} ms calls, {max_in_flight} upstream slots ({capacity:.0f}/s)")
+    print(f"   unbounded queue:  {run(None)}")
+    controller = AdmissionController(max_in_flight, max_queue=4 * max_in_flight, deadline_seconds=deadline_seconds)
+    print(f"   admission ({deadline_seconds}s):  {run(controller)}")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Benchmark the admission controller")
+    parser.add_argument('--requests', type=int, default=400)
+    benchmark(parser.parse_args().requests)
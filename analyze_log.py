@@ -2,41 +2,436 @@
 """
 Log Analysis Tool
 Analyzes interaction logs to find improvement opportunities
+
+Logs are read in a single streaming pass: each report section keeps a
+small accumulator, so memory stays flat however many logs there are.
 """
 
+import argparse
 import json
 import os
-from collections import Counter, defaultdict
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
 from datetime import datetime
 
+import config
+from columnar_analytics import InteractionColumns, parse_bucket
+from intents import INTENTS, intent_classifier
+from log_archive import ARCHIVE_SUFFIX, day_files
+from log_storage import SqliteStorage, usage_counts_sql
+from quantiles import QuantileSketch
+from usage_stats import add_usage_counts, empty_usage_counts, merge_usage_counts
+
 LOG_DIR = "logs"
+CHECKPOINT_PATH = os.path.join(LOG_DIR, "analysis_checkpoints.json")
 
-class LogAnalyzer:
+class BasicStats:
+    """Total and edited counts"""
+    
+    def __init__(self):
+        self.total = 0
+        self.edited = 0
+    
+    def add(self, interaction):
+        self.total += 1
+        if interaction.get('edited'):
+            self.edited += 1
+    
+    def merge(self, other):
+        self.total += other.total
+        self.edited += other.edited
+
+class EditPatterns:
+    """How edited replies differ from the AI reply"""
+    
+    def __init__(self):
+        self.edits = 0
+        self.edit_types = {}
+    
+    def add(self, interaction):
+        if not interaction.get('edited'):
+            return
+        
+        original = interaction.get('ai_reply', '')
+        edited = interaction.get('user_edit', '')
+        
+        # Analyze edit types
+        if len(edited) > len(original):
+            edit_type = 'Added content'
+        elif len(edited) < len(original):
+            edit_type = 'Shortened response'
+        else:
+            edit_type = 'Rephrased'
+        
+        self.edits += 1
+        self.edit_types[edit_type] = self.edit_types.get(edit_type, 0) + 1
+    
+    def merge(self, other):
+        self.edits += other.edits
+        for edit_type, count in other.edit_types.items():
+            self.edit_types[edit_type] = self.edit_types.get(edit_type, 0) + count
+
+class TonePerformance:
+    """Uses and edits per tone"""
+    
     def __init__(self):
-        self.interactions = []
+        self.tone_stats = {}
+    
+    def add(self, interaction):
+        tone = interaction.get('settings', {}).get('tone', 'unknown')
+        stats = self.tone_stats.setdefault(tone, {'total': 0, 'edited': 0})
+        stats['total'] += 1
+        if interaction.get('edited'):
+            stats['edited'] += 1
+    
+    def merge(self, other):
+        for tone, other_stats in other.tone_stats.items():
+            stats = self.tone_stats.setdefault(tone, {'total': 0, 'edited': 0})
+            stats['total'] += other_stats['total']
+            stats['edited'] += other_stats['edited']
+
+class CommonIssues:
+    """Messages mentioning each intent (see intents.py)"""
+    
+    def __init__(self):
+        self.keywords = Counter()
+    
+    def add(self, interaction):
+        # One scan finds every intent, in table order
+        for issue in intent_classifier.matched(interaction.get('customer_message', '')):
+            self.keywords[issue] += 1
+    
+    def merge(self, other):
+        # update() keeps first-seen order, so ties rank as in one serial pass
+        self.keywords.update(other.keywords)
+
+class IntentPerformance:
+    """Uses and edits per top intent and tone (feeds canned reply routing)"""
+    
+    def __init__(self):
+        self.intent_stats = {}
+    
+    def add(self, interaction):
+        intent = intent_classifier.top(interaction.get('customer_message', ''))
+        if intent is None:
+            return
+        tone = interaction.get('settings', {}).get('tone', 'unknown')
+        stats = self.intent_stats.setdefault(intent, {}).setdefault(tone, {'total': 0, 'edited': 0})
+        stats['total'] += 1
+        if interaction.get('edited'):
+            stats['edited'] += 1
+    
+    def merge(self, other):
+        for intent, other_tones in other.intent_stats.items():
+            tones = self.intent_stats.setdefault(intent, {})
+            for tone, other_stats in other_tones.items():
+                stats = tones.setdefault(tone, {'total': 0, 'edited': 0})
+                stats['total'] += other_stats['total']
+                stats['edited'] += other_stats['edited']
+
+class UsageStats:
+    """Model latency (sketches), tokens and cost, overall and per tone and industry"""
+    
+    def __init__(self):
+        self.counts = empty_usage_counts()
+    
+    def add(self, interaction):
+        add_usage_counts(self.counts, interaction)
+    
+    def merge(self, other):
+        merge_usage_counts(self.counts, other.counts)
+
+class Summary:
+    """Every section's accumulator, fed one interaction at a time"""
+    
+    def __init__(self):
+        self.basic = BasicStats()
+        self.edits = EditPatterns()
+        self.tones = TonePerformance()
+        self.issues = CommonIssues()
+        self.intents = IntentPerformance()
+        self.usage = UsageStats()
+    
+    def sections(self):
+        return (self.basic, self.edits, self.tones, self.issues, self.intents, self.usage)
+    
+    def add(self, interaction):
+        for section in self.sections():
+            section.add(interaction)
+    
+    def merge(self, other):
+        for section, other_section in zip(self.sections(), other.sections()):
+            section.merge(other_section)
+        return self
+    
+    def to_dict(self):
+        return {
+            'basic': vars(self.basic),
+            'edits': vars(self.edits),
+            'tones': vars(self.tones),
+            'issues': {'keywords': dict(self.issues.keywords)},
+            'intents': vars(self.intents),
+            'usage': vars(self.usage)
+        }
+    
+    @classmethod
+    def from_dict(cls, data):
+        summary = cls()
+        vars(summary.basic).update(data['basic'])
+        vars(summary.edits).update(data['edits'])
+        vars(summary.tones).update(data['tones'])
+        summary.issues.keywords = Counter(data['issues']['keywords'])
+        vars(summary.intents).update(data['intents'])
+        vars(summary.usage).update(data['usage'])
+        return summary
+
+def log_files(log_dir=LOG_DIR):
+    """Daily log file paths (JSONL or archived), oldest first"""
+    return sorted(day_files(log_dir))
+
+def iter_interactions(filepath, start=0, position=None):
+    """Stream parsed interactions from one log file, starting at byte offset start
+    
+    position['offset'] is kept at the end of the last complete line read.
+    An unterminated last line (a write still in progress) goes into
+    position['pending'] instead, so a later run reads it again in full.
+    """
+    position = position if position is not None else {}
+    position['offset'] = start
+    with open(filepath, 'rb') as f:
+        f.seek(start)
+        for line in f:
+            complete = line.endswith(b'\n')
+            if complete:
+                position['offset'] += len(line)
+            try:
+                interaction = json.loads(line)
+            except ValueError:
+                continue
+            if complete:
+                yield interaction
+            else:
+                position['pending'] = interaction
+
+def summarize_file(filepath, start=0):
+    """Partial summary for one day file from byte offset start (runs in a worker process)
+    
+    Returns the summary of complete lines, the offset after them and the
+    summary of an unterminated last line, which is counted but not cached.
+    """
+    if filepath.endswith(ARCHIVE_SUFFIX):
+        return summarize_archive(filepath), os.path.getsize(filepath), Summary()
+    
+    summary = Summary()
+    position = {}
+    for interaction in iter_interactions(filepath, start, position):
+        summary.add(interaction)
+    
+    pending = Summary()
+    if 'pending' in position:
+        pending.add(position['pending'])
+    return summary, position['offset'], pending
+
+def summary_from_columns(columns):
+    """Summary computed with vectorized operations over InteractionColumns"""
+    summary = Summary()
+    summary.basic.total = len(columns)
+    summary.basic.edited = int(columns.edited.sum())
+    summary.edits.edits = summary.basic.edited
+    summary.edits.edit_types = columns.edit_types()
+    summary.tones.tone_stats = columns.group_stats('tone')
+    summary.issues.keywords = Counter(columns.intent_hits(intent_classifier))
+    summary.intents.intent_stats = columns.intent_tone_stats(intent_classifier)
+    summary.usage.counts = columns.usage_counts()
+    return summary
+
+def summarize_archive(filepath):
+    """Summary of an archived day from its columns alone
+    
+    Only edited, reply lengths, tone/industry, usage and the distinct
+    customer messages are read. Groups are ordered by first appearance, as in the JSONL pass.
+    """
+    return summary_from_columns(InteractionColumns.from_files([filepath], timestamps=False))
+
+class FileCheckpoints:
+    """Per-file partial summaries saved with each file's size and mtime
+    
+    A rerun only reads files that are new or were rewritten, plus the
+    appended tail of files that grew (today's log).
+    """
+    
+    def __init__(self, path):
+        self.path = path
+        self.files = {}
+        try:
+            with open(path, 'r') as f:
+                saved = json.load(f)
+            # Issue counts are only reusable with the intent table they came from
+            if saved.get('version') == 3 and saved.get('intents') == json.dumps(INTENTS):
+                self.files = saved['files']
+        except (OSError, ValueError):
+            pass
+    
+    def start_for(self, filename, stat):
+        """Byte offset to resume from, or 0 when the file must be read again"""
+        checkpoint = self.files.get(filename)
+        if checkpoint is None or stat.st_size < checkpoint['size']:
+            return 0
+        # Logs are append-only: a grown file only needs its new tail
+        if stat.st_size > checkpoint['size'] or stat.st_mtime_ns == checkpoint['mtime']:
+            return checkpoint['offset']
+        return 0
+    
+    def cached_summary(self, filename, start):
+        if start == 0:
+            return Summary()
+        return Summary.from_dict(self.files[filename]['summary'])
+    
+    def update(self, filename, stat, offset, summary):
+        self.files[filename] = {
+            'size': stat.st_size,
+            'mtime': stat.st_mtime_ns,
+            'offset': offset,
+            'summary': summary.to_dict()
+        }
+    
+    def save(self, filenames):
+        """Write checkpoints for the files still present"""
+        self.files = {name: self.files[name] for name in filenames if name in self.files}
+        # Server workers refresh canned reply edit rates from the same file
+        tmp_path = f"{self.path}.{os.getpid()}.tmp"
+        with open(tmp_path, 'w') as f:
+            json.dump({'version': 3, 'intents': json.dumps(INTENTS), 'files': self.files}, f)
+        os.replace(tmp_path, self.path)
+
+def summarize_files(filepaths, workers=1, checkpoints=None):
+    """Summarize day files, optionally across a process pool and from checkpoints
+    
+    Per-file partials are merged in file order, so the result matches one
+    serial pass over the same files.
+    """
+    names = [os.path.basename(filepath) for filepath in filepaths]
+    stats = [os.stat(filepath) for filepath in filepaths]
+    if checkpoints:
+        starts = [checkpoints.start_for(name, stat) for name, stat in zip(names, stats)]
+    else:
+        starts = [0] * len(filepaths)
+    
+    todo = [i for i, (start, stat) in enumerate(zip(starts, stats)) if start < stat.st_size]
+    todo_paths = [filepaths[i] for i in todo]
+    todo_starts = [starts[i] for i in todo]
+    if workers > 1 and len(todo) > 1:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            results = dict(zip(todo, pool.map(summarize_file, todo_paths, todo_starts)))
+    else:
+        results = dict(zip(todo, map(summarize_file, todo_paths, todo_starts)))
+    
+    summary = Summary()
+    for i, name in enumerate(names):
+        partial = checkpoints.cached_summary(name, starts[i]) if checkpoints else Summary()
+        pending = Summary()
+        if i in results:
+            new_lines, offset, pending = results[i]
+            partial.merge(new_lines)
+            if checkpoints:
+                checkpoints.update(name, stats[i], offset, partial)
+        summary.merge(partial).merge(pending)
+    
+    if checkpoints:
+        checkpoints.save(names)
+    return summary
+
+def summarize_sql(storage):
+    """Same counts as summarize_files(), aggregated inside SQLite"""
+    storage.flush()
+    
+    with storage.connect() as conn:
+        row = conn.execute('SELECT COUNT(*), COALESCE(SUM(edited), 0) FROM interactions').fetchone()
+        edit_types = conn.execute("""
+            SELECT CASE
+                WHEN length(COALESCE(user_edit, '')) > length(COALESCE(ai_reply, '')) THEN 'Added content'
+                WHEN length(COALESCE(user_edit, '')) < length(COALESCE(ai_reply, '')) THEN 'Shortened response'
+                ELSE 'Rephrased'
+            END AS edit_type, COUNT(*)
+            FROM interactions WHERE edited = 1
+            GROUP BY edit_type ORDER BY MIN(id)
+        """).fetchall()
+        tone_rows = conn.execute(
+            'SELECT tone, COUNT(*), SUM(edited) FROM interactions GROUP BY tone ORDER BY MIN(id)'
+        ).fetchall()
+        # Intents (whole-word phrases, which instr() cannot match) are
+        # classified once per distinct message
+        message_rows = conn.execute(
+            'SELECT customer_message, tone, COUNT(*), SUM(edited) FROM interactions '
+            'GROUP BY customer_message, tone ORDER BY MIN(id)'
+        ).fetchall()
+        usage = usage_counts_sql(conn)
+    
+    summary = Summary()
+    summary.basic.total, summary.basic.edited = row[0], row[1]
+    summary.edits.edits = row[1]
+    summary.edits.edit_types = dict(edit_types)
+    summary.tones.tone_stats = {tone: {'total': total, 'edited': edited} for tone, total, edited in tone_rows}
+    issue_counts = Counter()
+    for message, tone, total, edited in message_rows:
+        for issue in intent_classifier.matched(message or ''):
+            issue_counts[issue] += total
+        intent = intent_classifier.top(message or '')
+        if intent is None:
+            continue
+        stats = summary.intents.intent_stats.setdefault(intent, {}).setdefault(tone, {'total': 0, 'edited': 0})
+        stats['total'] += total
+        stats['edited'] += edited
+    # In table order, as the other engines count them
+    summary.issues.keywords = Counter({
+        issue: issue_counts[issue] for issue, _ in INTENTS if issue_counts[issue]
+    })
+    summary.usage.counts = usage
+    return summary
+
+class LogAnalyzer:
+    def __init__(self, storage=None, workers=1, checkpoint_path=None, engine='loop', time_bucket=None):
+        self.storage = storage
+        self.workers = workers
+        self.checkpoint_path = checkpoint_path
+        self.engine = engine
+        self.time_bucket = time_bucket
+        self.summary = None
+        self.columns = None
         self.load_logs()
     
     def load_logs(self):
-        """Load all log files"""
-        if not os.path.exists(LOG_DIR):
+        """Stream all log files, or aggregate in SQL when given SQLite storage
+        
+        engine='numpy' loads the logs as columns and computes every section
+        with vectorized operations; time buckets also need the columns.
+        """
+        sqlite = isinstance(self.storage, SqliteStorage)
+        if not sqlite and not os.path.exists(LOG_DIR):
             print(f"❌ No logs directory found at {LOG_DIR}")
             return
         
-        for filename in os.listdir(LOG_DIR):
-            if filename.startswith('interactions_') and filename.endswith('.jsonl'):
-                filepath = os.path.join(LOG_DIR, filename)
-                with open(filepath, 'r') as f:
-                    for line in f:
-                        try:
-                            self.interactions.append(json.loads(line))
-                        except json.JSONDecodeError:
-                            continue
+        if self.engine == 'numpy' or self.time_bucket:
+            if sqlite:
+                self.storage.flush()
+                self.columns = InteractionColumns.from_records(self.storage.iter_interactions())
+            else:
+                self.columns = InteractionColumns.from_files(log_files())
         
-        print(f"📊 Loaded {len(self.interactions)} interactions")
+        if sqlite:
+            self.summary = summarize_sql(self.storage)
+            print(f"📊 Loaded {self.summary.basic.total} interactions from {self.storage.db_path}")
+        elif self.engine == 'numpy':
+            self.summary = summary_from_columns(self.columns)
+            print(f"📊 Loaded {self.summary.basic.total} interactions")
+        else:
+            checkpoints = FileCheckpoints(self.checkpoint_path) if self.checkpoint_path else None
+            self.summary = summarize_files(log_files(), self.workers, checkpoints)
+            print(f"📊 Loaded {self.summary.basic.total} interactions")
     
     def analyze(self):
         """Run full analysis"""
-        if not self.interactions:
+        if not self.summary or not self.summary.basic.total:
             print("No data to analyze yet. Generate some replies first!")
             return
         
@@ -47,13 +442,17 @@ class LogAnalyzer:
         self.basic_stats()
         self.edit_analysis()
         self.tone_performance()
+        if self.time_bucket:
+            self.edit_rate_over_time()
         self.common_issues()
+        self.intent_performance()
+        self.usage_performance()
         self.improvement_suggestions()
     
     def basic_stats(self):
         """Calculate basic statistics"""
-        total = len(self.interactions)
-        edited = sum(1 for i in self.interactions if i.get('edited'))
+        total = self.summary.basic.total
+        edited = self.summary.basic.edited
         accuracy = ((total - edited) / total * 100) if total > 0 else 0
         
         print("📊 BASIC STATISTICS")
@@ -68,29 +467,15 @@ class LogAnalyzer:
         print("✏️  EDIT PATTERNS")
         print("-" * 40)
         
-        edits = [i for i in self.interactions if i.get('edited')]
+        edits = self.summary.edits.edits
         
         if not edits:
             print("No edits yet - AI performing well!")
             print()
             return
         
-        edit_types = defaultdict(int)
-        
-        for interaction in edits:
-            original = interaction.get('ai_reply', '')
-            edited = interaction.get('user_edit', '')
-            
-            # Analyze edit types
-            if len(edited) > len(original):
-                edit_types['Added content'] += 1
-            elif len(edited) < len(original):
-                edit_types['Shortened response'] += 1
-            else:
-                edit_types['Rephrased'] += 1
-        
-        for edit_type, count in edit_types.items():
-            percentage = (count / len(edits)) * 100
+        for edit_type, count in self.summary.edits.edit_types.items():
+            percentage = (count / edits) * 100
             print(f"{edit_type}: {count} ({percentage:.1f}%)")
         
         print()
@@ -100,55 +485,89 @@ class LogAnalyzer:
         print("🎭 TONE PERFORMANCE")
         print("-" * 40)
         
-        tone_stats = defaultdict(lambda: {'total': 0, 'edited': 0})
-        
-        for interaction in self.interactions:
-            tone = interaction.get('settings', {}).get('tone', 'unknown')
-            tone_stats[tone]['total'] += 1
-            if interaction.get('edited'):
-                tone_stats[tone]['edited'] += 1
-        
-        for tone, stats in tone_stats.items():
+        for tone, stats in self.summary.tones.tone_stats.items():
             accuracy = ((stats['total'] - stats['edited']) / stats['total'] * 100) if stats['total'] > 0 else 0
             print(f"{tone.capitalize()}: {accuracy:.1f}% accuracy ({stats['total']} uses)")
         
         print()
     
+    def edit_rate_over_time(self):
+        """Edit rate per time bucket (e.g. hourly)"""
+        print(f"⏱️  EDIT RATE PER {self.time_bucket.upper()}")
+        print("-" * 40)
+        
+        for start, total, edited in self.columns.edit_rate_by(self.time_bucket):
+            label = start.astype('datetime64[s]').item().strftime('%Y-%m-%d %H:%M')
+            print(f"{label}: {edited / total * 100:5.1f}% edited ({total} replies)")
+        
+        print()
+    
     def common_issues(self):
         """Find common customer issues"""
         print("🔍 COMMON CUSTOMER ISSUES")
         print("-" * 40)
         
-        keywords = Counter()
-        
-        for interaction in self.interactions:
-            message = interaction.get('customer_message', '').lower()
-            
-            # Count issue keywords
-            if 'refund' in message or 'money back' in message:
-                keywords['refund_requests'] += 1
-            if 'shipping' in message or 'delivery' in message:
-                keywords['shipping_inquiries'] += 1
-            if 'not working' in message or 'broken' in message:
-                keywords['technical_issues'] += 1
-            if 'cancel' in message:
-                keywords['cancellations'] += 1
-            if 'help' in message or 'support' in message:
-                keywords['general_support'] += 1
-        
-        for issue, count in keywords.most_common(5):
-            percentage = (count / len(self.interactions)) * 100
+        for issue, count in self.summary.issues.keywords.most_common(5):
+            percentage = (count / self.summary.basic.total) * 100
             print(f"{issue.replace('_', ' ').title()}: {count} ({percentage:.1f}%)")
         
         print()
     
+    def intent_performance(self):
+        """Accuracy per top intent and tone - intents near 100% suit canned replies"""
+        print("🧭 INTENT PERFORMANCE")
+        print("-" * 40)
+        
+        for intent, tones in self.summary.intents.intent_stats.items():
+            for tone, stats in tones.items():
+                accuracy = (stats['total'] - stats['edited']) / stats['total'] * 100
+                print(f"{intent.replace('_', ' ').title()} ({tone}): {accuracy:.1f}% accuracy ({stats['total']} uses)")
+        
+        print()
+    
+    def usage_performance(self):
+        """Upstream latency percentiles and cost of model calls, per tone and industry"""
+        print("💰 MODEL LATENCY AND COST")
+        print("-" * 40)
+        
+        counts = self.summary.usage.counts
+        if not counts['overall']['requests']:
+            print("No model calls logged yet (demo, cached and canned replies have none)")
+            print()
+            return
+        
+        def line(label, group):
+            latency = QuantileSketch(group['latency_ms'])
+            cost = group['cost_micro_usd'] / 1e6
+            if latency.count:
+                p = latency.percentiles()
+                timing = f"p50 {p['p50']:.0f} ms, p95 {p['p95']:.0f} ms, p99 {p['p99']:.0f} ms"
+            else:
+                timing = "no latency (batch jobs only)"
+            return f"{label}: {timing}, ${cost:.4f} (${cost / group['requests']:.5f}/call, {group['requests']} calls)"
+        
+        print(line("All calls", counts['overall']))
+        ttft = QuantileSketch(counts['overall']['ttft_ms'])
+        if ttft.count:
+            first = ttft.percentiles()
+            print(f"Time to first token (streamed): p50 {first['p50']:.0f} ms, p95 {first['p95']:.0f} ms, "
+                  f"p99 {first['p99']:.0f} ms")
+        overall = counts['overall']
+        print(f"Tokens: {overall['input_tokens']} in ({overall['cached_tokens']} cached), {overall['output_tokens']} out")
+        for key, title in (('by_tone', 'tone'), ('by_industry', 'industry')):
+            for value, group in counts[key].items():
+                if group['requests'] > 0:
+                    print(line(f"{value.capitalize()} ({title})", group))
+        
+        print()
+    
     def improvement_suggestions(self):
         """Provide actionable improvement suggestions"""
         print("💡 IMPROVEMENT SUGGESTIONS")
         print("-" * 40)
         
-        total = len(self.interactions)
-        edited = sum(1 for i in self.interactions if i.get('edited'))
+        total = self.summary.basic.total
+        edited = self.summary.basic.edited
         
         if total < 10:
             print("• Collect more data (at least 50 interactions recommended)")
@@ -166,11 +585,39 @@ class LogAnalyzer:
         print()
 
 def main():
-    analyzer = LogAnalyzer()
+    parser = argparse.ArgumentParser(description="Analyze interaction logs")
+    parser.add_argument('--backend', choices=['jsonl', 'sqlite'], default=config.LOG_BACKEND,
+                        help="Where the logs live (default: config.LOG_BACKEND)")
+    parser.add_argument('--db', default=config.LOG_DB_PATH, help="SQLite file for --backend sqlite")
+    parser.add_argument('--workers', type=int, default=1,
+                        help="Processes for JSONL day files (default: 1, serial)")
+    parser.add_argument('--checkpoints', default=CHECKPOINT_PATH,
+                        help="Per-file partial results reused by the next run")
+    parser.add_argument('--full', action='store_true', help="Discard checkpoints and reread every file")
+    parser.add_argument('--engine', choices=['loop', 'numpy'], default='loop',
+                        help="numpy computes every section on columnar arrays (ignores --workers/--checkpoints)")
+    parser.add_argument('--time-bucket', help="Also report edit rate per time bucket, e.g. 1h, 15m, 1d")
+    args = parser.parse_args()
+    
+    if args.time_bucket:
+        try:
+            parse_bucket(args.time_bucket)
+        except ValueError as e:
+            parser.error(str(e))
+    
+    if args.full and os.path.exists(args.checkpoints):
+        os.remove(args.checkpoints)
+    
+    storage = SqliteStorage(args.db) if args.backend == 'sqlite' else None
+    analyzer = LogAnalyzer(storage, workers=args.workers, checkpoint_path=args.checkpoints,
+                           engine=args.engine, time_bucket=args.time_bucket)
     analyzer.analyze()
     
     print("="*60)
-    print("💾 Log files location: ./logs/")
+    if storage:
+        print(f"💾 Log database: {args.db}")
+    else:
+        print("💾 Log files location: ./logs/")
     print("📝 Tip: Use this data to improve your prompts!")
     print("="*60)
 
@@ -3,7 +3,9 @@ from flask_cors import CORS
 from datetime import datetime
 import json
 import os
-import re
+from intents import DEFAULT_DEMO_RESPONSE, DEMO_RESPONSES, intent_classifier
+from prompt_registry import PromptRegistry
+from sanitizer import Sanitizer
 
 app = Flask(__name__)
 CORS(app)
@@ -17,56 +19,18 @@ class AIAssistant:
     """Core AI assistant with prompt engineering and safety controls"""
     
     def __init__(self):
-        self.system_prompt = self._build_system_prompt()
+        self.prompts = PromptRegistry("prompts/support_v1.txt")
         self.max_input_length = 2000
+        self.sanitizer = Sanitizer(max_length=self.max_input_length)
         self.max_output_length = 1000
     
     def _build_system_prompt(self, tone="professional", industry="general"):
-        """The competitive advantage - your unique AI personality"""
-        return f"""You are a skilled customer support assistant for {industry} business.
-
-Core Principles:
-- Tone: {tone}, friendly, and empathetic
-- Goal: Solve the customer's problem quickly and effectively
-- Style: Clear, concise, human (never robotic)
-- Length: Keep responses short but complete (2-4 sentences ideal)
-
-Rules:
-1. Always acknowledge the customer's concern first
-2. Provide a clear solution or next step
-3. End with helpfulness, not just closing
-4. Never use corporate jargon or templates
-5. Sound like a real person who cares
-
-If you cannot solve the issue, escalate politely and explain why.
-Never make promises the business cannot keep."""
+        """The competitive advantage - your unique AI personality (see prompts/)"""
+        return self.prompts.render(tone, industry).text
 
     def clean_input(self, message):
-        """Sanitize and validate user input"""
-        if not message:
-            raise ValueError("Message cannot be empty")
-        
-        # Remove excessive whitespace
-        cleaned = re.sub(r'\s+', ' ', message.strip())
-        
-        # Enforce length limits
-        if len(cleaned) > self.max_input_length:
-            cleaned = cleaned[:self.max_input_length] + "..."
-        
-        # Basic safety checks
-        if self._contains_unsafe_content(cleaned):
-            raise ValueError("Message contains inappropriate content")
-        
-        return cleaned
-    
-    def _contains_unsafe_content(self, text):
-        """Simple content filter - expand based on your needs"""
-        unsafe_patterns = [
-            r'<script',
-            r'javascript:',
-            r'onerror=',
-        ]
-        return any(re.search(pattern, text, re.IGNORECASE) for pattern in unsafe_patterns)
+        """Sanitize and validate user input (see sanitizer.py)"""
+        return self.sanitizer.clean(message)
     
     def generate_reply(self, customer_message, business_name="our team", settings=None):
         """Generate AI reply with full context"""
@@ -81,7 +45,8 @@ Never make promises the business cannot keep."""
         add_signature = settings.get('add_signature', True)
         
         # Update system prompt based on settings
-        system_prompt = self._build_system_prompt(tone, industry)
+        prompt = self.prompts.render(tone, industry)
+        system_prompt = prompt.text
         
         # Simulate AI call (replace with actual API call)
         ai_response = self._call_ai_api(system_prompt, cleaned_message)
@@ -97,7 +62,8 @@ Never make promises the business cannot keep."""
             'reply': formatted_response,
             'original_message': customer_message,
             'cleaned_message': cleaned_message,
-            'settings_used': settings
+            'settings_used': settings,
+            'prompt_version': prompt.version
         }
     
     def _call_ai_api(self, system_prompt, message):
@@ -110,22 +76,7 @@ Never make promises the business cannot keep."""
     
     def _generate_demo_response(self, message):
         """Demo response generator - replace with real AI"""
-        message_lower = message.lower()
-        
-        if 'refund' in message_lower or 'money back' in message_lower:
-            return "I understand you're looking for a refund. I'd be happy to help you with that. Could you please provide your order number so I can process this right away?"
-        
-        elif 'shipping' in message_lower or 'delivery' in message_lower:
-            return "Thanks for reaching out about your delivery. I've checked your order and it's currently on its way. You should receive it within 2-3 business days. I'll send you a tracking link right now."
-        
-        elif 'not working' in message_lower or 'broken' in message_lower or 'issue' in message_lower:
-            return "I'm sorry to hear you're experiencing issues. Let's get this fixed for you right away. Can you tell me exactly what's happening when you try to use it? This will help me find the best solution."
-        
-        elif 'cancel' in message_lower:
-            return "I can help you with that cancellation. Just to confirm, which subscription or order would you like to cancel? I'll process it immediately once you let me know."
-        
-        else:
-            return "Thank you for contacting us! I'm here to help. Could you provide a bit more detail about what you need? That way, I can give you the most accurate assistance."
+        return DEMO_RESPONSES.get(intent_classifier.top(message), DEFAULT_DEMO_RESPONSE)
     
     def _format_response(self, ai_response, business_name, add_signature):
         """Polish the AI output"""
@@ -146,7 +97,7 @@ class Logger:
     """Logging system for continuous improvement"""
     
     @staticmethod
-    def log_interaction(customer_message, ai_reply, settings, user_edit=None):
+    def log_interaction(customer_message, ai_reply, settings, user_edit=None, prompt_version=None):
         """Save interaction for analysis and training"""
         timestamp = datetime.now().isoformat()
         
@@ -156,7 +107,8 @@ class Logger:
             'ai_reply': ai_reply,
             'settings': settings,
             'user_edit': user_edit,
-            'edited': user_edit is not None
+            'edited': user_edit is not None,
+            'prompt_version': prompt_version
         }
         
         # Save to daily log file
@@ -200,7 +152,8 @@ def generate_reply():
         Logger.log_interaction(
             customer_message=customer_message,
             ai_reply=result['reply'],
-            settings=settings
+            settings=settings,
+            prompt_version=result['prompt_version']
         )
         
         return jsonify({
@@ -208,7 +161,8 @@ def generate_reply():
             'reply': result['reply'],
             'metadata': {
                 'cleaned_message': result['cleaned_message'],
-                'settings_used': result['settings_used']
+                'settings_used': result['settings_used'],
+                'prompt_version': result['prompt_version']
             }
         })
     
@@ -239,7 +193,8 @@ def submit_feedback():
             customer_message=customer_message,
             ai_reply=original_reply,
             settings={},
-            user_edit=edited_reply
+            user_edit=edited_reply,
+            prompt_version=data.get('prompt_version')
         )
         
         return jsonify({
@@ -0,0 +1,314 @@
+"""
+Async Server
+ASGI entry point serving the production routes on one event loop per process.
+Generations await the shared AsyncAnthropic client, so a worker is not tied
+up for the model round-trip and can hold hundreds of requests in flight.
+
+Run with: hypercorn app_async:app --workers 4 --bind 0.0.0.0:5000
+"""
+
+import json
+import time
+
+from quart import Quart, Response, request, jsonify, render_template
+
+import app_production
+import config
+from admission import Overloaded
+from app_production import assistant
+from server_common import (
+    Logger, batch_result_line, metrics, overloaded, parse_batch, rate_limit_wait, rate_limited, rate_limiter, sse_event
+)
+
+app = Quart(__name__)
+
+@app.after_request
+async def add_cors_headers(response):
+    """Same open CORS policy as flask_cors.CORS(app) in the Flask apps"""
+    response.headers['Access-Control-Allow-Origin'] = '*'
+    response.headers['Access-Control-Allow-Headers'] = 'Content-Type'
+    response.headers['Access-Control-Allow-Methods'] = 'GET, POST, OPTIONS'
+    return response
+
+@app.after_serving
+async def close_async_client():
+    """Close the pooled connections when the worker shuts down"""
+    if app_production.async_anthropic_client:
+        await app_production.async_anthropic_client.close()
+
+# API Routes - same paths and JSON shapes as app_production.py
+
+@app.route('/')
+async def index():
+    """Serve the main UI"""
+    return await render_template('index.html')
+
+@app.route('/api/generate-reply', methods=['POST'])
+async def generate_reply():
+    """Main endpoint for generating customer support replies"""
+    try:
+        start_time = time.perf_counter()
+        data = await request.get_json()
+
+        customer_message = data.get('message', '')
+        business_name = data.get('business_name', 'Our Support Team')
+        settings = {
+            'tone': data.get('tone', 'professional'),
+            'industry': data.get('industry', 'general business'),
+            'add_signature': data.get('add_signature', True)
+        }
+        use_cache = not data.get('bypass_cache', False)
+
+        wait = rate_limit_wait(request, customer_message)
+        if wait:
+            return rate_limited(wait)
+
+        result = await assistant.generate_reply_async(customer_message, business_name, settings, use_cache)
+
+        Logger.log_interaction(
+            customer_message=customer_message,
+            ai_reply=result['reply'],
+            settings=settings,
+            routing=result['routing'],
+            prompt_version=result['prompt_version'],
+            usage=result['usage']
+        )
+        metrics.observe('generate_reply.total', time.perf_counter() - start_time)
+
+        return jsonify({
+            'success': True,
+            'reply': result['reply'],
+            'metadata': {
+                'cleaned_message': result['cleaned_message'],
+                'settings_used': result['settings_used'],
+                'cached': result['cached'],
+                'intent': result['intent'],
+                'prompt_version': result['prompt_version']
+            }
+        })
+
+    except ValueError as e:
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 400
+
+    except Overloaded as e:
+        return overloaded(e)
+
+    except Exception as e:
+        return jsonify({
+            'success': False,
+            'error': 'An unexpected error occurred'
+        }), 500
+
+@app.route('/api/generate-reply/stream', methods=['POST'])
+async def generate_reply_stream():
+    """Streaming variant of /api/generate-reply using Server-Sent Events"""
+    try:
+        start_time = time.perf_counter()
+        data = await request.get_json()
+
+        customer_message = data.get('message', '')
+        business_name = data.get('business_name', 'Our Support Team')
+        settings = {
+            'tone': data.get('tone', 'professional'),
+            'industry': data.get('industry', 'general business'),
+            'add_signature': data.get('add_signature', True)
+        }
+        use_cache = not data.get('bypass_cache', False)
+
+        wait = rate_limit_wait(request, customer_message)
+        if wait:
+            return rate_limited(wait)
+
+        # Pull the first event here so validation errors still return a 400
+        stream = assistant.stream_reply_async(customer_message, business_name, settings, use_cache)
+        first_event = await stream.__anext__()
+        metrics.observe('generate_reply_stream.ttft', time.perf_counter() - start_time)
+
+    except ValueError as e:
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 400
+
+    except Overloaded as e:
+        return overloaded(e)
+
+    except Exception as e:
+        return jsonify({
+            'success': False,
+            'error': 'An unexpected error occurred'
+        }), 500
+
+    async def remaining_events():
+        yield first_event
+        async for event in stream:
+            yield event
+
+    async def events():
+        try:
+            async for event, payload in remaining_events():
+                if event == 'chunk':
+                    yield sse_event('chunk', {'text': payload})
+                    continue
+
+                Logger.log_interaction(
+                    customer_message=customer_message,
+                    ai_reply=payload['reply'],
+                    settings=settings,
+                    routing=payload['routing'],
+                    prompt_version=payload['prompt_version'],
+                    usage=payload['usage']
+                )
+                metrics.observe('generate_reply_stream.total', time.perf_counter() - start_time)
+
+                yield sse_event('done', {
+                    'success': True,
+                    'reply': payload['reply'],
+                    'metadata': {
+                        'cleaned_message': payload['cleaned_message'],
+                        'settings_used': payload['settings_used'],
+                        'cached': payload['cached'],
+                        'intent': payload['intent'],
+                        'prompt_version': payload['prompt_version']
+                    }
+                })
+
+        except Exception as e:
+            print(f"Stream Error: {e}")
+            yield sse_event('error', {
+                'success': False,
+                'error': 'An unexpected error occurred'
+            })
+
+    response = Response(
+        events(),
+        mimetype='text/event-stream',
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+    )
+    response.timeout = None
+    return response
+
+@app.route('/api/generate-replies', methods=['POST'])
+async def generate_replies():
+    """Batch endpoint - streams one NDJSON line per message as each finishes"""
+    try:
+        data = await request.get_json()
+        items = parse_batch(data)
+
+    except ValueError as e:
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 400
+
+    # The whole batch is charged up front: one request per message
+    wait = rate_limit_wait(request, *(item['message'] for item in items))
+    if wait:
+        return rate_limited(wait)
+
+    async def results():
+        log_entries = []
+        succeeded = 0
+        try:
+            async for index, result, error in assistant.generate_replies_async(items, config.BATCH_CONCURRENCY):
+                item = items[index]
+                if error is None:
+                    succeeded += 1
+                    log_entries.append(Logger.build_entry(
+                        customer_message=item['message'],
+                        ai_reply=result['reply'],
+                        settings=item['settings'],
+                        routing=result['routing'],
+                        prompt_version=result['prompt_version'],
+                        usage=result['usage']
+                    ))
+                yield batch_result_line(item, index, result, error)
+
+            yield json.dumps({
+                'done': True,
+                'total': len(items),
+                'succeeded': succeeded,
+                'failed': len(items) - succeeded
+            }) + '\n'
+        finally:
+            Logger.log_interactions(log_entries)
+
+    response = Response(results(), mimetype='application/x-ndjson')
+    response.timeout = None
+    return response
+
+@app.route('/api/feedback', methods=['POST'])
+async def submit_feedback():
+    """Endpoint for user edits - critical for improvement loop"""
+    try:
+        data = await request.get_json()
+
+        original_reply = data.get('original_reply', '')
+        edited_reply = data.get('edited_reply', '')
+        customer_message = data.get('customer_message', '')
+
+        # Tone and industry attribute the edit for per-intent edit rates
+        settings = {key: data[key] for key in ('tone', 'industry') if key in data}
+
+        Logger.log_interaction(
+            customer_message=customer_message,
+            ai_reply=original_reply,
+            settings=settings,
+            user_edit=edited_reply,
+            prompt_version=data.get('prompt_version')
+        )
+
+        return jsonify({
+            'success': True,
+            'message': 'Feedback recorded'
+        })
+
+    except Exception as e:
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 500
+
+@app.route('/api/stats', methods=['GET'])
+async def get_stats():
+    """Analytics endpoint - track usage and quality"""
+    try:
+        stats = Logger.get_stats()
+        stats['reply_cache'] = assistant.reply_cache.stats()
+        stats['semantic_cache'] = assistant.semantic_cache.stats() if assistant.semantic_cache else None
+        stats['canned_replies'] = assistant.canned_replies.stats() if assistant.canned_replies else None
+        stats['single_flight'] = assistant.single_flight.stats() if assistant.single_flight else None
+        stats['providers'] = assistant.providers.stats()
+        stats['prompts'] = assistant.prompts.stats()
+        stats['prompt_cache'] = assistant.prompt_cache.stats(assistant.prompts.prefix_tokens)
+        stats['rate_limit'] = rate_limiter.stats() if rate_limiter else None
+        stats['admission'] = assistant.admission_async.stats() if assistant.admission_async else None
+
+        return jsonify({
+            'success': True,
+            'stats': stats
+        })
+
+    except Exception as e:
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 500
+
+@app.route('/api/metrics', methods=['GET'])
+async def get_metrics():
+    """Latency and counter metrics for this worker"""
+    return jsonify({
+        'success': True,
+        'metrics': metrics.snapshot()
+    })
+
+if __name__ == '__main__':
+    print("🚀 AI Customer Support Assistant (async) Starting...")
+    print("📍 Server running at http://localhost:5000")
+    print("📊 Logs directory: ./logs")
+
+    app.run(host='0.0.0.0', port=5000)
@@ -1,187 +1,242 @@
-from flask import Flask, request, jsonify, render_template
+from flask import Flask, Response, request, jsonify, render_template, stream_with_context
 from flask_cors import CORS
-from datetime import datetime
+import asyncio
+import itertools
 import json
 import os
-import re
-from anthropic import Anthropic
+import time
+import config
+from admission import Overloaded
+from providers import ClaudeProvider, PromptCacheStats, ProviderRouter, build_providers
+from server_common import (
+    BaseAssistant, DemoMode, Logger, batch_result_line, metrics, overloaded, parse_batch, rate_limit_wait, rate_limited,
+    rate_limiter, sse_event
+)
+from single_flight import SingleFlight
+import httpx
+from anthropic import Anthropic, AsyncAnthropic
 
 app = Flask(__name__)
 CORS(app)
 
-# Configuration
-LOG_DIR = "logs"
-os.makedirs(LOG_DIR, exist_ok=True)
-
 # Initialize Anthropic client
 # Set your API key in environment variable: export ANTHROPIC_API_KEY='your-key'
 anthropic_client = None
 if os.environ.get('ANTHROPIC_API_KEY'):
     anthropic_client = Anthropic(api_key=os.environ.get('ANTHROPIC_API_KEY'))
 
-class AIAssistant:
+# Async client for app_async.py, created lazily so each worker process
+# (after gunicorn/hypercorn fork) gets its own keep-alive connection pool
+async_anthropic_client = None
+
+def get_async_anthropic_client():
+    """Shared AsyncAnthropic client for this process, or None in demo mode"""
+    global async_anthropic_client
+    if async_anthropic_client is None and os.environ.get('ANTHROPIC_API_KEY'):
+        async_anthropic_client = AsyncAnthropic(
+            api_key=os.environ.get('ANTHROPIC_API_KEY'),
+            timeout=config.ASYNC_REQUEST_TIMEOUT_SECONDS,
+            max_retries=0,  # Retried by the provider router, behind its circuit breaker
+            http_client=httpx.AsyncClient(
+                limits=httpx.Limits(
+                    max_connections=config.ASYNC_MAX_CONNECTIONS,
+                    max_keepalive_connections=config.ASYNC_MAX_KEEPALIVE_CONNECTIONS,
+                    keepalive_expiry=config.ASYNC_KEEPALIVE_EXPIRY_SECONDS
+                ),
+                timeout=config.ASYNC_REQUEST_TIMEOUT_SECONDS
+            )
+        )
+    return async_anthropic_client
+
+class AIAssistant(BaseAssistant):
     """Production AI assistant with real Claude integration"""
     
     def __init__(self):
-        self.max_input_length = 2000
-        self.max_output_length = 1000
         self.model = "claude-sonnet-4-5-20250929"
+        super().__init__()
+        self.prompt_cache = PromptCacheStats()
+        self.providers = ProviderRouter.from_config(
+            build_providers(
+                config.PROVIDERS or ['claude'],
+                claude=ClaudeProvider(anthropic_client, self._request_params, on_usage=self.prompt_cache.record)
+            )
+        )
     
-    def _build_system_prompt(self, tone="professional", industry="general"):
-        """The competitive advantage - your unique AI personality"""
-        return f"""You are a skilled customer support assistant for {industry} business.
-
-Core Principles:
-- Tone: {tone}, friendly, and empathetic
-- Goal: Solve the customer's problem quickly and effectively
-- Style: Clear, concise, human (never robotic)
-- Length: Keep responses short but complete (2-4 sentences ideal)
-
-Rules:
-1. Always acknowledge the customer's concern first
-2. Provide a clear solution or next step
-3. End with helpfulness, not just closing
-4. Never use corporate jargon or templates
-5. Sound like a real person who cares
-
-If you cannot solve the issue, escalate politely and explain why.
-Never make promises the business cannot keep."""
-
-    def clean_input(self, message):
-        """Sanitize and validate user input"""
-        if not message:
-            raise ValueError("Message cannot be empty")
-        
-        cleaned = re.sub(r'\s+', ' ', message.strip())
-        
-        if len(cleaned) > self.max_input_length:
-            cleaned = cleaned[:self.max_input_length] + "..."
-        
-        if self._contains_unsafe_content(cleaned):
-            raise ValueError("Message contains inappropriate content")
+    async def generate_reply_async(self, customer_message, business_name="our team", settings=None, use_cache=True):
+        """Async generate_reply for the ASGI server - same result shape"""
+        cleaned_message = self.clean_input(customer_message)
         
-        return cleaned
+        return await self._reply_for_cleaned_async(customer_message, cleaned_message, business_name, settings, use_cache)
     
-    def _contains_unsafe_content(self, text):
-        """Basic content filter"""
-        unsafe_patterns = [
-            r'<script',
-            r'javascript:',
-            r'onerror=',
-        ]
-        return any(re.search(pattern, text, re.IGNORECASE) for pattern in unsafe_patterns)
+    async def generate_replies_async(self, items, max_concurrency=8):
+        """Async generate_replies - yields (index, result, error) as each finishes"""
+        pending = []
+        for index, item in enumerate(items):
+            try:
+                pending.append((index, item, self.clean_input(item['message'])))
+            except ValueError as e:
+                yield index, None, str(e)
+        
+        semaphore = asyncio.Semaphore(max_concurrency)
+        
+        async def run(index, item, cleaned_message):
+            async with semaphore:
+                try:
+                    result = await self._reply_for_cleaned_async(
+                        item['message'],
+                        cleaned_message,
+                        item['business_name'],
+                        item['settings'],
+                        item['use_cache']
+                    )
+                    return index, result, None
+                except Overloaded:
+                    return index, None, 'The service is busy. Please try again shortly.'
+                except Exception as e:
+                    print(f"Batch item error: {e}")
+                    return index, None, 'An unexpected error occurred'
+        
+        tasks = [asyncio.ensure_future(run(*entry)) for entry in pending]
+        try:
+            for next_done in asyncio.as_completed(tasks):
+                yield await next_done
+        finally:
+            # Stop queued work if the client goes away mid-batch
+            for task in tasks:
+                task.cancel()
     
-    def generate_reply(self, customer_message, business_name="our team", settings=None):
-        """Generate AI reply using Claude API"""
-        settings = settings or {}
-        
+    async def _reply_for_cleaned_async(self, customer_message, cleaned_message, business_name, settings, use_cache):
+        """Async _reply_for_cleaned"""
+        reply = self._prepare(cleaned_message, settings, use_cache)
+        
+        if reply.ai_response is None:
+            try:
+                ai_response = await self._call_model_async_coalesced(reply.prompt.text, cleaned_message, reply.usage)
+                self._model_replied(reply, ai_response)
+            except Exception as e:
+                self._model_failed(reply, e)
+        
+        return self._result(reply, customer_message, business_name)
+    
+    async def stream_reply_async(self, customer_message, business_name="our team", settings=None, use_cache=True):
+        """Async stream_reply for the ASGI server - same events"""
         cleaned_message = self.clean_input(customer_message)
+        reply = self._prepare(cleaned_message, settings, use_cache)
         
-        tone = settings.get('tone', 'professional')
-        industry = settings.get('industry', 'general business')
-        add_signature = settings.get('add_signature', True)
-        
-        system_prompt = self._build_system_prompt(tone, industry)
-        
-        # Call real AI API
-        ai_response = self._call_claude_api(system_prompt, cleaned_message)
-        
-        # Format response
-        formatted_response = self._format_response(
-            ai_response, 
-            business_name, 
-            add_signature
-        )
-        
-        return {
-            'reply': formatted_response,
-            'original_message': customer_message,
-            'cleaned_message': cleaned_message,
-            'settings_used': settings
-        }
+        if reply.ai_response is not None:
+            yield 'chunk', reply.ai_response
+        else:
+            chunks = []
+            try:
+                async for chunk in self._stream_model_async(reply.prompt.text, cleaned_message, reply.usage):
+                    chunks.append(chunk)
+                    yield 'chunk', chunk
+                self._model_replied(reply, ''.join(chunks))
+            except Exception as e:
+                self._model_failed(reply, e, ''.join(chunks))
+                if not chunks:
+                    yield 'chunk', reply.ai_response
+        
+        yield 'done', self._result(reply, customer_message, business_name)
     
-    def _call_claude_api(self, system_prompt, message):
-        """Real Claude AI integration"""
-        if not anthropic_client:
-            print("⚠️ WARNING: Using DEMO responses (no API client)")
-            return self._generate_demo_response(message)
-        
-        print(" Calling Claude API...")
-        
-        try:
-            response = anthropic_client.messages.create(
-                model=self.model,
-                max_tokens=self.max_output_length,
-                system=system_prompt,
-                messages=[
-                    {
-                        "role": "user",
-                        "content": f"Customer message: {message}\n\nPlease provide a helpful customer support reply."
-                    }
-                ]
-            )
-            
-            return response.content[0].text
-        
-        except Exception as e:
-            print(f"API Error: {e}")
-            return self._generate_demo_response(message)
+    async def _call_model_async_coalesced(self, system_prompt, message, usage=None):
+        """_call_model_async, shared by identical concurrent requests in this event loop"""
+        if not self.single_flight:
+            return await self._call_model_async(system_prompt, message, usage)
+        key = SingleFlight.make_key(self.model, system_prompt, message)
+        return await self.single_flight.do_async(key, lambda: self._call_model_async(system_prompt, message, usage))
     
-    def _generate_demo_response(self, message):
-        """Demo fallback when API unavailable"""
-        message_lower = message.lower()
-        
-        if 'refund' in message_lower or 'money back' in message_lower:
-            return "I understand you're looking for a refund. I'd be happy to help you with that. Could you please provide your order number so I can process this right away?"
-        
-        elif 'shipping' in message_lower or 'delivery' in message_lower:
-            return "Thanks for reaching out about your delivery. I've checked your order and it's currently on its way. You should receive it within 2-3 business days. I'll send you a tracking link right now."
+    def _call_model(self, system_prompt, message, usage=None):
+        """Model call through the provider router (Claude unless config.PROVIDERS adds others) - raises on API errors"""
+        if not self.providers.providers:
+            raise DemoMode("no API client")
         
-        elif 'not working' in message_lower or 'broken' in message_lower or 'issue' in message_lower:
-            return "I'm sorry to hear you're experiencing issues. Let's get this fixed for you right away. Can you tell me exactly what's happening when you try to use it? This will help me find the best solution."
+        print(" Calling model API...")
         
-        elif 'cancel' in message_lower:
-            return "I can help you with that cancellation. Just to confirm, which subscription or order would you like to cancel? I'll process it immediately once you let me know."
-        
-        else:
-            return "Thank you for contacting us! I'm here to help. Could you provide a bit more detail about what you need? That way, I can give you the most accurate assistance."
+        with self._admitted():
+            return self.providers.generate(system_prompt, message, usage)
     
-    def _format_response(self, ai_response, business_name, add_signature):
-        """Polish the AI output"""
-        formatted = ai_response.strip()
+    def _stream_model(self, system_prompt, message, usage=None):
+        """Yield reply text from the provider router's stream (Claude unless config.PROVIDERS adds others) - raises on API errors"""
+        if not self.providers.providers:
+            raise DemoMode("no API client")
         
-        if add_signature:
-            formatted += f"\n\nBest regards,\n{business_name}"
+        print(" Streaming from model API...")
         
-        if len(formatted) > self.max_output_length:
-            formatted = formatted[:self.max_output_length] + "..."
+        with self._admitted():
+            yield from self.providers.stream(system_prompt, message, usage)
+    
+    async def _call_model_async(self, system_prompt, message, usage=None):
+        """Claude call on the shared pooled async client, behind Claude's circuit breaker - raises on API errors"""
+        client = get_async_anthropic_client()
+        if not client:
+            raise DemoMode("no API client")
+        
+        params = self._request_params(system_prompt, message)
+        
+        async def call(timeout):
+            response = await client.messages.create(**params, timeout=timeout)
+            self.prompt_cache.record(response.usage)
+            if usage is not None:
+                usage.set_tokens(response.model, response.usage)
+            return response.content[0].text
         
-        return formatted
+        async with self._admitted_async():
+            return await self.providers.call_async('claude', call, usage)
+    
+    async def _stream_model_async(self, system_prompt, message, usage=None):
+        """Yield reply text from the async Claude streaming API, behind Claude's circuit breaker - raises on API errors
 
-class Logger:
-    """Logging system for continuous improvement"""
+        Like _call_model_async this stays on Claude: the async server
+        has no async clients for the other providers.
+        """
+        client = get_async_anthropic_client()
+        if not client:
+            raise DemoMode("no API client")
+        
+        params = self._request_params(system_prompt, message)
+        
+        async def open_stream(timeout):
+            async with client.messages.stream(**params, timeout=timeout) as stream:
+                async for text in stream.text_stream:
+                    yield text
+                final = await stream.get_final_message()
+            self.prompt_cache.record(final.usage)
+            if usage is not None:
+                usage.set_tokens(final.model, final.usage)
+        
+        async with self._admitted_async():
+            async for text in self.providers.call_stream_async('claude', open_stream, usage):
+                yield text
     
-    @staticmethod
-    def log_interaction(customer_message, ai_reply, settings, user_edit=None):
-        """Save interaction for analysis and training"""
-        timestamp = datetime.now().isoformat()
-        
-        log_entry = {
-            'timestamp': timestamp,
-            'customer_message': customer_message,
-            'ai_reply': ai_reply,
-            'settings': settings,
-            'user_edit': user_edit,
-            'edited': user_edit is not None
+    def _request_params(self, system_prompt, message):
+        """Messages API parameters shared by the blocking and streaming calls"""
+        return {
+            'model': self.model,
+            'max_tokens': self.max_output_length,
+            'system': self._system_blocks(system_prompt),
+            'messages': [
+                {
+                    "role": "user",
+                    "content": f"Customer message: {message}\n\nPlease provide a helpful customer support reply."
+                }
+            ]
         }
-        
-        date_str = datetime.now().strftime('%Y-%m-%d')
-        log_file = os.path.join(LOG_DIR, f'interactions_{date_str}.jsonl')
-        
-        with open(log_file, 'a') as f:
-            f.write(json.dumps(log_entry) + '\n')
-        
-        return log_entry
+    
+    def _system_blocks(self, system_prompt):
+        """System prompt as content blocks, with a cache breakpoint after the shared rules
+        
+        Anthropic only caches prefixes above a minimum length
+        (config.PROMPT_CACHE_MIN_TOKENS); shorter rules are simply billed as
+        normal input, and /api/stats reports the prompt cache as not active.
+        """
+        parts = self.prompts.split(system_prompt) if config.PROMPT_CACHE_ENABLED else None
+        if parts is None:
+            return system_prompt
+        return [
+            {'type': 'text', 'text': parts[0], 'cache_control': {'type': 'ephemeral'}},
+            {'type': 'text', 'text': parts[1]}
+        ]
 
 # Initialize AI assistant
 assistant = AIAssistant()
@@ -198,6 +253,7 @@ def index():
 def generate_reply():
     """Main endpoint for generating customer support replies"""
     try:
+        start_time = time.perf_counter()
         data = request.json
         
         customer_message = data.get('message', '')
@@ -207,21 +263,33 @@ def generate_reply():
             'industry': data.get('industry', 'general business'),
             'add_signature': data.get('add_signature', True)
         }
+        use_cache = not data.get('bypass_cache', False)
+        
+        wait = rate_limit_wait(request, customer_message)
+        if wait:
+            return rate_limited(wait)
         
-        result = assistant.generate_reply(customer_message, business_name, settings)
+        result = assistant.generate_reply(customer_message, business_name, settings, use_cache)
         
         Logger.log_interaction(
             customer_message=customer_message,
             ai_reply=result['reply'],
-            settings=settings
+            settings=settings,
+            routing=result['routing'],
+            prompt_version=result['prompt_version'],
+            usage=result['usage']
         )
+        metrics.observe('generate_reply.total', time.perf_counter() - start_time)
         
         return jsonify({
             'success': True,
             'reply': result['reply'],
             'metadata': {
                 'cleaned_message': result['cleaned_message'],
-                'settings_used': result['settings_used']
+                'settings_used': result['settings_used'],
+                'cached': result['cached'],
+                'intent': result['intent'],
+                'prompt_version': result['prompt_version']
             }
         })
     
@@ -231,11 +299,143 @@ def generate_reply():
             'error': str(e)
         }), 400
     
+    except Overloaded as e:
+        return overloaded(e)
+    
+    except Exception as e:
+        return jsonify({
+            'success': False,
+            'error': 'An unexpected error occurred'
+        }), 500
+
+@app.route('/api/generate-reply/stream', methods=['POST'])
+def generate_reply_stream():
+    """Streaming variant of /api/generate-reply using Server-Sent Events"""
+    try:
+        start_time = time.perf_counter()
+        data = request.json
+        
+        customer_message = data.get('message', '')
+        business_name = data.get('business_name', 'Our Support Team')
+        settings = {
+            'tone': data.get('tone', 'professional'),
+            'industry': data.get('industry', 'general business'),
+            'add_signature': data.get('add_signature', True)
+        }
+        use_cache = not data.get('bypass_cache', False)
+        
+        wait = rate_limit_wait(request, customer_message)
+        if wait:
+            return rate_limited(wait)
+        
+        # Pull the first event here so validation errors still return a 400
+        stream = assistant.stream_reply(customer_message, business_name, settings, use_cache)
+        first_event = next(stream)
+        metrics.observe('generate_reply_stream.ttft', time.perf_counter() - start_time)
+    
+    except ValueError as e:
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 400
+    
+    except Overloaded as e:
+        return overloaded(e)
+    
     except Exception as e:
         return jsonify({
             'success': False,
             'error': 'An unexpected error occurred'
         }), 500
+    
+    def events():
+        try:
+            for event, payload in itertools.chain([first_event], stream):
+                if event == 'chunk':
+                    yield sse_event('chunk', {'text': payload})
+                    continue
+                
+                Logger.log_interaction(
+                    customer_message=customer_message,
+                    ai_reply=payload['reply'],
+                    settings=settings,
+                    routing=payload['routing'],
+                    prompt_version=payload['prompt_version'],
+                    usage=payload['usage']
+                )
+                metrics.observe('generate_reply_stream.total', time.perf_counter() - start_time)
+                
+                yield sse_event('done', {
+                    'success': True,
+                    'reply': payload['reply'],
+                    'metadata': {
+                        'cleaned_message': payload['cleaned_message'],
+                        'settings_used': payload['settings_used'],
+                        'cached': payload['cached'],
+                        'intent': payload['intent'],
+                        'prompt_version': payload['prompt_version']
+                    }
+                })
+        
+        except Exception as e:
+            print(f"Stream Error: {e}")
+            yield sse_event('error', {
+                'success': False,
+                'error': 'An unexpected error occurred'
+            })
+    
+    return Response(
+        stream_with_context(events()),
+        mimetype='text/event-stream',
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+    )
+
+@app.route('/api/generate-replies', methods=['POST'])
+def generate_replies():
+    """Batch endpoint - streams one NDJSON line per message as each finishes"""
+    try:
+        data = request.json
+        items = parse_batch(data)
+    
+    except ValueError as e:
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 400
+    
+    # The whole batch is charged up front: one request per message
+    wait = rate_limit_wait(request, *(item['message'] for item in items))
+    if wait:
+        return rate_limited(wait)
+    
+    def results():
+        log_entries = []
+        succeeded = 0
+        try:
+            for index, result, error in assistant.generate_replies(items, config.BATCH_CONCURRENCY):
+                item = items[index]
+                if error is None:
+                    succeeded += 1
+                    log_entries.append(Logger.build_entry(
+                        customer_message=item['message'],
+                        ai_reply=result['reply'],
+                        settings=item['settings'],
+                        routing=result['routing'],
+                        prompt_version=result['prompt_version'],
+                        usage=result['usage']
+                    ))
+                yield batch_result_line(item, index, result, error)
+            
+            yield json.dumps({
+                'done': True,
+                'total': len(items),
+                'succeeded': succeeded,
+                'failed': len(items) - succeeded
+            }) + '\n'
+        finally:
+            Logger.log_interactions(log_entries)
+    
+    return Response(results(), mimetype='application/x-ndjson')
 
 @app.route('/api/feedback', methods=['POST'])
 def submit_feedback():
@@ -247,11 +447,15 @@ def submit_feedback():
         edited_reply = data.get('edited_reply', '')
         customer_message = data.get('customer_message', '')
         
+        # Tone and industry attribute the edit for per-intent edit rates
+        settings = {key: data[key] for key in ('tone', 'industry') if key in data}
+        
         Logger.log_interaction(
             customer_message=customer_message,
             ai_reply=original_reply,
-            settings={},
-            user_edit=edited_reply
+            settings=settings,
+            user_edit=edited_reply,
+            prompt_version=data.get('prompt_version')
         )
         
         return jsonify({
@@ -269,30 +473,20 @@ def submit_feedback():
 def get_stats():
     """Analytics endpoint - track usage and quality"""
     try:
-        total_interactions = 0
-        total_edited = 0
-        
-        for filename in os.listdir(LOG_DIR):
-            if filename.startswith('interactions_') and filename.endswith('.jsonl'):
-                filepath = os.path.join(LOG_DIR, filename)
-                with open(filepath, 'r') as f:
-                    for line in f:
-                        entry = json.loads(line)
-                        total_interactions += 1
-                        if entry.get('edited'):
-                            total_edited += 1
-        
-        accuracy_rate = 0
-        if total_interactions > 0:
-            accuracy_rate = ((total_interactions - total_edited) / total_interactions) * 100
+        stats = Logger.get_stats()
+        stats['reply_cache'] = assistant.reply_cache.stats()
+        stats['semantic_cache'] = assistant.semantic_cache.stats() if assistant.semantic_cache else None
+        stats['canned_replies'] = assistant.canned_replies.stats() if assistant.canned_replies else None
+        stats['single_flight'] = assistant.single_flight.stats() if assistant.single_flight else None
+        stats['providers'] = assistant.providers.stats()
+        stats['prompts'] = assistant.prompts.stats()
+        stats['prompt_cache'] = assistant.prompt_cache.stats(assistant.prompts.prefix_tokens)
+        stats['rate_limit'] = rate_limiter.stats() if rate_limiter else None
+        stats['admission'] = assistant.admission.stats() if assistant.admission else None
         
         return jsonify({
             'success': True,
-            'stats': {
-                'total_interactions': total_interactions,
-                'total_edited': total_edited,
-                'accuracy_rate': round(accuracy_rate, 2)
-            }
+            'stats': stats
         })
     
     except Exception as e:
@@ -301,6 +495,14 @@ def get_stats():
             'error': str(e)
         }), 500
 
+@app.route('/api/metrics', methods=['GET'])
+def get_metrics():
+    """Latency and counter metrics for this worker"""
+    return jsonify({
+        'success': True,
+        'metrics': metrics.snapshot()
+    })
+
 if __name__ == '__main__':
     print(" AI Customer Support Assistant Starting...")
     print(" Server running at http://localhost:5000")
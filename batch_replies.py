@@ -0,0 +1,275 @@
+#!/usr/bin/env python3
+"""
+Batch Reply Job Runner
+Generates replies for a JSONL file of customer messages through the Anthropic
+Message Batches API - for bulk backlogs that are not latency-sensitive.
+
+Each input line is a JSON object like the /api/generate-replies entries:
+    {"id": "T-1001", "message": "Where is my order?", "tone": "friendly"}
+
+The job checkpoints its batch id and the prompt version each request was
+rendered with, so an interrupted run resumes polling instead of submitting
+again. Replies already in the output file are skipped.
+
+Offline: python batch_replies.py tickets.jsonl --fake
+"""
+
+import argparse
+import json
+import os
+import sys
+import time
+
+from anthropic import Anthropic
+
+import config
+from app_production import assistant
+from fake_batch_server import FakeBatchServer
+from providers import Usage
+from server_common import Logger, batch_item
+
+FLUSH_EVERY = 500
+
+
+def batch_usage(message):
+    """Log entry 'usage' of a batch result: tokens at batch prices, no per-request latency"""
+    usage = Usage()
+    usage.set_tokens(message.model, message.usage)
+    usage.finish('claude-batch', None)
+    entry = usage.entry()
+    if entry['cost_usd'] is not None:
+        entry['cost_usd'] *= config.BATCH_PRICE_FACTOR
+    return entry
+
+
+class BatchJob:
+    def __init__(self, client, input_path, output_path, checkpoint_path, poll_interval=30):
+        self.client = client
+        self.input_path = input_path
+        self.output_path = output_path
+        self.checkpoint_path = checkpoint_path
+        self.poll_interval = poll_interval
+        self.items = {}
+
+    def run(self):
+        """Submit (or resume) the batch, wait for it, then write the results"""
+        checkpoint = self.load_checkpoint()
+        if checkpoint.get('status') == 'done':
+            print(f"✅ Already complete: {self.output_path}")
+            return
+
+        self.load_items()
+
+        if checkpoint.get('batch_id'):
+            if checkpoint.get('input_size') != os.path.getsize(self.input_path):
+                sys.exit("❌ Input file changed since the batch was submitted; "
+                         f"delete {self.checkpoint_path} to start over")
+            print(f"🔁 Resuming batch {checkpoint['batch_id']}")
+        else:
+            checkpoint = self.submit()
+
+        self.wait(checkpoint['batch_id'])
+        self.collect(checkpoint['batch_id'], checkpoint.get('prompt_versions', {}))
+
+        checkpoint['status'] = 'done'
+        self.save_checkpoint(checkpoint)
+
+    def load_items(self):
+        """Read and clean every input message, keyed by custom_id"""
+        with open(self.input_path, 'r') as f:
+            for line_number, line in enumerate(f, start=1):
+                if not line.strip():
+                    continue
+
+                item = batch_item(json.loads(line))
+                try:
+                    item['cleaned_message'] = assistant.clean_input(item['message'])
+                    item['error'] = None
+                except ValueError as e:
+                    item['cleaned_message'] = None
+                    item['error'] = str(e)
+                self.items[f"line-{line_number}"] = item
+
+        print(f"📊 Loaded {len(self.items)} messages from {self.input_path}")
+
+    def submit(self):
+        """Create the message batch and record it in the checkpoint"""
+        requests = []
+        prompt_versions = {}
+        for custom_id, item in self.items.items():
+            if item['error']:
+                continue
+
+            prompt = assistant.prompts.render(
+                item['settings']['tone'],
+                item['settings']['industry']
+            )
+            prompt_versions[custom_id] = prompt.version
+            requests.append({
+                'custom_id': custom_id,
+                'params': assistant._request_params(prompt.text, item['cleaned_message'])
+            })
+
+        # Invalid messages never reach the API; report them straight away
+        self.write_results([
+            self.error_line(custom_id, item, item['error'])
+            for custom_id, item in self.items.items()
+            if item['error'] and custom_id not in self.written_ids()
+        ], [])
+
+        if not requests:
+            sys.exit("❌ No valid messages to submit")
+
+        batch = self.client.messages.batches.create(requests=requests)
+        print(f"🚀 Submitted batch {batch.id} with {len(requests)} requests")
+
+        checkpoint = {
+            'batch_id': batch.id,
+            'input': os.path.abspath(self.input_path),
+            'input_size': os.path.getsize(self.input_path),
+            'prompt_versions': prompt_versions,
+            'status': 'submitted'
+        }
+        self.save_checkpoint(checkpoint)
+        return checkpoint
+
+    def wait(self, batch_id):
+        """Poll until the batch has finished processing"""
+        while True:
+            batch = self.client.messages.batches.retrieve(batch_id)
+            counts = batch.request_counts
+            print(f"⏳ {batch.processing_status}: {counts.succeeded} succeeded, "
+                  f"{counts.errored} errored, {counts.processing} processing")
+
+            if batch.processing_status == 'ended':
+                return
+            time.sleep(self.poll_interval)
+
+    def collect(self, batch_id, prompt_versions):
+        """Write formatted replies and log entries for every new result
+
+        prompt_versions maps custom_id to the prompt version it was submitted with.
+        """
+        written = self.written_ids()
+        lines, log_entries = [], []
+        succeeded = failed = 0
+
+        for response in self.client.messages.batches.results(batch_id):
+            item = self.items.get(response.custom_id)
+            if item is None or response.custom_id in written:
+                continue
+
+            if response.result.type == 'succeeded':
+                reply = assistant._format_response(
+                    response.result.message.content[0].text,
+                    item['business_name'],
+                    item['settings']['add_signature']
+                )
+                lines.append({
+                    'custom_id': response.custom_id,
+                    'id': item['id'],
+                    'success': True,
+                    'reply': reply,
+                    'metadata': {
+                        'cleaned_message': item['cleaned_message'],
+                        'settings_used': item['settings'],
+                        'prompt_version': prompt_versions.get(response.custom_id)
+                    }
+                })
+                log_entries.append(Logger.build_entry(
+                    customer_message=item['message'],
+                    ai_reply=reply,
+                    settings=item['settings'],
+                    prompt_version=prompt_versions.get(response.custom_id),
+                    usage=batch_usage(response.result.message)
+                ))
+                succeeded += 1
+            else:
+                lines.append(self.error_line(response.custom_id, item, response.result.type))
+                failed += 1
+
+            if len(lines) >= FLUSH_EVERY:
+                self.write_results(lines, log_entries)
+                lines, log_entries = [], []
+
+        self.write_results(lines, log_entries)
+        print(f"💾 Wrote {succeeded} replies and {failed} failures to {self.output_path}")
+
+    def error_line(self, custom_id, item, error):
+        return {
+            'custom_id': custom_id,
+            'id': item['id'],
+            'success': False,
+            'error': error
+        }
+
+    def write_results(self, lines, log_entries):
+        """Append output lines, then their log entries"""
+        if lines:
+            with open(self.output_path, 'a') as f:
+                f.write(''.join(json.dumps(line) + '\n' for line in lines))
+                f.flush()
+                os.fsync(f.fileno())
+        Logger.log_interactions(log_entries)
+
+    def written_ids(self):
+        """custom_ids already in the output file from an earlier run"""
+        if not os.path.exists(self.output_path):
+            return set()
+
+        written = set()
+        with open(self.output_path, 'r') as f:
+            for line in f:
+                try:
+                    written.add(json.loads(line)['custom_id'])
+                except (json.JSONDecodeError, KeyError):
+                    continue
+        return written
+
+    def load_checkpoint(self):
+        if not os.path.exists(self.checkpoint_path):
+            return {}
+        with open(self.checkpoint_path, 'r') as f:
+            return json.load(f)
+
+    def save_checkpoint(self, checkpoint):
+        tmp_path = self.checkpoint_path + '.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump(checkpoint, f, indent=2)
+        os.replace(tmp_path, self.checkpoint_path)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Generate replies for a JSONL file with the Message Batches API")
+    parser.add_argument('input', help="JSONL file of customer messages")
+    parser.add_argument('--output', help="Replies JSONL (default: <input>.replies.jsonl)")
+    parser.add_argument('--checkpoint', help="Checkpoint file (default: <input>.checkpoint.json)")
+    parser.add_argument('--poll-interval', type=float, default=30, help="Seconds between status checks")
+    parser.add_argument('--base-url', help="Alternative API base URL, e.g. a fake_batch_server.py instance")
+    parser.add_argument('--fake', action='store_true', help="Run against an in-process fake batch server")
+    args = parser.parse_args()
+
+    base, _ = os.path.splitext(args.input)
+    output_path = args.output or f"{base}.replies.jsonl"
+    checkpoint_path = args.checkpoint or f"{base}.checkpoint.json"
+
+    api_key = os.environ.get('ANTHROPIC_API_KEY')
+    base_url = args.base_url
+    poll_interval = args.poll_interval
+
+    if args.fake:
+        server = FakeBatchServer(delay=2.0).start()
+        base_url, api_key, poll_interval = server.base_url, 'fake-key', 1
+        print(f"🧪 Using fake batch server at {base_url}")
+
+    if not api_key:
+        if not base_url:
+            sys.exit("❌ Set ANTHROPIC_API_KEY, or use --fake / --base-url for offline runs")
+        api_key = 'fake-key'
+
+    client = Anthropic(api_key=api_key, base_url=base_url)
+    BatchJob(client, args.input, output_path, checkpoint_path, poll_interval).run()
+
+
+if __name__ == '__main__':
+    main()
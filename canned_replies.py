@@ -0,0 +1,169 @@
+#!/usr/bin/env python3
+"""
+Canned Replies
+Pre-LLM router (see AIAssistant._route) that answers simple, rarely edited
+intents from canned_replies.json instead of calling the model.
+
+A message gets a canned reply only when all of these hold:
+- its top intent has a template and scores at least min_confidence
+- no other intent scores within min_margin of it
+- it is at most max_message_length characters
+- the logs hold at least min_samples uses of that intent and tone, edited
+  no more than max_edit_rate of the time
+
+Edit rates come from analyze_log's summaries (IntentPerformance). They are
+refreshed in a background thread every refresh_seconds, and JSONL logs are
+re-read only from the per-file checkpoints onward.
+"""
+
+import json
+import os
+import threading
+import time
+from collections import Counter
+
+import config
+from analyze_log import FileCheckpoints, log_files, summarize_files, summarize_sql
+from log_storage import SqliteStorage
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+
+
+def load_templates(path):
+    """{intent: {tone or 'default': reply}}; a missing file means no templates"""
+    path = path if os.path.isabs(path) else os.path.join(BASE_DIR, path)
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except OSError:
+        print(f"⚠️ Canned replies disabled: {path} not found")
+        return {}
+
+
+class CannedReplies:
+    """Router answering high-confidence, rarely edited intents from templates"""
+
+    def __init__(self, storage, templates, min_confidence=0.85, min_margin=0.3, max_message_length=160,
+                 max_edit_rate=0.05, min_samples=50, refresh_seconds=300):
+        self.storage = storage
+        self.templates = templates
+        self.min_confidence = min_confidence
+        self.min_margin = min_margin
+        self.max_message_length = max_message_length
+        self.max_edit_rate = max_edit_rate
+        self.min_samples = min_samples
+        self.refresh_seconds = refresh_seconds
+        self.intent_stats = {}
+        self.refreshed_at = None
+        self._next_refresh = 0
+        self._refreshing = False
+        self._decisions = Counter()
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_config(cls, storage):
+        return cls(
+            storage,
+            load_templates(config.CANNED_REPLIES_PATH),
+            min_confidence=config.CANNED_REPLY_MIN_CONFIDENCE,
+            min_margin=config.CANNED_REPLY_MIN_MARGIN,
+            max_message_length=config.CANNED_REPLY_MAX_MESSAGE_LENGTH,
+            max_edit_rate=config.CANNED_REPLY_MAX_EDIT_RATE,
+            min_samples=config.CANNED_REPLY_MIN_SAMPLES,
+            refresh_seconds=config.CANNED_REPLY_REFRESH_SECONDS
+        )
+
+    def __call__(self, cleaned_message, settings, intents):
+        """(canned reply or None, routing decision or None when no intent was found)"""
+        if not intents:
+            return None, None
+        self._maybe_refresh()
+
+        top = intents[0]
+        tone = settings.get('tone', 'professional')
+        stats = self.intent_stats.get(top.name, {}).get(tone, {'total': 0, 'edited': 0})
+        edit_rate = stats['edited'] / stats['total'] if stats['total'] else None
+        reply = self.template(top.name, tone)
+
+        if reply is None:
+            reason = 'no_template'
+        elif top.score < self.min_confidence:
+            reason = 'low_confidence'
+        elif len(intents) > 1 and top.score - intents[1].score < self.min_margin:
+            reason = 'ambiguous'
+        elif len(cleaned_message) > self.max_message_length:
+            reason = 'too_long'
+        elif stats['total'] < self.min_samples:
+            reason = 'few_samples'
+        elif edit_rate > self.max_edit_rate:
+            reason = 'edit_rate'
+        else:
+            reason = None
+
+        with self._lock:
+            self._decisions[reason or 'canned'] += 1
+
+        decision = {
+            'intent': top.name,
+            'confidence': top.score,
+            'edit_rate': round(edit_rate, 4) if edit_rate is not None else None,
+            'samples': stats['total'],
+            'route': 'model' if reason else 'canned',
+            'reason': reason
+        }
+        return (None if reason else reply), decision
+
+    def template(self, intent, tone):
+        """Template for intent in tone (or its default), or None"""
+        templates = self.templates.get(intent, {})
+        return templates.get(tone, templates.get('default'))
+
+    def _maybe_refresh(self):
+        """Start a background refresh of edit rates when they are due"""
+        with self._lock:
+            if self._refreshing or time.time() < self._next_refresh:
+                return
+            self._refreshing = True
+        threading.Thread(target=self.refresh, daemon=True).start()
+
+    def refresh(self):
+        """Recompute per intent and tone edit rates from the logs"""
+        try:
+            if isinstance(self.storage, SqliteStorage):
+                summary = summarize_sql(self.storage)
+            else:
+                checkpoints = FileCheckpoints(os.path.join(self.storage.log_dir, 'analysis_checkpoints.json'))
+                summary = summarize_files(log_files(self.storage.log_dir), checkpoints=checkpoints)
+            self.intent_stats = summary.intents.intent_stats
+            self.refreshed_at = time.time()
+        except Exception as e:
+            print(f"Canned reply refresh error: {e}")
+        finally:
+            with self._lock:
+                self._refreshing = False
+                self._next_refresh = time.time() + self.refresh_seconds
+
+    def stats(self):
+        """Routing decisions so far and the intents that currently qualify"""
+        with self._lock:
+            decisions = dict(self._decisions)
+
+        eligible = [
+            f"{intent}/{tone}"
+            for intent, tones in self.intent_stats.items() if intent in self.templates
+            for tone, stats in tones.items()
+            if stats['total'] >= self.min_samples and stats['edited'] / stats['total'] <= self.max_edit_rate
+        ]
+        return {
+            'canned': decisions.pop('canned', 0),
+            'declined': decisions,
+            'eligible': eligible,
+            'thresholds': {
+                'min_confidence': self.min_confidence,
+                'min_margin': self.min_margin,
+                'max_message_length': self.max_message_length,
+                'max_edit_rate': self.max_edit_rate,
+                'min_samples': self.min_samples
+            },
+            'refreshed_at': self.refreshed_at
+        }
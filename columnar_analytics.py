@@ -0,0 +1,318 @@
+#!/usr/bin/env python3
+"""
+Columnar Analytics
+Vectorized engine for analyze_log.py: interactions are held as NumPy
+columns and every report section is a handful of array operations.
+
+Strings (tone, industry, customer message) are dictionary-encoded, so
+per-string work such as intent matching runs once per distinct value.
+
+Benchmark against the per-record loop:
+    python columnar_analytics.py --records 200000
+"""
+
+import argparse
+import random
+import re
+import time
+
+import numpy as np
+
+from log_archive import ARCHIVE_SUFFIX, Archive, iter_day_file
+from usage_stats import USAGE_COLUMNS, usage_arrays, usage_counts_from_columns, usage_row
+
+EDIT_TYPES = ('Added content', 'Shortened response', 'Rephrased')
+BUCKET_UNITS = {'s': 's', 'm': 'm', 'h': 'h', 'd': 'D'}
+
+
+def first_seen_order(keys):
+    """Distinct values of an array, ordered by where each first appears"""
+    values, first = np.unique(keys, return_index=True)
+    return values[np.argsort(first)]
+
+
+def parse_bucket(bucket):
+    """'15m', '1h', '1d' -> numpy timedelta64"""
+    match = re.fullmatch(r'(\d+)([smhd])', bucket)
+    if not match or int(match.group(1)) == 0:
+        raise ValueError(f"Bucket must look like 30s, 15m, 1h or 1d, not {bucket!r}")
+    return np.timedelta64(int(match.group(1)), BUCKET_UNITS[match.group(2)])
+
+
+class StringColumn:
+    """Builds dictionary codes for a string column, one value at a time"""
+
+    def __init__(self):
+        self.index = {}
+        self.codes = []
+
+    def append(self, value):
+        self.codes.append(self.index.setdefault(value, len(self.index)))
+
+    def extend(self, codes, values):
+        mapping = np.array([self.index.setdefault(value, len(self.index)) for value in values], dtype=np.int32)
+        self.codes.append(mapping[codes] if len(values) else np.asarray(codes, dtype=np.int32))
+
+    def finish(self):
+        codes = self.codes
+        if codes and isinstance(codes[0], np.ndarray):
+            codes = np.concatenate(codes)
+        return np.asarray(codes, dtype=np.int32), list(self.index)
+
+
+class InteractionColumns:
+    """Interactions as parallel arrays, in log order"""
+
+    def __init__(self, timestamp, edited, ai_reply_len, user_edit_len, tone, industry, message, usage):
+        self.timestamp = timestamp
+        self.edited = edited
+        self.ai_reply_len = ai_reply_len
+        self.user_edit_len = user_edit_len
+        self.tone_codes, self.tones = tone
+        self.industry_codes, self.industries = industry
+        self.message_codes, self.messages = message
+        self.usage = usage  # {column: array} for usage_stats.USAGE_COLUMNS
+
+    def __len__(self):
+        return len(self.edited)
+
+    @classmethod
+    def from_files(cls, filepaths, timestamps=True):
+        """Load day files; archived days are read straight from their columns
+
+        timestamps=False skips decoding timestamps when no time buckets are needed.
+        """
+        builder = _Builder(timestamps)
+        for filepath in filepaths:
+            if filepath.endswith(ARCHIVE_SUFFIX):
+                builder.add_archive(filepath)
+            else:
+                builder.add_records(iter_day_file(filepath))
+        return builder.finish()
+
+    @classmethod
+    def from_records(cls, records):
+        builder = _Builder()
+        builder.add_records(records)
+        return builder.finish()
+
+    def edit_deltas(self):
+        """Edited length minus AI reply length, for each edited interaction"""
+        rows = np.flatnonzero(self.edited)
+        return self.user_edit_len[rows].astype(np.int64) - self.ai_reply_len[rows]
+
+    def edit_types(self):
+        """{edit type: count}, ordered by first appearance"""
+        deltas = self.edit_deltas()
+        kinds = np.where(deltas > 0, 0, np.where(deltas < 0, 1, 2))
+        counts = np.bincount(kinds, minlength=3)
+        return {EDIT_TYPES[kind]: int(counts[kind]) for kind in first_seen_order(kinds)}
+
+    def group_stats(self, name):
+        """{tone or industry: {'total', 'edited'}}, ordered by first appearance"""
+        codes, values = (self.tone_codes, self.tones) if name == 'tone' else (self.industry_codes, self.industries)
+        totals = np.bincount(codes, minlength=len(values))
+        edits = np.bincount(codes, weights=self.edited, minlength=len(values))
+        return {
+            values[code]: {'total': int(totals[code]), 'edited': int(edits[code])}
+            for code in first_seen_order(codes)
+        }
+
+    def intent_hits(self, classifier):
+        """{intent: messages mentioning it}, in the order a loop would first count them"""
+        positions = {name: position for position, name in enumerate(classifier.names)}
+        matches = np.zeros((len(self.messages), len(positions)), dtype=bool)
+        for code, message in enumerate(self.messages):
+            for name in classifier.matched(message):
+                matches[code, positions[name]] = True
+
+        hits = []
+        for position, name in enumerate(classifier.names):
+            rows = matches[self.message_codes, position]
+            if rows.any():
+                hits.append((int(np.argmax(rows)), position, name, int(rows.sum())))
+        return {name: count for _, _, name, count in sorted(hits)}
+
+    def intent_tone_stats(self, classifier):
+        """{top intent: {tone: {'total', 'edited'}}}, ordered by first appearance"""
+        positions = {name: position for position, name in enumerate(classifier.names)}
+        tops = np.array([positions.get(classifier.top(message), -1) for message in self.messages], dtype=np.int64)
+        intents = tops[self.message_codes]
+
+        rows = intents >= 0
+        keys = intents[rows] * len(self.tones) + self.tone_codes[rows]
+        totals = np.bincount(keys, minlength=len(positions) * len(self.tones))
+        edits = np.bincount(keys, weights=self.edited[rows], minlength=len(positions) * len(self.tones))
+
+        stats = {}
+        for key in first_seen_order(keys):
+            intent, tone = divmod(int(key), len(self.tones))
+            stats.setdefault(classifier.names[intent], {})[self.tones[tone]] = {
+                'total': int(totals[key]),
+                'edited': int(edits[key])
+            }
+        return stats
+
+    def usage_counts(self):
+        """Model latency, tokens and cost overall and per tone and industry"""
+        return usage_counts_from_columns((self.tone_codes, self.tones), (self.industry_codes, self.industries),
+                                         self.usage)
+
+    def edit_rate_by(self, bucket):
+        """[(bucket start, total, edited)] for time buckets such as '1h'"""
+        step = parse_bucket(bucket)
+        valid = ~np.isnat(self.timestamp)
+        step_us = step.astype('timedelta64[us]').astype(np.int64)
+        slots = self.timestamp[valid].astype('datetime64[us]').astype(np.int64) // step_us
+        starts, inverse = np.unique(slots, return_inverse=True)
+        totals = np.bincount(inverse, minlength=len(starts))
+        edits = np.bincount(inverse, weights=self.edited[valid], minlength=len(starts))
+        return [
+            ((start * step_us).astype('datetime64[us]'), int(total), int(edited))
+            for start, total, edited in zip(starts, totals, edits)
+        ]
+
+
+class _Builder:
+    """Accumulates columns from records and archives, then concatenates"""
+
+    def __init__(self, read_timestamps=True):
+        self.read_timestamps = read_timestamps
+        self.timestamps = []
+        self.edited = []
+        self.ai_reply_len = []
+        self.user_edit_len = []
+        self.tone = StringColumn()
+        self.industry = StringColumn()
+        self.message = StringColumn()
+        self.usage = {name: [] for name in USAGE_COLUMNS}
+
+    def add_records(self, records):
+        timestamps, edited, ai_reply_len, user_edit_len, usage = [], [], [], [], []
+        tone, industry, message = StringColumn(), StringColumn(), StringColumn()
+        for record in records:
+            settings = record.get('settings', {})
+            user_edit = record.get('user_edit')
+            timestamps.append(record.get('timestamp'))
+            edited.append(bool(record.get('edited')))
+            ai_reply_len.append(len(record.get('ai_reply', '')))
+            user_edit_len.append(len(user_edit) if user_edit is not None else -1)
+            tone.append(settings.get('tone', 'unknown'))
+            industry.append(settings.get('industry', 'unknown'))
+            message.append(record.get('customer_message', ''))
+            usage.append(usage_row(record))
+
+        self._add(timestamps, edited, ai_reply_len, user_edit_len,
+                  tone.finish(), industry.finish(), message.finish(), usage_arrays(usage))
+
+    def add_archive(self, filepath):
+        with Archive(filepath) as archive:
+            self._add(
+                archive.decoded('timestamp') if self.read_timestamps else [None] * len(archive),
+                archive.column('edited'),
+                archive.column('ai_reply_len'),
+                archive.column('user_edit_len'),
+                archive.strings('tone'),
+                archive.strings('industry'),
+                archive.strings('customer_message'),
+                # Archives written before usage was logged have no model calls to count
+                archive.usage() or usage_arrays([usage_row({})] * len(archive))
+            )
+
+    def _add(self, timestamps, edited, ai_reply_len, user_edit_len, tone, industry, message, usage):
+        self.timestamps.append(_parse_timestamps(timestamps))
+        self.edited.append(np.asarray(edited, dtype=bool))
+        self.ai_reply_len.append(np.asarray(ai_reply_len, dtype=np.int32))
+        self.user_edit_len.append(np.asarray(user_edit_len, dtype=np.int32))
+        self.tone.extend(*tone)
+        self.industry.extend(*industry)
+        self.message.extend(*message)
+        for name in USAGE_COLUMNS:
+            self.usage[name].append(usage[name])
+
+    def finish(self):
+        def concat(parts, dtype):
+            return np.concatenate(parts) if parts else np.array([], dtype=dtype)
+
+        return InteractionColumns(
+            concat(self.timestamps, 'datetime64[us]'),
+            concat(self.edited, bool),
+            concat(self.ai_reply_len, np.int32),
+            concat(self.user_edit_len, np.int32),
+            self.tone.finish(),
+            self.industry.finish(),
+            self.message.finish(),
+            {name: concat(parts, np.float64 if name.endswith('_ms') else np.int64) for name, parts in self.usage.items()}
+        )
+
+
+def _parse_timestamps(values):
+    """ISO timestamps -> datetime64[us]; anything unparseable becomes NaT"""
+    try:
+        return np.array(values, dtype='datetime64[us]')
+    except ValueError:
+        parsed = np.empty(len(values), dtype='datetime64[us]')
+        for i, value in enumerate(values):
+            try:
+                parsed[i] = np.datetime64(value, 'us')
+            except (ValueError, TypeError):
+                parsed[i] = np.datetime64('NaT')
+        return parsed
+
+
+def benchmark(records=200000):
+    """Loop Summary vs vectorized sections on synthetic interactions"""
+    from analyze_log import Summary, summary_from_columns
+    from intents import INTENTS
+
+    rng = random.Random(0)
+    messages = [f"{rng.choice(['Where is my order', 'I want a refund', 'App not working', 'Cancel my plan', 'Need help'])} #{i}"
+                for i in range(5000)]
+    interactions = []
+    for i in range(records):
+        edited = rng.random() < 0.2
+        cached = rng.random() < 0.3
+        interactions.append({
+            'timestamp': f"2024-01-{1 + i * 30 // records:02d}T{i % 24:02d}:{i % 60:02d}:00",
+            'customer_message': rng.choice(messages),
+            'ai_reply': 'r' * rng.randint(100, 400),
+            'settings': {'tone': rng.choice(['professional', 'friendly', 'casual']), 'industry': 'retail'},
+            'user_edit': 'e' * rng.randint(100, 400) if edited else None,
+            'edited': edited,
+            **({} if cached else {'usage': {
+                'latency_ms': round(rng.lognormvariate(6.7, 0.5), 1),
+                'ttft_ms': round(rng.lognormvariate(6, 0.4), 1) if i % 2 else None,
+                'input_tokens': 700,
+                'output_tokens': rng.randint(50, 300),
+                'cached_tokens': 0,
+                'cost_usd': 0.0045
+            }})
+        })
+
+    start = time.perf_counter()
+    loop = Summary()
+    for interaction in interactions:
+        loop.add(interaction)
+    loop_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    columns = InteractionColumns.from_records(interactions)
+    load_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    vectorized = summary_from_columns(columns)
+    columns.group_stats('industry')
+    columns.edit_rate_by('1h')
+    vector_time = time.perf_counter() - start
+
+    same = loop.to_dict() == vectorized.to_dict()
+    print(f"📊 {records} interactions, {len(INTENTS)} intents, results {'match' if same else 'DIFFER'}")
+    print(f"   loop (all sections):        {loop_time * 1000:8.1f} ms")
+    print(f"   columnar load:              {load_time * 1000:8.1f} ms")
+    print(f"   vectorized (all sections):  {vector_time * 1000:8.1f} ms")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Benchmark the columnar analytics engine")
+    parser.add_argument('--records', type=int, default=200000)
+    benchmark(parser.parse_args().records)
@@ -7,11 +7,36 @@ ANTHROPIC_API_KEY = "your-api-key-here"  # Get from: https://console.anthropic.c
 # Model Settings
 AI_MODEL = "claude-sonnet-4-5-20250929"
 MAX_TOKENS = 1000
+PROMPT_CACHE_ENABLED = True  # Send the shared system prompt rules as a cached block (Claude)
+PROMPT_CACHE_MIN_TOKENS = 1024  # Shorter prefixes are never cached by Anthropic (Sonnet), cache_control or not
+PROMPT_TEMPLATE = "prompts/support_v3.txt"  # Versioned system prompt (see prompt_registry.py)
+PROMPT_MEMO_SIZE = 256  # Rendered (tone, industry) prompts kept in memory
+PROMPT_RELOAD_SECONDS = 2  # How often the template file is checked for edits
+
+# Usage Accounting - every model call logs its latency, tokens and cost
+MODEL_PRICES = {  # Model name prefix: USD per million (input, output, cache read) tokens
+    "claude-sonnet-4-5": (3.00, 15.00, 0.30),
+    "gemini-2.5-flash": (0.30, 2.50, 0.075),
+}
+CACHE_WRITE_PRICE_FACTOR = 1.25  # Prompt cache writes, as a multiple of the input price
+BATCH_PRICE_FACTOR = 0.5  # Message Batches API prices as a share of MODEL_PRICES (batch_replies.py)
 
 # Safety Limits
 MAX_INPUT_LENGTH = 2000
 MAX_OUTPUT_LENGTH = 1000
-RATE_LIMIT_PER_HOUR = 100  # Prevent cost spikes
+RATE_LIMIT_PER_HOUR = 100  # Prevent cost spikes - replies per client (a batch counts each message)
+RATE_LIMIT_ENABLED = True  # Token buckets shared by all workers (see rate_limit.py)
+RATE_LIMIT_TOKENS_PER_HOUR = 200000  # Estimated model tokens per client
+RATE_LIMIT_GLOBAL_PER_HOUR = 10000  # All clients together; None = no global limit
+RATE_LIMIT_GLOBAL_TOKENS_PER_HOUR = 5000000
+RATE_LIMIT_TOKENS_PER_REQUEST = 600  # Estimated prompt + reply tokens, on top of message length / 4
+RATE_LIMIT_PATH = "cache/rate_limits.bin"  # Shared by the workers on one host
+RATE_LIMIT_TRUST_PROXY = False  # Identify clients by the first X-Forwarded-For address (behind a proxy)
+
+# Content Filter - patterns are compiled into one regex by sanitizer.py
+# Plain text matches anywhere (case-insensitive); anything with regex syntax is used as a regex
+UNSAFE_PATTERNS = [r'<script', r'javascript:', r'onerror=']
+UNSAFE_PATTERNS_FILE = None  # Optional extra patterns, one per line ('#' starts a comment)
 
 # Business Defaults
 DEFAULT_BUSINESS_NAME = "Support Team"
@@ -25,4 +50,83 @@ LOG_DIRECTORY = "logs"
 # Feature Flags
 ENABLE_SIGNATURE = True
 ENABLE_EDIT_TRACKING = True
-ENABLE_ANALYTICS = True
\ No newline at end of file
+ENABLE_ANALYTICS = True
+
+# Canned Replies - simple intents answered from canned_replies.json without calling the model
+CANNED_REPLIES_ENABLED = True
+CANNED_REPLIES_PATH = "canned_replies.json"
+CANNED_REPLY_MIN_CONFIDENCE = 0.85  # Top intent score (see intents.py)
+CANNED_REPLY_MIN_MARGIN = 0.3  # Lead the top intent needs over the next one
+CANNED_REPLY_MAX_MESSAGE_LENGTH = 160  # Longer messages always go to the model
+CANNED_REPLY_MAX_EDIT_RATE = 0.05  # Logged edit rate for the intent and tone
+CANNED_REPLY_MIN_SAMPLES = 50  # Logged uses of the intent and tone before it can be routed
+CANNED_REPLY_REFRESH_SECONDS = 300  # How often edit rates are recomputed from the logs
+
+# Provider Routing - replies go to the fastest healthy provider
+PROVIDERS = None  # e.g. ["claude", "gemini"]; None = the app's own model only. Streams fail over but aren't hedged; app_async.py stays on Claude
+PROVIDER_HEDGE_PERCENTILE = None  # e.g. 90: also ask the next provider once the first is slower than its p90
+PROVIDER_WINDOW = 200  # Recent calls per provider behind p50/p95, timeouts and error rate
+FAKE_PROVIDERS = {  # Offline providers for testing the router (usable in PROVIDERS)
+    "fake-fast": {"p50_ms": 200, "p95_ms": 1500, "error_rate": 0.02},
+    "fake-steady": {"p50_ms": 400, "p95_ms": 600, "error_rate": 0.01},
+}
+
+# Upstream Resilience - per provider circuit breaker, adaptive timeouts and retries
+BREAKER_FAILURE_THRESHOLD = 5  # Consecutive timeouts, connection errors or 429/5xx that open a provider's circuit
+BREAKER_RESET_SECONDS = 30  # An open circuit fails fast this long, then lets a trial call through
+BREAKER_HALF_OPEN_CALLS = 1  # Trial calls at a time while half-open
+UPSTREAM_TIMEOUT_PERCENTILE = 99  # Attempt timeout = this latency percentile x UPSTREAM_TIMEOUT_MULTIPLIER
+UPSTREAM_TIMEOUT_MULTIPLIER = 2.0
+UPSTREAM_TIMEOUT_MIN_SECONDS = 5
+UPSTREAM_TIMEOUT_MAX_SECONDS = 60
+UPSTREAM_TIMEOUT_COLD_SECONDS = 15  # Used until a provider has 5 successful calls
+UPSTREAM_MAX_RETRIES = 2  # Retries of 408/409/429/5xx/529, connection errors and timeouts
+UPSTREAM_RETRY_BASE_SECONDS = 0.5  # Full-jitter exponential backoff: up to base x 2^attempt
+UPSTREAM_RETRY_MAX_SECONDS = 8
+
+# Admission Control - per worker cap on model calls, with a bounded wait queue
+ADMISSION_ENABLED = True
+ADMISSION_MAX_IN_FLIGHT = 32  # Model calls at once per worker
+ADMISSION_MAX_QUEUE = 64  # Requests waiting for a slot; more are shed
+ADMISSION_ASYNC_MAX_IN_FLIGHT = 256  # app_async.py: awaited calls hold no thread, so one worker takes many more
+ADMISSION_ASYNC_MAX_QUEUE = 512
+ADMISSION_DEADLINE_SECONDS = 30  # Queueing plus the model call; requests that can't make it are shed early. Also caps all upstream attempts of a reply
+
+# Request Coalescing - identical concurrent generations share one model call
+SINGLE_FLIGHT_ENABLED = True
+SINGLE_FLIGHT_LOCK_DIR = None  # e.g. "cache/single_flight" to also coalesce across gunicorn workers
+SINGLE_FLIGHT_WAIT_SECONDS = 60  # Longest a worker waits on another worker's call
+
+# Reply Cache
+REPLY_CACHE_ENABLED = True
+REPLY_CACHE_SIZE = 1000  # Max cached replies per worker
+REPLY_CACHE_TTL_SECONDS = 600
+
+# Semantic Cache (near-duplicate messages)
+SEMANTIC_CACHE_ENABLED = True
+SEMANTIC_CACHE_THRESHOLD = 0.9  # Cosine similarity needed to reuse a reply
+SEMANTIC_CACHE_MAX_ENTRIES = 100000
+SEMANTIC_CACHE_MAX_BYTES = 64 * 1024 * 1024  # Cached reply text per worker
+SEMANTIC_CACHE_TTL_SECONDS = 24 * 3600  # Older replies are neither served nor restored from the snapshot
+SEMANTIC_CACHE_SNAPSHOT = "cache/semantic_cache"  # Dropped at startup when the model, providers or prompt version changed
+
+# Async Server (app_async.py) - per-process Claude connection pool
+ASYNC_MAX_CONNECTIONS = 500  # Upper bound on in-flight generations per process
+ASYNC_MAX_KEEPALIVE_CONNECTIONS = 100
+ASYNC_KEEPALIVE_EXPIRY_SECONDS = 30
+ASYNC_REQUEST_TIMEOUT_SECONDS = 60
+
+# Batch Replies (/api/generate-replies)
+BATCH_MAX_ITEMS = 1000
+BATCH_CONCURRENCY = 8  # Model calls in flight per batch request
+
+# Log Writer - records are written in groups off the request path
+LOG_WRITER_MAX_BATCH = 256  # Records per group commit
+LOG_WRITER_FLUSH_INTERVAL = 0.2  # Max seconds a record waits before writing
+
+# Log Storage - "jsonl" (daily files in logs/) or "sqlite"
+LOG_BACKEND = "jsonl"
+LOG_DB_PATH = "logs/interactions.db"  # Used when LOG_BACKEND = "sqlite"
+
+# Log Archive - sealed JSONL days compacted by "python log_archive.py compact"
+LOG_ARCHIVE_AFTER_DAYS = 2  # Days kept as JSONL (today and yesterday still get writes)
@@ -0,0 +1,208 @@
+#!/usr/bin/env python3
+"""
+Fake Message Batches Server
+Local stand-in for the Anthropic Message Batches API so bulk jobs can be
+run and tested offline. Point the SDK at it with base_url.
+"""
+
+import argparse
+import json
+import re
+import threading
+import time
+import uuid
+from datetime import datetime, timedelta, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+BATCH_PATH = re.compile(r'^/v1/messages/batches/(?P<batch_id>[\w-]+)(?P<results>/results)?$')
+
+
+def _iso(timestamp):
+    return datetime.fromtimestamp(timestamp, timezone.utc).isoformat().replace('+00:00', 'Z')
+
+
+class FakeBatchStore:
+    """In-memory batches that finish a fixed delay after they are created"""
+
+    def __init__(self, delay=2.0, error_every=0):
+        self.delay = delay
+        self.error_every = error_every
+        self.batches = {}
+        self._lock = threading.Lock()
+
+    def create(self, requests):
+        batch_id = f"msgbatch_{uuid.uuid4().hex[:24]}"
+        with self._lock:
+            self.batches[batch_id] = {
+                'requests': requests,
+                'created_at': time.time()
+            }
+        return batch_id
+
+    def is_ended(self, batch_id):
+        return time.time() - self.batches[batch_id]['created_at'] >= self.delay
+
+    def describe(self, batch_id, base_url):
+        """MessageBatch object as returned by the real API"""
+        batch = self.batches[batch_id]
+        ended = self.is_ended(batch_id)
+        total = len(batch['requests'])
+        errored = len([i for i in range(total) if self._fails(i)]) if ended else 0
+
+        return {
+            'id': batch_id,
+            'type': 'message_batch',
+            'processing_status': 'ended' if ended else 'in_progress',
+            'request_counts': {
+                'processing': 0 if ended else total,
+                'succeeded': total - errored if ended else 0,
+                'errored': errored,
+                'canceled': 0,
+                'expired': 0
+            },
+            'created_at': _iso(batch['created_at']),
+            'expires_at': _iso(batch['created_at'] + timedelta(days=1).total_seconds()),
+            'ended_at': _iso(batch['created_at'] + self.delay) if ended else None,
+            'archived_at': None,
+            'cancel_initiated_at': None,
+            'results_url': f"{base_url}/v1/messages/batches/{batch_id}/results" if ended else None
+        }
+
+    def _fails(self, index):
+        return self.error_every > 0 and (index + 1) % self.error_every == 0
+
+    def results(self, batch_id):
+        """JSONL result lines, one per request"""
+        lines = []
+        for index, request in enumerate(self.batches[batch_id]['requests']):
+            lines.append(json.dumps({
+                'custom_id': request['custom_id'],
+                'result': self._result(index, request['params'])
+            }))
+        return '\n'.join(lines) + '\n'
+
+    def _result(self, index, params):
+        if self._fails(index):
+            return {
+                'type': 'errored',
+                'error': {
+                    'type': 'error',
+                    'error': {'type': 'overloaded_error', 'message': 'Fake overload'}
+                }
+            }
+
+        content = params['messages'][-1]['content']
+        system = params.get('system', '')
+        if isinstance(system, list):  # Content blocks, e.g. with cache_control
+            system = '\n\n'.join(block['text'] for block in system)
+        message = content.split('\n\n')[0].replace('Customer message: ', '')
+        text = f"Thanks for getting in touch about \"{message}\". I'm looking into it now and will follow up shortly."
+        return {
+            'type': 'succeeded',
+            'message': {
+                'id': f"msg_{uuid.uuid4().hex[:24]}",
+                'type': 'message',
+                'role': 'assistant',
+                'model': params.get('model', 'fake-model'),
+                'content': [{'type': 'text', 'text': text}],
+                'stop_reason': 'end_turn',
+                'stop_sequence': None,
+                'usage': {
+                    'input_tokens': len(system.split()) + len(content.split()),
+                    'output_tokens': len(text.split())
+                }
+            }
+        }
+
+
+class FakeBatchHandler(BaseHTTPRequestHandler):
+    """Routes the subset of /v1/messages/batches used by batch_replies.py"""
+
+    store = None
+
+    def _base_url(self):
+        host, port = self.server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def _send(self, status, body, content_type='application/json'):
+        data = body.encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _not_found(self):
+        self._send(404, json.dumps({
+            'type': 'error',
+            'error': {'type': 'not_found_error', 'message': f"Unknown path {self.path}"}
+        }))
+
+    def do_POST(self):
+        if self.path.split('?')[0] != '/v1/messages/batches':
+            return self._not_found()
+
+        length = int(self.headers.get('Content-Length', 0))
+        body = json.loads(self.rfile.read(length) or b'{}')
+        batch_id = self.store.create(body.get('requests', []))
+        self._send(200, json.dumps(self.store.describe(batch_id, self._base_url())))
+
+    def do_GET(self):
+        match = BATCH_PATH.match(self.path.split('?')[0])
+        if not match or match.group('batch_id') not in self.store.batches:
+            return self._not_found()
+
+        batch_id = match.group('batch_id')
+        if match.group('results'):
+            if not self.store.is_ended(batch_id):
+                return self._not_found()
+            return self._send(200, self.store.results(batch_id), 'application/binary')
+
+        self._send(200, json.dumps(self.store.describe(batch_id, self._base_url())))
+
+    def log_message(self, format, *args):
+        pass
+
+
+class FakeBatchServer:
+    """Runs the fake API on a background thread; use base_url with the SDK"""
+
+    def __init__(self, host='127.0.0.1', port=0, delay=2.0, error_every=0):
+        handler = type('Handler', (FakeBatchHandler,), {
+            'store': FakeBatchStore(delay=delay, error_every=error_every)
+        })
+        self.httpd = ThreadingHTTPServer((host, port), handler)
+        self.thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+
+    @property
+    def base_url(self):
+        host, port = self.httpd.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self):
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Local fake Anthropic Message Batches API")
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--delay', type=float, default=2.0, help="Seconds until a batch ends")
+    parser.add_argument('--error-every', type=int, default=0, help="Fail every Nth request (0 = never)")
+    args = parser.parse_args()
+
+    server = FakeBatchServer(port=args.port, delay=args.delay, error_every=args.error_every)
+    print(f"🧪 Fake batch API running at {server.base_url}")
+    print(f"   python batch_replies.py tickets.jsonl --base-url {server.base_url}")
+    try:
+        server.httpd.serve_forever()
+    except KeyboardInterrupt:
+        server.httpd.server_close()
+
+
+if __name__ == '__main__':
+    main()
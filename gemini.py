@@ -1,21 +1,24 @@
 from dotenv import load_dotenv
 load_dotenv()
 
-from flask import Flask, request, jsonify, render_template
+from flask import Flask, Response, request, jsonify, render_template, stream_with_context
 from flask_cors import CORS
-from datetime import datetime
+import itertools
 import json
 import os
-import re
+import time
+import config
+from admission import Overloaded
+from providers import GeminiProvider, ProviderRouter, build_providers
+from server_common import (
+    BaseAssistant, DemoMode, Logger, batch_result_line, metrics, overloaded, parse_batch, rate_limit_wait, rate_limited,
+    rate_limiter, sse_event
+)
 import google.generativeai as genai
 
 app = Flask(__name__)
 CORS(app)
 
-# Configuration
-LOG_DIR = "logs"
-os.makedirs(LOG_DIR, exist_ok=True)
-
 # Initialize Gemini
 gemini_client = None
 if os.environ.get('GEMINI_API_KEY'):
@@ -25,157 +28,35 @@ if os.environ.get('GEMINI_API_KEY'):
 else:
     print("⚠️ Gemini API: Demo Mode (set GEMINI_API_KEY)")
 
-class AIAssistant:
+class AIAssistant(BaseAssistant):
     """AI assistant with Gemini integration"""
     
     def __init__(self):
-        self.max_input_length = 2000
-        self.max_output_length = 1000
-    
-    def _build_system_prompt(self, tone="professional", industry="general"):
-        """The competitive advantage - your unique AI personality"""
-        return f"""You are a skilled customer support assistant for {industry} business.
-
-Core Principles:
-- Tone: {tone}, friendly, and empathetic
-- Goal: Solve the customer's problem quickly and effectively
-- Style: Clear, concise, human (never robotic)
-- Length: Keep responses short but complete (2-4 sentences ideal)
-
-Rules:
-1. Always acknowledge the customer's concern first
-2. Provide a clear solution or next step
-3. End with helpfulness, not just closing
-4. Never use corporate jargon or templates
-5. Sound like a real person who cares
-
-If you cannot solve the issue, escalate politely and explain why.
-Never make promises the business cannot keep."""
-
-    def clean_input(self, message):
-        """Sanitize and validate user input"""
-        if not message:
-            raise ValueError("Message cannot be empty")
-        
-        cleaned = re.sub(r'\s+', ' ', message.strip())
-        
-        if len(cleaned) > self.max_input_length:
-            cleaned = cleaned[:self.max_input_length] + "..."
-        
-        if self._contains_unsafe_content(cleaned):
-            raise ValueError("Message contains inappropriate content")
-        
-        return cleaned
-    
-    def _contains_unsafe_content(self, text):
-        """Basic content filter"""
-        unsafe_patterns = [
-            r'<script',
-            r'javascript:',
-            r'onerror=',
-        ]
-        return any(re.search(pattern, text, re.IGNORECASE) for pattern in unsafe_patterns)
-    
-    def generate_reply(self, customer_message, business_name="our team", settings=None):
-        """Generate AI reply using Gemini API"""
-        settings = settings or {}
-        
-        cleaned_message = self.clean_input(customer_message)
-        
-        tone = settings.get('tone', 'professional')
-        industry = settings.get('industry', 'general business')
-        add_signature = settings.get('add_signature', True)
-        
-        system_prompt = self._build_system_prompt(tone, industry)
-        
-        # Call Gemini API
-        ai_response = self._call_gemini_api(system_prompt, cleaned_message)
-        
-        # Format response
-        formatted_response = self._format_response(
-            ai_response, 
-            business_name, 
-            add_signature
+        self.model = 'gemini-2.5-flash'
+        super().__init__()
+        self.providers = ProviderRouter.from_config(
+            build_providers(config.PROVIDERS or ['gemini'], gemini=GeminiProvider(gemini_client, self._build_full_prompt))
         )
-        
-        return {
-            'reply': formatted_response,
-            'original_message': customer_message,
-            'cleaned_message': cleaned_message,
-            'settings_used': settings
-        }
     
-    def _call_gemini_api(self, system_prompt, message):
-        """Real Gemini AI integration"""
-        if not gemini_client:
-            return self._generate_demo_response(message)
+    def _call_model(self, system_prompt, message, usage=None):
+        """Model call through the provider router (Gemini unless config.PROVIDERS adds others) - raises on API errors"""
+        if not self.providers.providers:
+            raise DemoMode("no API client")
         
-        try:
-            # Combine system prompt and user message
-            full_prompt = f"{system_prompt}\n\nCustomer message: {message}\n\nPlease provide a helpful customer support reply."
-            
-            response = gemini_client.generate_content(full_prompt)
-            return response.text
-        
-        except Exception as e:
-            print(f"Gemini API Error: {e}")
-            return self._generate_demo_response(message)
+        with self._admitted():
+            return self.providers.generate(system_prompt, message, usage)
     
-    def _generate_demo_response(self, message):
-        """Demo fallback when API unavailable"""
-        message_lower = message.lower()
+    def _stream_model(self, system_prompt, message, usage=None):
+        """Yield reply text from the provider router's stream (Gemini unless config.PROVIDERS adds others) - raises on API errors"""
+        if not self.providers.providers:
+            raise DemoMode("no API client")
         
-        if 'refund' in message_lower or 'money back' in message_lower:
-            return "I understand you're looking for a refund. I'd be happy to help you with that. Could you please provide your order number so I can process this right away?"
-        
-        elif 'shipping' in message_lower or 'delivery' in message_lower:
-            return "Thanks for reaching out about your delivery. I've checked your order and it's currently on its way. You should receive it within 2-3 business days. I'll send you a tracking link right now."
-        
-        elif 'not working' in message_lower or 'broken' in message_lower or 'issue' in message_lower:
-            return "I'm sorry to hear you're experiencing issues. Let's get this fixed for you right away. Can you tell me exactly what's happening when you try to use it? This will help me find the best solution."
-        
-        elif 'cancel' in message_lower:
-            return "I can help you with that cancellation. Just to confirm, which subscription or order would you like to cancel? I'll process it immediately once you let me know."
-        
-        else:
-            return "Thank you for contacting us! I'm here to help. Could you provide a bit more detail about what you need? That way, I can give you the most accurate assistance."
+        with self._admitted():
+            yield from self.providers.stream(system_prompt, message, usage)
     
-    def _format_response(self, ai_response, business_name, add_signature):
-        """Polish the AI output"""
-        formatted = ai_response.strip()
-        
-        if add_signature:
-            formatted += f"\n\nBest regards,\n{business_name}"
-        
-        if len(formatted) > self.max_output_length:
-            formatted = formatted[:self.max_output_length] + "..."
-        
-        return formatted
-
-class Logger:
-    """Logging system for continuous improvement"""
-    
-    @staticmethod
-    def log_interaction(customer_message, ai_reply, settings, user_edit=None):
-        """Save interaction for analysis and training"""
-        timestamp = datetime.now().isoformat()
-        
-        log_entry = {
-            'timestamp': timestamp,
-            'customer_message': customer_message,
-            'ai_reply': ai_reply,
-            'settings': settings,
-            'user_edit': user_edit,
-            'edited': user_edit is not None
-        }
-        
-        date_str = datetime.now().strftime('%Y-%m-%d')
-        log_file = os.path.join(LOG_DIR, f'interactions_{date_str}.jsonl')
-        
-        with open(log_file, 'a') as f:
-            f.write(json.dumps(log_entry) + '\n')
-        
-        return log_entry
+    def _build_full_prompt(self, system_prompt, message):
+        """Combine system prompt and user message"""
+        return f"{system_prompt}\n\nCustomer message: {message}\n\nPlease provide a helpful customer support reply."
 
 # Initialize AI assistant
 assistant = AIAssistant()
@@ -191,6 +72,7 @@ def index():
 def generate_reply():
     """Main endpoint for generating customer support replies"""
     try:
+        start_time = time.perf_counter()
         data = request.json
         
         customer_message = data.get('message', '')
@@ -200,21 +82,33 @@ def generate_reply():
             'industry': data.get('industry', 'general business'),
             'add_signature': data.get('add_signature', True)
         }
+        use_cache = not data.get('bypass_cache', False)
         
-        result = assistant.generate_reply(customer_message, business_name, settings)
+        wait = rate_limit_wait(request, customer_message)
+        if wait:
+            return rate_limited(wait)
+        
+        result = assistant.generate_reply(customer_message, business_name, settings, use_cache)
         
         Logger.log_interaction(
             customer_message=customer_message,
             ai_reply=result['reply'],
-            settings=settings
+            settings=settings,
+            routing=result['routing'],
+            prompt_version=result['prompt_version'],
+            usage=result['usage']
         )
+        metrics.observe('generate_reply.total', time.perf_counter() - start_time)
         
         return jsonify({
             'success': True,
             'reply': result['reply'],
             'metadata': {
                 'cleaned_message': result['cleaned_message'],
-                'settings_used': result['settings_used']
+                'settings_used': result['settings_used'],
+                'cached': result['cached'],
+                'intent': result['intent'],
+                'prompt_version': result['prompt_version']
             }
         })
     
@@ -224,12 +118,144 @@ def generate_reply():
             'error': str(e)
         }), 400
     
+    except Overloaded as e:
+        return overloaded(e)
+    
     except Exception as e:
         return jsonify({
             'success': False,
             'error': 'An unexpected error occurred'
         }), 500
 
+@app.route('/api/generate-reply/stream', methods=['POST'])
+def generate_reply_stream():
+    """Streaming variant of /api/generate-reply using Server-Sent Events"""
+    try:
+        start_time = time.perf_counter()
+        data = request.json
+        
+        customer_message = data.get('message', '')
+        business_name = data.get('business_name', 'Our Support Team')
+        settings = {
+            'tone': data.get('tone', 'professional'),
+            'industry': data.get('industry', 'general business'),
+            'add_signature': data.get('add_signature', True)
+        }
+        use_cache = not data.get('bypass_cache', False)
+        
+        wait = rate_limit_wait(request, customer_message)
+        if wait:
+            return rate_limited(wait)
+        
+        # Pull the first event here so validation errors still return a 400
+        stream = assistant.stream_reply(customer_message, business_name, settings, use_cache)
+        first_event = next(stream)
+        metrics.observe('generate_reply_stream.ttft', time.perf_counter() - start_time)
+    
+    except ValueError as e:
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 400
+    
+    except Overloaded as e:
+        return overloaded(e)
+    
+    except Exception as e:
+        return jsonify({
+            'success': False,
+            'error': 'An unexpected error occurred'
+        }), 500
+    
+    def events():
+        try:
+            for event, payload in itertools.chain([first_event], stream):
+                if event == 'chunk':
+                    yield sse_event('chunk', {'text': payload})
+                    continue
+                
+                Logger.log_interaction(
+                    customer_message=customer_message,
+                    ai_reply=payload['reply'],
+                    settings=settings,
+                    routing=payload['routing'],
+                    prompt_version=payload['prompt_version'],
+                    usage=payload['usage']
+                )
+                metrics.observe('generate_reply_stream.total', time.perf_counter() - start_time)
+                
+                yield sse_event('done', {
+                    'success': True,
+                    'reply': payload['reply'],
+                    'metadata': {
+                        'cleaned_message': payload['cleaned_message'],
+                        'settings_used': payload['settings_used'],
+                        'cached': payload['cached'],
+                        'intent': payload['intent'],
+                        'prompt_version': payload['prompt_version']
+                    }
+                })
+        
+        except Exception as e:
+            print(f"Stream Error: {e}")
+            yield sse_event('error', {
+                'success': False,
+                'error': 'An unexpected error occurred'
+            })
+    
+    return Response(
+        stream_with_context(events()),
+        mimetype='text/event-stream',
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+    )
+
+@app.route('/api/generate-replies', methods=['POST'])
+def generate_replies():
+    """Batch endpoint - streams one NDJSON line per message as each finishes"""
+    try:
+        data = request.json
+        items = parse_batch(data)
+    
+    except ValueError as e:
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 400
+    
+    # The whole batch is charged up front: one request per message
+    wait = rate_limit_wait(request, *(item['message'] for item in items))
+    if wait:
+        return rate_limited(wait)
+    
+    def results():
+        log_entries = []
+        succeeded = 0
+        try:
+            for index, result, error in assistant.generate_replies(items, config.BATCH_CONCURRENCY):
+                item = items[index]
+                if error is None:
+                    succeeded += 1
+                    log_entries.append(Logger.build_entry(
+                        customer_message=item['message'],
+                        ai_reply=result['reply'],
+                        settings=item['settings'],
+                        routing=result['routing'],
+                        prompt_version=result['prompt_version'],
+                        usage=result['usage']
+                    ))
+                yield batch_result_line(item, index, result, error)
+            
+            yield json.dumps({
+                'done': True,
+                'total': len(items),
+                'succeeded': succeeded,
+                'failed': len(items) - succeeded
+            }) + '\n'
+        finally:
+            Logger.log_interactions(log_entries)
+    
+    return Response(results(), mimetype='application/x-ndjson')
+
 @app.route('/api/feedback', methods=['POST'])
 def submit_feedback():
     """Endpoint for user edits"""
@@ -240,11 +266,15 @@ def submit_feedback():
         edited_reply = data.get('edited_reply', '')
         customer_message = data.get('customer_message', '')
         
+        # Tone and industry attribute the edit for per-intent edit rates
+        settings = {key: data[key] for key in ('tone', 'industry') if key in data}
+        
         Logger.log_interaction(
             customer_message=customer_message,
             ai_reply=original_reply,
-            settings={},
-            user_edit=edited_reply
+            settings=settings,
+            user_edit=edited_reply,
+            prompt_version=data.get('prompt_version')
         )
         
         return jsonify({
@@ -262,30 +292,19 @@ def submit_feedback():
 def get_stats():
     """Analytics endpoint"""
     try:
-        total_interactions = 0
-        total_edited = 0
-        
-        for filename in os.listdir(LOG_DIR):
-            if filename.startswith('interactions_') and filename.endswith('.jsonl'):
-                filepath = os.path.join(LOG_DIR, filename)
-                with open(filepath, 'r') as f:
-                    for line in f:
-                        entry = json.loads(line)
-                        total_interactions += 1
-                        if entry.get('edited'):
-                            total_edited += 1
-        
-        accuracy_rate = 0
-        if total_interactions > 0:
-            accuracy_rate = ((total_interactions - total_edited) / total_interactions) * 100
+        stats = Logger.get_stats()
+        stats['reply_cache'] = assistant.reply_cache.stats()
+        stats['semantic_cache'] = assistant.semantic_cache.stats() if assistant.semantic_cache else None
+        stats['canned_replies'] = assistant.canned_replies.stats() if assistant.canned_replies else None
+        stats['single_flight'] = assistant.single_flight.stats() if assistant.single_flight else None
+        stats['providers'] = assistant.providers.stats()
+        stats['prompts'] = assistant.prompts.stats()
+        stats['rate_limit'] = rate_limiter.stats() if rate_limiter else None
+        stats['admission'] = assistant.admission.stats() if assistant.admission else None
         
         return jsonify({
             'success': True,
-            'stats': {
-                'total_interactions': total_interactions,
-                'total_edited': total_edited,
-                'accuracy_rate': round(accuracy_rate, 2)
-            }
+            'stats': stats
         })
     
     except Exception as e:
@@ -294,6 +313,14 @@ def get_stats():
             'error': str(e)
         }), 500
 
+@app.route('/api/metrics', methods=['GET'])
+def get_metrics():
+    """Latency and counter metrics for this worker"""
+    return jsonify({
+        'success': True,
+        'metrics': metrics.snapshot()
+    })
+
 if __name__ == '__main__':
     print("🚀 AI Customer Support Assistant (Gemini) Starting...")
     print("📍 Server running at http://localhost:5000")
@@ -0,0 +1,171 @@
+#!/usr/bin/env python3
+"""
+Intents
+Shared intent classifier for the demo responder, the pre-LLM routing
+hook (AIAssistant._route) and analyze_log.py's common issues.
+
+INTENTS is a table of phrases with weights. Every phrase is compiled into
+one trie-shaped regex, so a single scan of a message finds all phrases of
+all intents. Phrases match whole words only ('issue' is not found in
+"tissue"), so inflections are listed as phrases of their own: every
+form the old substring checks caught ('cancelling', 'refunding',
+'money-back', ...) is in the table. Intent scores combine the weights of
+the distinct phrases found (noisy-or), giving a ranked list with scores
+in [0, 1).
+
+Benchmark:
+    python intents.py --messages 20000
+"""
+
+import argparse
+import random
+import re
+import string
+import time
+from collections import namedtuple
+
+# (intent, ((phrase, weight), ...)) - the order breaks ties between equal scores
+INTENTS = (
+    ('refund_requests', (('refund', 0.9), ('refunds', 0.9), ('refunded', 0.9), ('refunding', 0.9),
+                         ('refundable', 0.9), ('money back', 0.9), ('money-back', 0.9))),
+    ('shipping_inquiries', (('shipping', 0.9), ('delivery', 0.9), ('deliveries', 0.9), ('deliver', 0.9),
+                            ('delivers', 0.9), ('delivered', 0.9), ('delivering', 0.9))),
+    ('technical_issues', (('not working', 0.9), ('broken', 0.9), ('issue', 0.5), ('issues', 0.5))),
+    ('cancellations', (('cancel', 0.9), ('cancels', 0.9), ('cancelled', 0.9), ('canceled', 0.9),
+                       ('cancelling', 0.9), ('canceling', 0.9), ('cancellation', 0.9), ('cancellations', 0.9))),
+    ('general_support', (('help', 0.5), ('helps', 0.5), ('helped', 0.5), ('helping', 0.5), ('support', 0.5))),
+)
+
+# Demo-mode replies for the top intent
+DEMO_RESPONSES = {
+    'refund_requests': "I understand you're looking for a refund. I'd be happy to help you with that. Could you please provide your order number so I can process this right away?",
+    'shipping_inquiries': "Thanks for reaching out about your delivery. I've checked your order and it's currently on its way. You should receive it within 2-3 business days. I'll send you a tracking link right now.",
+    'technical_issues': "I'm sorry to hear you're experiencing issues. Let's get this fixed for you right away. Can you tell me exactly what's happening when you try to use it? This will help me find the best solution.",
+    'cancellations': "I can help you with that cancellation. Just to confirm, which subscription or order would you like to cancel? I'll process it immediately once you let me know.",
+}
+DEFAULT_DEMO_RESPONSE = "Thank you for contacting us! I'm here to help. Could you provide a bit more detail about what you need? That way, I can give you the most accurate assistance."
+
+IntentMatch = namedtuple('IntentMatch', ['name', 'score', 'phrases'])
+
+
+def _trie_regex(phrases):
+    """Alternation of phrases, factored by shared prefixes; longest phrase wins at each position"""
+    trie = {}
+    for phrase in phrases:
+        node = trie
+        for char in phrase:
+            node = node.setdefault(char, {})
+        node[''] = {}
+    return _node_regex(trie)
+
+
+def _node_regex(node):
+    branches = [re.escape(char) + _node_regex(child) for char, child in sorted(node.items()) if char]
+    if not branches:
+        return ''
+    alternation = branches[0] if len(branches) == 1 else '(?:' + '|'.join(branches) + ')'
+    # A phrase ending here is still a match when no longer phrase continues it
+    return f'(?:{alternation})?' if '' in node else alternation
+
+
+class IntentClassifier:
+    """Finds every intent of a message in one regex scan"""
+
+    def __init__(self, intents=INTENTS):
+        self.names = [name for name, _ in intents]
+        self.weights = {}
+        for position, (name, phrases) in enumerate(intents):
+            for phrase, weight in phrases:
+                self.weights.setdefault(phrase.lower(), []).append((position, weight))
+
+        # The lookahead reports the longest whole-word phrase starting at
+        # every word start, so overlapping phrases are all found; shorter
+        # phrases that are prefixes of it ending on a word boundary match too
+        self._regex = re.compile(rf'\b(?=({_trie_regex(self.weights)})\b)')
+        self._prefixes = {
+            phrase: [other for other in self.weights if re.match(re.escape(other) + r'\b', phrase)]
+            for phrase in self.weights
+        }
+
+    def phrases(self, text):
+        """Distinct table phrases occurring as whole words in text (case-insensitive)"""
+        found = set()
+        for phrase in self._regex.findall(text.lower()):
+            found.update(self._prefixes[phrase])
+        return found
+
+    def classify(self, text):
+        """[IntentMatch], best first; ties keep table order"""
+        misses = {}
+        matched = {}
+        for phrase in self.phrases(text):
+            for position, weight in self.weights[phrase]:
+                misses[position] = misses.get(position, 1.0) * (1 - weight)
+                matched.setdefault(position, []).append(phrase)
+
+        ranked = sorted(misses, key=lambda position: (misses[position], position))
+        return [
+            IntentMatch(self.names[position], round(1 - misses[position], 4), sorted(matched[position]))
+            for position in ranked
+        ]
+
+    def top(self, text):
+        """Best intent name, or None when no phrase matches"""
+        intents = self.classify(text)
+        return intents[0].name if intents else None
+
+    def matched(self, text):
+        """Names of all intents present, in table order"""
+        positions = {position for phrase in self.phrases(text) for position, _ in self.weights[phrase]}
+        return [self.names[position] for position in sorted(positions)]
+
+
+intent_classifier = IntentClassifier()
+
+
+def benchmark(messages=20000, phrases=(0, 1000)):
+    """One regex scan vs a search per phrase, as the phrase table grows"""
+    rng = random.Random(0)
+    words = ['order', 'my', 'the', 'please', 'refund', 'delivery', 'app', 'not working', 'cancel',
+             'account', 'thanks', 'help', 'today', 'package', 'late', 'broken', 'charged', 'twice']
+    samples = [' '.join(rng.choice(words) for _ in range(rng.randint(5, 60))) for _ in range(messages)]
+
+    for extra in phrases:
+        # Synthetic intents of random phrases on top of the real table
+        table = list(INTENTS) + [
+            (f'intent_{i}', tuple((''.join(rng.choices(string.ascii_lowercase, k=rng.randint(5, 10))), 0.9)
+                                  for _ in range(10)))
+            for i in range(extra // 10)
+        ]
+        classifier = IntentClassifier(table)
+
+        start = time.perf_counter()
+        results = [classifier.matched(text) for text in samples]
+        scan_time = time.perf_counter() - start
+
+        start = time.perf_counter()
+        for text in samples:
+            classifier.classify(text)
+        classify_time = time.perf_counter() - start
+
+        searches = [(name, [re.compile(rf'\b{re.escape(phrase)}\b') for phrase, _ in table_phrases])
+                    for name, table_phrases in table]
+        start = time.perf_counter()
+        expected = []
+        for text in samples:
+            lowered = text.lower()
+            expected.append([name for name, patterns in searches
+                             if any(pattern.search(lowered) for pattern in patterns)])
+        loop_time = time.perf_counter() - start
+
+        phrase_count = sum(len(table_phrases) for _, table_phrases in table)
+        print(f"🧭 {messages} messages, {phrase_count} phrases, results {'match' if results == expected else 'DIFFER'}")
+        print(f"   per-phrase search: {loop_time / messages * 1e6:7.1f} µs/message")
+        print(f"   single scan:       {scan_time / messages * 1e6:7.1f} µs/message")
+        print(f"   ranked classify:   {classify_time / messages * 1e6:7.1f} µs/message")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Benchmark the intent classifier")
+    parser.add_argument('--messages', type=int, default=20000)
+    benchmark(parser.parse_args().messages)
@@ -0,0 +1,284 @@
+#!/usr/bin/env python3
+"""
+Log Archive
+Compacts sealed interactions_YYYY-MM-DD.jsonl days into columnar .npz files
+
+Each string column is dictionary-encoded (int32 codes plus the distinct
+values as one UTF-8 blob), so readers load only the columns they use and
+decode each distinct value once. Reply lengths, the edited flag and the
+model call's latency, tokens and cost (usage_stats.USAGE_COLUMNS) are
+stored as plain arrays for stats, edit and usage analysis.
+
+Compact every day older than config.LOG_ARCHIVE_AFTER_DAYS:
+    python log_archive.py compact --log-dir logs
+"""
+
+import argparse
+import json
+import os
+import tempfile
+import time
+from datetime import date, timedelta
+
+import numpy as np
+
+import config
+from usage_stats import USAGE_COLUMNS, empty_usage_counts, usage_arrays, usage_counts_from_columns, usage_row
+
+LOG_PREFIX = 'interactions_'
+LOG_SUFFIX = '.jsonl'
+ARCHIVE_SUFFIX = '.npz'
+
+STRING_COLUMNS = ('timestamp', 'customer_message', 'ai_reply', 'user_edit', 'tone', 'industry', 'settings', 'extra')
+ENTRY_KEYS = ('timestamp', 'customer_message', 'ai_reply', 'settings', 'user_edit', 'edited')
+
+
+def encode_strings(values):
+    """Dictionary-encode a list of str/None as (codes, blob, offsets); None is code -1"""
+    index = {}
+    codes = np.empty(len(values), dtype=np.int32)
+    for i, value in enumerate(values):
+        codes[i] = -1 if value is None else index.setdefault(value, len(index))
+
+    encoded = [value.encode('utf-8') for value in index]
+    offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+    np.cumsum([len(value) for value in encoded], out=offsets[1:])
+    blob = np.frombuffer(b''.join(encoded), dtype=np.uint8)
+    return codes, blob, offsets
+
+
+def decode_values(blob, offsets):
+    """Distinct values of a dictionary-encoded column"""
+    data = blob.tobytes()
+    return [data[offsets[i]:offsets[i + 1]].decode('utf-8') for i in range(len(offsets) - 1)]
+
+
+class Archive:
+    """Lazy reader; only the .npz members that are touched get loaded"""
+
+    def __init__(self, path):
+        self.path = path
+        self._npz = np.load(path)
+
+    def __len__(self):
+        return len(self._npz['edited'])
+
+    def column(self, name):
+        return self._npz[name]
+
+    def strings(self, name):
+        """(codes, distinct values) for a string column"""
+        return self._npz[f'{name}_codes'], decode_values(self._npz[f'{name}_blob'], self._npz[f'{name}_offsets'])
+
+    def decoded(self, name):
+        """Per-row values of a string column, None where missing"""
+        codes, values = self.strings(name)
+        return [values[code] if code >= 0 else None for code in codes]
+
+    def group_counts(self, name):
+        """{value: [total, edited]} for a string column such as tone"""
+        codes, values = self.strings(name)
+        present = codes >= 0
+        codes, edited = codes[present], self.column('edited')[present]
+        totals = np.bincount(codes, minlength=len(values))
+        edits = np.bincount(codes, weights=edited, minlength=len(values))
+        return {value: [int(totals[i]), int(edits[i])] for i, value in enumerate(values) if totals[i]}
+
+    def usage(self):
+        """{column: array} of the usage columns, or None for archives written without them"""
+        if USAGE_COLUMNS[0] not in self._npz.files:
+            return None
+        usage = {name: self.column(name) for name in USAGE_COLUMNS if name in self._npz.files}
+        if 'requests' not in usage:
+            # Written before model calls without a latency were logged
+            usage['requests'] = (~np.isnan(usage['latency_ms'])).astype(np.int64)
+        return usage
+
+    def usage_counts(self):
+        """Usage overall and per tone and industry (see usage_stats.py)"""
+        usage = self.usage()
+        if usage is None:
+            return empty_usage_counts()
+        return usage_counts_from_columns(self.strings('tone'), self.strings('industry'), usage)
+
+    def close(self):
+        self._npz.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def write_archive(log_entries, archive_path):
+    """Write log records as a compressed columnar archive (atomically)"""
+    columns = {name: [] for name in STRING_COLUMNS}
+    edited, ai_reply_len, user_edit_len, usage = [], [], [], []
+
+    for log_entry in log_entries:
+        settings = log_entry.get('settings', {})
+        extra = {key: value for key, value in log_entry.items() if key not in ENTRY_KEYS}
+        ai_reply = log_entry.get('ai_reply', '')
+        user_edit = log_entry.get('user_edit')
+
+        columns['timestamp'].append(log_entry.get('timestamp'))
+        columns['customer_message'].append(log_entry.get('customer_message', ''))
+        columns['ai_reply'].append(ai_reply)
+        columns['user_edit'].append(user_edit)
+        columns['tone'].append(settings.get('tone', 'unknown'))
+        columns['industry'].append(settings.get('industry', 'unknown'))
+        columns['settings'].append(json.dumps(settings) if 'settings' in log_entry else None)
+        columns['extra'].append(json.dumps(extra) if extra else None)
+        edited.append(bool(log_entry.get('edited')))
+        ai_reply_len.append(len(ai_reply) if ai_reply is not None else -1)
+        user_edit_len.append(len(user_edit) if user_edit is not None else -1)
+        usage.append(usage_row(log_entry))
+
+    arrays = {
+        'edited': np.array(edited, dtype=bool),
+        'ai_reply_len': np.array(ai_reply_len, dtype=np.int32),
+        'user_edit_len': np.array(user_edit_len, dtype=np.int32),
+        **usage_arrays(usage)
+    }
+    for name, values in columns.items():
+        arrays[f'{name}_codes'], arrays[f'{name}_blob'], arrays[f'{name}_offsets'] = encode_strings(values)
+
+    tmp_path = f"{archive_path}.{os.getpid()}.tmp"
+    with open(tmp_path, 'wb') as f:
+        np.savez_compressed(f, **arrays)
+    os.replace(tmp_path, archive_path)
+
+
+def iter_archive(archive_path):
+    """Rebuild the log records stored in an archive"""
+    with Archive(archive_path) as archive:
+        columns = {name: archive.decoded(name) for name in STRING_COLUMNS}
+        edited = archive.column('edited')
+
+    for i in range(len(edited)):
+        log_entry = {
+            'timestamp': columns['timestamp'][i],
+            'customer_message': columns['customer_message'][i],
+            'ai_reply': columns['ai_reply'][i]
+        }
+        if columns['settings'][i] is not None:
+            log_entry['settings'] = json.loads(columns['settings'][i])
+        log_entry['user_edit'] = columns['user_edit'][i]
+        log_entry['edited'] = bool(edited[i])
+        if columns['extra'][i]:
+            log_entry.update(json.loads(columns['extra'][i]))
+        yield log_entry
+
+
+def iter_jsonl(filepath):
+    """Records in one day file, skipping lines that are not valid JSON"""
+    with open(filepath, 'r') as f:
+        for line in f:
+            try:
+                yield json.loads(line)
+            except json.JSONDecodeError:
+                continue
+
+
+def iter_day_file(filepath):
+    """Records of one day, from JSONL or an archive"""
+    if filepath.endswith(ARCHIVE_SUFFIX):
+        return iter_archive(filepath)
+    return iter_jsonl(filepath)
+
+
+def day_of(filename):
+    """'2024-01-31' for interactions_2024-01-31.jsonl / .npz, else None"""
+    if not filename.startswith(LOG_PREFIX):
+        return None
+    for suffix in (LOG_SUFFIX, ARCHIVE_SUFFIX):
+        if filename.endswith(suffix):
+            return filename[len(LOG_PREFIX):-len(suffix)]
+    return None
+
+
+def day_files(log_dir):
+    """Daily log files, oldest first; an archived day is read from its archive
+
+    A JSONL file left next to its archive (compaction interrupted before
+    the delete) is ignored, so no day is counted twice.
+    """
+    filenames = sorted(os.listdir(log_dir))
+    archived = {day_of(name) for name in filenames if name.endswith(ARCHIVE_SUFFIX)}
+    return [
+        os.path.join(log_dir, name)
+        for name in filenames
+        if day_of(name) and (name.endswith(ARCHIVE_SUFFIX) or day_of(name) not in archived)
+    ]
+
+
+def compact(log_dir, after_days=2):
+    """Archive JSONL days before the last after_days days, then delete the JSONL"""
+    cutoff = (date.today() - timedelta(days=after_days)).isoformat()
+    saved = 0
+
+    for filename in sorted(os.listdir(log_dir)):
+        day = day_of(filename)
+        if not filename.endswith(LOG_SUFFIX) or not day or day > cutoff:
+            continue
+
+        jsonl_path = os.path.join(log_dir, filename)
+        archive_path = os.path.join(log_dir, f'{LOG_PREFIX}{day}{ARCHIVE_SUFFIX}')
+        if not os.path.exists(archive_path):
+            write_archive(list(iter_jsonl(jsonl_path)), archive_path)
+
+        before, after = os.path.getsize(jsonl_path), os.path.getsize(archive_path)
+        os.remove(jsonl_path)
+        saved += before - after
+        print(f"📦 {filename}: {before / 1024:.0f} KB → {after / 1024:.0f} KB")
+
+    return saved
+
+
+def benchmark(log_dir):
+    """Compare reading a day as JSONL vs the archive columns analytics use"""
+    for filepath in sorted(day_files(log_dir)):
+        if not filepath.endswith(ARCHIVE_SUFFIX):
+            continue
+        entries = list(iter_archive(filepath))
+        with tempfile.NamedTemporaryFile('w', suffix=LOG_SUFFIX, delete=False) as f:
+            f.write(''.join(json.dumps(log_entry) + '\n' for log_entry in entries))
+            jsonl_path = f.name
+
+        start = time.perf_counter()
+        edited = sum(1 for log_entry in iter_jsonl(jsonl_path) if log_entry.get('edited'))
+        jsonl_time = time.perf_counter() - start
+
+        start = time.perf_counter()
+        with Archive(filepath) as archive:
+            archive_edited = int(archive.column('edited').sum())
+            archive.group_counts('tone')
+        archive_time = time.perf_counter() - start
+
+        result = 'match' if edited == archive_edited else 'MISMATCH'
+        print(f"{os.path.basename(filepath)}: {len(entries)} records, edited counts {result}")
+        print(f"  JSONL   {os.path.getsize(jsonl_path) / 1024:8.0f} KB  {jsonl_time * 1000:8.1f} ms")
+        print(f"  archive {os.path.getsize(filepath) / 1024:8.0f} KB  {archive_time * 1000:8.1f} ms")
+        os.remove(jsonl_path)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Columnar archive for sealed interaction logs")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    compact_parser = subparsers.add_parser('compact', help="Archive JSONL days older than --after-days")
+    compact_parser.add_argument('--log-dir', default='logs')
+    compact_parser.add_argument('--after-days', type=int, default=config.LOG_ARCHIVE_AFTER_DAYS)
+    benchmark_parser = subparsers.add_parser('benchmark', help="JSONL vs archive read cost per archived day")
+    benchmark_parser.add_argument('--log-dir', default='logs')
+    args = parser.parse_args()
+
+    if args.command == 'compact':
+        saved = compact(args.log_dir, args.after_days)
+        print(f"✅ Saved {saved / 1024 / 1024:.1f} MB")
+    else:
+        benchmark(args.log_dir)
+
+
+if __name__ == '__main__':
+    main()
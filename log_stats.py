@@ -0,0 +1,241 @@
+"""
+Log Stats
+Incrementally maintained interaction counters for /api/stats, plus the
+latency, token and cost aggregates of interactions that called a model
+"""
+
+import json
+import os
+import threading
+import time
+from datetime import date, timedelta
+
+from log_archive import ARCHIVE_SUFFIX, LOG_PREFIX, LOG_SUFFIX, Archive, day_of
+from usage_stats import add_usage_counts, empty_usage_counts, merge_usage_counts, usage_summary
+
+INDEX_VERSION = 2  # Saved indexes of another version are rebuilt from the logs
+
+
+class StatsIndex:
+    """Per-day and per tone/industry counters kept in step with the log files
+
+    Each day's counts are stored with the byte offset of its log file they
+    cover. Records this process commits are added as they are written;
+    records appended by other workers are picked up by reading only the
+    bytes past the saved offset. Past days are sealed once counted, and
+    totals are running sums, so a stats request never rescans history.
+    Days that were compacted before they were counted are read from the
+    edited/tone/industry columns of their archive.
+
+    Usage (latency sketches, tokens, cost) is kept per day only while a
+    day can still change; sealed days are folded into one saved aggregate
+    so the index does not grow with a sketch per day.
+    """
+
+    def __init__(self, log_dir, sidecar_name='stats_index.json', save_interval=1.0):
+        self.log_dir = log_dir
+        self.path = os.path.join(log_dir, sidecar_name)
+        self.save_interval = save_interval
+        self._days = {}
+        self._totals = self._empty_counts()
+        self._sealed_usage = empty_usage_counts()
+        self._dir_mtime = None
+        self._dirty = False
+        self._last_save = 0.0
+        self._lock = threading.Lock()
+        self._load()
+
+    @staticmethod
+    def _empty_counts():
+        return {'total': 0, 'edited': 0, 'by_tone': {}, 'by_industry': {}, 'usage': empty_usage_counts()}
+
+    @staticmethod
+    def _add(counts, log_entry, sign=1):
+        edited = 1 if log_entry.get('edited') else 0
+        settings = log_entry.get('settings') or {}
+
+        counts['total'] += sign
+        counts['edited'] += sign * edited
+        for key, value in (('by_tone', settings.get('tone', 'unknown')),
+                           ('by_industry', settings.get('industry', 'unknown'))):
+            group = counts[key].setdefault(value, [0, 0])
+            group[0] += sign
+            group[1] += sign * edited
+        # A sealed day gets usage counts again until the next refresh seals it
+        add_usage_counts(counts.setdefault('usage', empty_usage_counts()), log_entry, sign)
+
+    @staticmethod
+    def _merge(target, counts, sign=1):
+        target['total'] += sign * counts['total']
+        target['edited'] += sign * counts['edited']
+        for key in ('by_tone', 'by_industry'):
+            for value, (total, edited) in counts[key].items():
+                group = target[key].setdefault(value, [0, 0])
+                group[0] += sign * total
+                group[1] += sign * edited
+        if 'usage' in counts:
+            merge_usage_counts(target['usage'], counts['usage'], sign)
+
+    def on_commit(self, date_str, log_entries, size_before, size_after, nbytes):
+        """Count records this process just appended, if nobody else wrote in between"""
+        with self._lock:
+            day = self._days.get(date_str)
+            if day is None and size_before == 0:
+                day = self._days[date_str] = {'offset': 0, 'counts': self._empty_counts()}
+
+            # Otherwise another worker appended too; refresh() reads the tail
+            if day is None or day['offset'] != size_before or size_after != size_before + nbytes:
+                return
+
+            for log_entry in log_entries:
+                self._add(day['counts'], log_entry)
+                self._add(self._totals, log_entry)
+            day['offset'] = size_after
+            self._dirty = True
+            self._maybe_save()
+
+    def refresh(self):
+        """Catch up with new day files and the unread tail of recent days"""
+        with self._lock:
+            dir_mtime = os.stat(self.log_dir).st_mtime_ns
+            if dir_mtime != self._dir_mtime:
+                for filename in os.listdir(self.log_dir):
+                    date_str = day_of(filename)
+                    if date_str and date_str not in self._days:
+                        if filename.endswith(ARCHIVE_SUFFIX):
+                            self._count_archive(date_str)
+                        else:
+                            self._scan(date_str)
+                self._dir_mtime = dir_mtime
+
+            # Only today's file (and yesterday's, for records flushed just
+            # after midnight) can still grow; older days stay sealed
+            today = date.today()
+            for day in (today - timedelta(days=1), today):
+                date_str = day.isoformat()
+                if date_str in self._days and not self._days[date_str].get('archived'):
+                    self._scan(date_str)
+
+            self._seal_usage((today - timedelta(days=1)).isoformat())
+            self._maybe_save(force=True)
+
+    def _seal_usage(self, oldest_open):
+        """Move the usage of days before oldest_open (never rescanned) into the sealed aggregate"""
+        for date_str, day in self._days.items():
+            if date_str < oldest_open and 'usage' in day['counts']:
+                merge_usage_counts(self._sealed_usage, day['counts'].pop('usage'))
+                self._dirty = True
+
+    def _scan(self, date_str):
+        """Count complete lines past the saved offset of one day file"""
+        path = os.path.join(self.log_dir, f'{LOG_PREFIX}{date_str}{LOG_SUFFIX}')
+        try:
+            size = os.path.getsize(path)
+        except OSError:
+            return
+
+        day = self._days.setdefault(date_str, {'offset': 0, 'counts': self._empty_counts()})
+        if size < day['offset']:
+            # File was truncated or replaced; count it again from scratch
+            self._merge(self._totals, day['counts'], sign=-1)
+            day['offset'], day['counts'] = 0, self._empty_counts()
+        if size == day['offset']:
+            return
+
+        with open(path, 'rb') as f:
+            f.seek(day['offset'])
+            data = f.read(size - day['offset'])
+
+        # Leave a partially written last line for the next refresh
+        end = data.rfind(b'\n') + 1
+        for line in data[:end].splitlines():
+            try:
+                log_entry = json.loads(line)
+            except json.JSONDecodeError:
+                continue
+            self._add(day['counts'], log_entry)
+            self._add(self._totals, log_entry)
+
+        day['offset'] += end
+        self._dirty = True
+
+    def _count_archive(self, date_str):
+        """Counts for a compacted day, from the edited, tone/industry and usage columns of its archive"""
+        with Archive(os.path.join(self.log_dir, f'{LOG_PREFIX}{date_str}{ARCHIVE_SUFFIX}')) as archive:
+            edited = archive.column('edited')
+            counts = {
+                'total': len(edited),
+                'edited': int(edited.sum()),
+                'by_tone': archive.group_counts('tone'),
+                'by_industry': archive.group_counts('industry'),
+                'usage': archive.usage_counts()
+            }
+
+        self._days[date_str] = {'offset': 0, 'archived': True, 'counts': counts}
+        self._merge(self._totals, counts)
+        self._dirty = True
+
+    def summary(self):
+        """Totals, today's counts, per tone/industry accuracy, and model latency and cost"""
+        with self._lock:
+            today = self._days.get(date.today().isoformat())
+            today_counts = today['counts'] if today else self._empty_counts()
+            return {
+                'total_interactions': self._totals['total'],
+                'total_edited': self._totals['edited'],
+                'accuracy_rate': self._accuracy(self._totals['total'], self._totals['edited']),
+                'today': {
+                    'total_interactions': today_counts['total'],
+                    'total_edited': today_counts['edited']
+                },
+                'by_tone': self._breakdown(self._totals['by_tone']),
+                'by_industry': self._breakdown(self._totals['by_industry']),
+                'usage': usage_summary(self._totals['usage'])
+            }
+
+    @staticmethod
+    def _accuracy(total, edited):
+        return round((total - edited) / total * 100, 2) if total > 0 else 0
+
+    def _breakdown(self, groups):
+        return {
+            value: {
+                'total': total,
+                'edited': edited,
+                'accuracy_rate': self._accuracy(total, edited)
+            }
+            for value, (total, edited) in groups.items() if total > 0
+        }
+
+    def close(self):
+        """Save counts still held back by save_interval (runs at exit)"""
+        with self._lock:
+            self._maybe_save(force=True)
+
+    def _maybe_save(self, force=False):
+        if not self._dirty:
+            return
+        if not force and time.monotonic() - self._last_save < self.save_interval:
+            return
+
+        tmp_path = f"{self.path}.{os.getpid()}.tmp"
+        with open(tmp_path, 'w') as f:
+            json.dump({'version': INDEX_VERSION, 'days': self._days, 'sealed_usage': self._sealed_usage}, f)
+        os.replace(tmp_path, self.path)
+        self._dirty = False
+        self._last_save = time.monotonic()
+
+    def _load(self):
+        try:
+            with open(self.path, 'r') as f:
+                saved = json.load(f)
+        except (OSError, ValueError):
+            return
+        if saved.get('version') != INDEX_VERSION:
+            return
+
+        self._days = saved['days']
+        self._sealed_usage = saved['sealed_usage']
+        for day in self._days.values():
+            self._merge(self._totals, day['counts'])
+        merge_usage_counts(self._totals['usage'], self._sealed_usage)
@@ -0,0 +1,356 @@
+#!/usr/bin/env python3
+"""
+Log Storage
+Pluggable storage behind Logger: daily JSONL files (default) or SQLite
+
+Import existing JSONL logs into SQLite (safe to re-run):
+    python log_storage.py import --log-dir logs --db logs/interactions.db
+"""
+
+import argparse
+import atexit
+import json
+import os
+import sqlite3
+from contextlib import closing
+from datetime import date
+
+from log_archive import ARCHIVE_SUFFIX, LOG_PREFIX, LOG_SUFFIX, day_files, day_of, iter_day_file
+from log_stats import StatsIndex
+from log_writer import LogWriter
+from usage_stats import add_usage_counts, empty_usage_counts, usage_summary
+
+ENTRY_COLUMNS = ('timestamp', 'customer_message', 'ai_reply', 'settings', 'user_edit', 'edited')
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS interactions (
+    id INTEGER PRIMARY KEY,
+    timestamp TEXT NOT NULL,
+    customer_message TEXT,
+    ai_reply TEXT,
+    tone TEXT,
+    industry TEXT,
+    settings TEXT,
+    user_edit TEXT,
+    edited INTEGER NOT NULL DEFAULT 0,
+    extra TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_interactions_timestamp ON interactions (timestamp);
+CREATE INDEX IF NOT EXISTS idx_interactions_tone ON interactions (tone, edited);
+CREATE INDEX IF NOT EXISTS idx_interactions_industry ON interactions (industry, edited);
+CREATE INDEX IF NOT EXISTS idx_interactions_edited ON interactions (edited);
+CREATE TABLE IF NOT EXISTS imported_files (
+    filename TEXT PRIMARY KEY,
+    size INTEGER NOT NULL,
+    records INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS usage_rollup (
+    id INTEGER PRIMARY KEY CHECK (id = 1),
+    version INTEGER NOT NULL,
+    last_id INTEGER NOT NULL,
+    counts TEXT NOT NULL
+);
+"""
+
+ROLLUP_VERSION = 1  # Saved usage rollups of another version are rebuilt from the table
+
+USAGE_FIELDS = ('latency_ms', 'ttft_ms', 'input_tokens', 'output_tokens', 'cached_tokens', 'cost_usd')
+
+USAGE_SQL = f"""
+SELECT tone, industry, {', '.join(f"json_extract(extra, '$.usage.{field}')" for field in USAGE_FIELDS)}
+FROM interactions WHERE id > ? AND id <= ? AND json_extract(extra, '$.usage') IS NOT NULL ORDER BY id
+"""
+
+INSERT_SQL = """
+INSERT INTO interactions
+    (timestamp, customer_message, ai_reply, tone, industry, settings, user_edit, edited, extra)
+VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+"""
+
+
+def accuracy_rate(total, edited):
+    return round((total - edited) / total * 100, 2) if total > 0 else 0
+
+
+def entry_to_row(log_entry):
+    """Flatten a log record; tone/industry get their own indexed columns"""
+    settings = log_entry.get('settings') or {}
+    extra = {key: value for key, value in log_entry.items() if key not in ENTRY_COLUMNS}
+    return (
+        log_entry['timestamp'],
+        log_entry.get('customer_message'),
+        log_entry.get('ai_reply'),
+        settings.get('tone', 'unknown'),
+        settings.get('industry', 'unknown'),
+        json.dumps(settings),
+        log_entry.get('user_edit'),
+        1 if log_entry.get('edited') else 0,
+        json.dumps(extra) if extra else None
+    )
+
+
+def row_to_entry(row):
+    """Rebuild the log record written by Logger.build_entry"""
+    timestamp, customer_message, ai_reply, settings, user_edit, edited, extra = row
+    log_entry = {
+        'timestamp': timestamp,
+        'customer_message': customer_message,
+        'ai_reply': ai_reply,
+        'settings': json.loads(settings) if settings else {},
+        'user_edit': user_edit,
+        'edited': bool(edited)
+    }
+    if extra:
+        log_entry.update(json.loads(extra))
+    return log_entry
+
+
+def usage_counts_sql(conn):
+    """Usage counts (see usage_stats.py) of the interactions that called a model
+
+    The counts are saved in usage_rollup with the last interaction id they
+    cover, so a call only reads the rows added since (by any worker or an
+    import). Folding them in takes the write lock first, so two callers
+    never both count the same rows.
+    """
+    newest = conn.execute('SELECT COALESCE(MAX(id), 0) FROM interactions').fetchone()[0]
+    last_id, counts = _usage_rollup(conn)
+    if last_id == newest:
+        return counts
+
+    with conn:
+        conn.execute('BEGIN IMMEDIATE')
+        last_id, counts = _usage_rollup(conn)
+        newest = conn.execute('SELECT COALESCE(MAX(id), 0) FROM interactions').fetchone()[0]
+        for tone, industry, *values in conn.execute(USAGE_SQL, (last_id, newest)):
+            add_usage_counts(counts, {'settings': {'tone': tone, 'industry': industry}, 'usage': dict(zip(USAGE_FIELDS, values))})
+        conn.execute(
+            'INSERT OR REPLACE INTO usage_rollup (id, version, last_id, counts) VALUES (1, ?, ?, ?)',
+            (ROLLUP_VERSION, newest, json.dumps(counts))
+        )
+    return counts
+
+
+def _usage_rollup(conn):
+    """(last interaction id, usage counts) saved in usage_rollup; (0, empty counts) to start over"""
+    row = conn.execute('SELECT version, last_id, counts FROM usage_rollup WHERE id = 1').fetchone()
+    if row is None or row[0] != ROLLUP_VERSION:
+        return 0, empty_usage_counts()
+    return row[1], json.loads(row[2])
+
+
+def log_files(log_dir):
+    """Paths of the daily interaction files (JSONL or archived), oldest first"""
+    if not os.path.isdir(log_dir):
+        return []
+    return sorted(day_files(log_dir))
+
+
+class JsonlStorage:
+    """Daily JSONL files written by LogWriter, stats from StatsIndex
+
+    Days compacted by log_archive.py are read from their archives.
+    """
+
+    backend = 'jsonl'
+
+    def __init__(self, log_dir, max_batch=256, flush_interval=0.2):
+        self.log_dir = log_dir
+        self.stats_index = StatsIndex(log_dir)
+        self.writer = LogWriter(
+            log_dir,
+            max_batch=max_batch,
+            flush_interval=flush_interval,
+            on_commit=self.stats_index.on_commit
+        )
+        # Registered after the writer's own hook, so it runs first
+        atexit.register(self.close)
+
+    def write(self, log_entries):
+        self.writer.write(log_entries)
+
+    def close(self):
+        """Commit queued records, then save the counts they added"""
+        self.writer.close()
+        self.stats_index.close()
+
+    def flush(self):
+        self.writer.flush()
+
+    def stats(self):
+        self.flush()
+        self.stats_index.refresh()
+        return self.stats_index.summary()
+
+    def iter_interactions(self):
+        for filepath in log_files(self.log_dir):
+            yield from iter_day_file(filepath)
+
+
+class SqliteWriter(LogWriter):
+    """LogWriter whose group commit is one INSERT transaction"""
+
+    def __init__(self, db_path, max_batch=256, flush_interval=0.2):
+        super().__init__(os.path.dirname(db_path) or '.', max_batch, flush_interval)
+        self.db_path = db_path
+        self._conn = None
+        self._conn_pid = None
+
+    def _commit(self, log_entries):
+        if not log_entries:
+            return
+        if self._conn_pid != os.getpid():
+            # Connections must not be shared across a fork
+            self._conn = connect(self.db_path)
+            self._conn_pid = os.getpid()
+        with self._conn:
+            self._conn.executemany(INSERT_SQL, [entry_to_row(log_entry) for log_entry in log_entries])
+
+    def _close_files(self):
+        if self._conn is not None and self._conn_pid == os.getpid():
+            self._conn.close()
+        self._conn = None
+
+
+def connect(db_path):
+    """Open a connection in WAL mode so readers never block the writer"""
+    conn = sqlite3.connect(db_path, timeout=30)
+    conn.execute('PRAGMA journal_mode=WAL')
+    conn.execute('PRAGMA synchronous=NORMAL')
+    return conn
+
+
+class SqliteStorage:
+    """Interactions table in SQLite; stats are aggregated in SQL"""
+
+    backend = 'sqlite'
+
+    def __init__(self, db_path, max_batch=256, flush_interval=0.2):
+        self.db_path = db_path
+        os.makedirs(os.path.dirname(db_path) or '.', exist_ok=True)
+        with closing(connect(db_path)) as conn:
+            conn.executescript(SCHEMA)
+        self.writer = SqliteWriter(db_path, max_batch=max_batch, flush_interval=flush_interval)
+
+    def connect(self):
+        return closing(connect(self.db_path))
+
+    def write(self, log_entries):
+        self.writer.write(log_entries)
+
+    def flush(self):
+        self.writer.flush()
+
+    def stats(self):
+        self.flush()
+        with self.connect() as conn:
+            total, edited = conn.execute(
+                'SELECT COUNT(*), COALESCE(SUM(edited), 0) FROM interactions'
+            ).fetchone()
+            today_total, today_edited = conn.execute(
+                'SELECT COUNT(*), COALESCE(SUM(edited), 0) FROM interactions WHERE timestamp >= ?',
+                (date.today().isoformat(),)
+            ).fetchone()
+            by_tone = conn.execute(
+                'SELECT tone, COUNT(*), SUM(edited) FROM interactions GROUP BY tone'
+            ).fetchall()
+            by_industry = conn.execute(
+                'SELECT industry, COUNT(*), SUM(edited) FROM interactions GROUP BY industry'
+            ).fetchall()
+            usage = usage_counts_sql(conn)
+
+        return {
+            'total_interactions': total,
+            'total_edited': edited,
+            'accuracy_rate': accuracy_rate(total, edited),
+            'today': {
+                'total_interactions': today_total,
+                'total_edited': today_edited
+            },
+            'by_tone': self._breakdown(by_tone),
+            'by_industry': self._breakdown(by_industry),
+            'usage': usage_summary(usage)
+        }
+
+    @staticmethod
+    def _breakdown(rows):
+        return {
+            value: {
+                'total': total,
+                'edited': edited,
+                'accuracy_rate': accuracy_rate(total, edited)
+            }
+            for value, total, edited in rows
+        }
+
+    def iter_interactions(self):
+        with self.connect() as conn:
+            cursor = conn.execute(
+                'SELECT timestamp, customer_message, ai_reply, settings, user_edit, edited, extra '
+                'FROM interactions ORDER BY id'
+            )
+            for row in cursor:
+                yield row_to_entry(row)
+
+    def import_jsonl(self, log_dir):
+        """Copy daily log files into the table; days already imported are skipped
+
+        Today's file is still being appended to, and a day is imported only
+        once, so it is left for a run on a later day.
+        """
+        imported = 0
+        today = date.today().isoformat()
+        with self.connect() as conn:
+            for filepath in log_files(log_dir):
+                filename = os.path.basename(filepath)
+                if day_of(filename) >= today:
+                    print(f"⏭️  {filename} is still being written; import it tomorrow")
+                    continue
+                size = os.path.getsize(filepath)
+                # A day imported as JSONL is not imported again once archived
+                names = [f'{LOG_PREFIX}{day_of(filename)}{suffix}' for suffix in (LOG_SUFFIX, ARCHIVE_SUFFIX)]
+                done = dict(conn.execute(
+                    'SELECT filename, size FROM imported_files WHERE filename IN (?, ?)', names
+                ).fetchall())
+                if done.get(filename, size) != size:
+                    print(f"⚠️  {filename} changed since it was imported; skipping")
+                if done:
+                    continue
+
+                rows = [entry_to_row(log_entry) for log_entry in iter_day_file(filepath)]
+                with conn:
+                    conn.executemany(INSERT_SQL, rows)
+                    conn.execute(
+                        'INSERT INTO imported_files (filename, size, records) VALUES (?, ?, ?)',
+                        (filename, size, len(rows))
+                    )
+                imported += len(rows)
+                print(f"📥 {filename}: {len(rows)} interactions")
+        return imported
+
+
+def create_storage(backend, log_dir, db_path=None, max_batch=256, flush_interval=0.2):
+    """Storage for config.LOG_BACKEND ('jsonl' or 'sqlite')"""
+    if backend == 'jsonl':
+        return JsonlStorage(log_dir, max_batch=max_batch, flush_interval=flush_interval)
+    if backend == 'sqlite':
+        db_path = db_path or os.path.join(log_dir, 'interactions.db')
+        return SqliteStorage(db_path, max_batch=max_batch, flush_interval=flush_interval)
+    raise ValueError(f"Unknown log backend: {backend}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Interaction log storage tools")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    import_parser = subparsers.add_parser('import', help="Import JSONL logs into SQLite")
+    import_parser.add_argument('--log-dir', default='logs')
+    import_parser.add_argument('--db', default=None, help="SQLite file (default: <log-dir>/interactions.db)")
+    args = parser.parse_args()
+
+    storage = SqliteStorage(args.db or os.path.join(args.log_dir, 'interactions.db'))
+    imported = storage.import_jsonl(args.log_dir)
+    print(f"✅ Imported {imported} interactions into {storage.db_path}")
+
+
+if __name__ == '__main__':
+    main()
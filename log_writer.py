@@ -0,0 +1,142 @@
+"""
+Log Writer
+Background JSONL writer so request threads never wait on disk I/O
+"""
+
+import atexit
+import json
+import os
+import queue
+import threading
+import time
+
+
+class LogWriter:
+    """Queue of log records drained by one thread with group commit
+
+    Records are grouped until max_batch records or flush_interval seconds
+    have gone by, then each day's group is appended with a single write on
+    an O_APPEND descriptor. Whole newline-terminated records go out in one
+    write, so several gunicorn workers can share the same daily file
+    without interleaving lines.
+
+    on_commit(date_str, log_entries, size_before, size_after, nbytes) is
+    called after each day's write, with the file size around it, so
+    running counters can follow along without re-reading the file.
+    """
+
+    def __init__(self, log_dir, max_batch=256, flush_interval=0.2, on_commit=None):
+        self.log_dir = log_dir
+        self.max_batch = max_batch
+        self.flush_interval = flush_interval
+        self.on_commit = on_commit
+        self._queue = None
+        self._thread = None
+        self._pid = None
+        self._files = {}
+        self._start_lock = threading.Lock()
+        atexit.register(self.close)
+
+    def _ensure_started(self):
+        # Threads do not survive fork, so each worker starts its own
+        if self._pid == os.getpid():
+            return
+        with self._start_lock:
+            if self._pid != os.getpid():
+                self._queue = queue.Queue()
+                self._files = {}
+                self._thread = threading.Thread(target=self._run, name='log-writer', daemon=True)
+                self._thread.start()
+                self._pid = os.getpid()
+
+    def write(self, log_entries):
+        """Queue records for writing; returns immediately"""
+        if log_entries:
+            self._ensure_started()
+            self._queue.put(list(log_entries))
+
+    def flush(self, timeout=5.0):
+        """Block until everything queued so far is on disk"""
+        if self._pid != os.getpid():
+            return True
+        done = threading.Event()
+        self._queue.put(done)
+        return done.wait(timeout)
+
+    def close(self):
+        """Flush pending records and close open files (runs at exit)"""
+        if self._pid != os.getpid() or not self._thread.is_alive():
+            return
+        self._queue.put(None)
+        self._thread.join(timeout=5.0)
+
+    def _run(self):
+        while True:
+            item = self._queue.get()
+            pending, waiters, stop = [], [], False
+            deadline = time.monotonic() + self.flush_interval
+
+            while True:
+                if item is None:
+                    stop = True
+                elif isinstance(item, threading.Event):
+                    waiters.append(item)
+                else:
+                    pending.extend(item)
+
+                if stop or waiters or len(pending) >= self.max_batch:
+                    break
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    item = self._queue.get(timeout=remaining)
+                except queue.Empty:
+                    break
+
+            try:
+                self._commit(pending)
+            except Exception as e:
+                print(f"Log writer error: {e}")
+
+            for waiter in waiters:
+                waiter.set()
+            if stop:
+                self._close_files()
+                return
+
+    def _commit(self, log_entries):
+        """Append each day's records with one write"""
+        by_day = {}
+        for log_entry in log_entries:
+            # Day comes from the record itself, so late flushes after
+            # midnight still land in the right file
+            date_str = log_entry['timestamp'][:10]
+            by_day.setdefault(date_str, []).append(log_entry)
+
+        for date_str, day_entries in by_day.items():
+            data = ''.join(json.dumps(log_entry) + '\n' for log_entry in day_entries).encode('utf-8')
+            nbytes = len(data)
+            fd = self._file_for(date_str)
+            size_before = os.fstat(fd).st_size
+            while data:
+                written = os.write(fd, data)
+                data = data[written:]
+
+            if self.on_commit:
+                self.on_commit(date_str, day_entries, size_before, os.fstat(fd).st_size, nbytes)
+
+    def _file_for(self, date_str):
+        path = os.path.join(self.log_dir, f'interactions_{date_str}.jsonl')
+        if path not in self._files:
+            # Keep only the newest day's file open across rollovers
+            if len(self._files) >= 2:
+                self._close_files()
+            os.makedirs(self.log_dir, exist_ok=True)
+            self._files[path] = os.open(path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+        return self._files[path]
+
+    def _close_files(self):
+        for fd in self._files.values():
+            os.close(fd)
+        self._files = {}
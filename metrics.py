@@ -0,0 +1,52 @@
+"""
+Metrics
+In-process counters and rolling latency summaries
+"""
+
+import threading
+from collections import defaultdict, deque
+
+
+class Metrics:
+    """Counters and latency windows exposed through /api/metrics"""
+
+    def __init__(self, window=1000):
+        self.window = window
+        self._counters = defaultdict(int)
+        self._latencies = defaultdict(lambda: deque(maxlen=self.window))
+        self._lock = threading.Lock()
+
+    def incr(self, name, amount=1):
+        """Add to a named counter"""
+        with self._lock:
+            self._counters[name] += amount
+
+    def observe(self, name, seconds):
+        """Record one latency sample in seconds"""
+        with self._lock:
+            self._latencies[name].append(seconds)
+
+    @staticmethod
+    def _percentile(ordered, fraction):
+        index = min(len(ordered) - 1, int(fraction * len(ordered)))
+        return ordered[index]
+
+    def snapshot(self):
+        """Counters plus count/avg/p50/p95 (ms) for the recent window"""
+        with self._lock:
+            counters = dict(self._counters)
+            samples = {name: sorted(values) for name, values in self._latencies.items() if values}
+
+        latency = {}
+        for name, ordered in samples.items():
+            latency[name] = {
+                'count': len(ordered),
+                'avg_ms': round(sum(ordered) / len(ordered) * 1000, 1),
+                'p50_ms': round(self._percentile(ordered, 0.50) * 1000, 1),
+                'p95_ms': round(self._percentile(ordered, 0.95) * 1000, 1)
+            }
+
+        return {
+            'counters': counters,
+            'latency': latency
+        }
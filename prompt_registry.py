@@ -0,0 +1,175 @@
+#!/usr/bin/env python3
+"""
+Prompt Registry
+System prompt templates, versioned as files in prompts/ and shared by
+every deployment (app.py, app_production.py, gemini.py).
+
+A template is plain text with {tone} and {industry} placeholders. An
+optional line holding only '---' splits it: everything above is the same
+for every request and is sent as a cached prefix (see
+AIAssistant._system_blocks), everything below is filled in per request.
+
+Rendered prompts are memoized per (tone, industry) in a bounded LRU. The
+file is checked for changes at most every reload_seconds; a changed file
+is reloaded without a restart and the memo is refilled for the pairs in
+use. Each prompt carries its version - the file name plus a hash of its
+text - which Logger stamps into every log entry. prefix_tokens estimates
+the length of the shared prefix (4 characters per token), to tell whether
+it is long enough to be cached.
+
+Benchmark:
+    python prompt_registry.py --renders 200000
+"""
+
+import argparse
+import hashlib
+import os
+import threading
+import time
+from collections import OrderedDict, namedtuple
+
+import config
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+SEPARATOR = '\n---\n'
+
+Prompt = namedtuple('Prompt', ['version', 'text'])
+
+
+class PromptRegistry:
+    """One prompt template from disk, rendered once per (tone, industry)"""
+
+    def __init__(self, path, memo_size=256, reload_seconds=2):
+        self.path = path if os.path.isabs(path) else os.path.join(BASE_DIR, path)
+        self.memo_size = memo_size
+        self.reload_seconds = reload_seconds
+        self.version = None
+        self.prefix = ''
+        self.prefix_tokens = 0
+        self.template = ''
+        self.hits = 0
+        self.misses = 0
+        self.reloads = 0
+        self._memo = OrderedDict()
+        self._file_state = None
+        self._next_check = 0
+        self._lock = threading.Lock()
+        self._load()
+
+    @classmethod
+    def from_config(cls):
+        return cls(
+            config.PROMPT_TEMPLATE,
+            memo_size=config.PROMPT_MEMO_SIZE,
+            reload_seconds=config.PROMPT_RELOAD_SECONDS
+        )
+
+    def _load(self):
+        """Read and check the template file; keeps the current template if it is broken"""
+        try:
+            stat = os.stat(self.path)
+            with open(self.path, 'r', encoding='utf-8') as f:
+                text = f.read().strip('\n')
+            prefix, _, template = text.rpartition(SEPARATOR)
+            template.format(tone='', industry='')
+        except (OSError, KeyError, IndexError, ValueError) as e:
+            if self.version is None:
+                raise
+            print(f"⚠️ Prompt template {self.path} not reloaded: {e}")
+            return False
+
+        self._file_state = (stat.st_mtime_ns, stat.st_size)
+        name = os.path.splitext(os.path.basename(self.path))[0]
+        self.version = f"{name}:{hashlib.sha256(text.encode('utf-8')).hexdigest()[:8]}"
+        self.prefix = prefix
+        self.prefix_tokens = len(prefix) // 4
+        self.template = template
+        return True
+
+    def _maybe_reload(self):
+        """Reload the template if its file changed (checked at most every reload_seconds)"""
+        now = time.monotonic()
+        if now < self._next_check:
+            return
+        self._next_check = now + self.reload_seconds
+        try:
+            stat = os.stat(self.path)
+        except OSError:
+            return
+        if (stat.st_mtime_ns, stat.st_size) == self._file_state:
+            return
+        self._file_state = (stat.st_mtime_ns, stat.st_size)  # A broken edit is reported once
+
+        in_use = list(self._memo)
+        if self._load():
+            self.reloads += 1
+            print(f"🔄 Prompt template reloaded: {self.version}")
+            self._memo.clear()
+            for tone, industry in in_use:
+                self._memo[(tone, industry)] = self._render(tone, industry)
+
+    def _render(self, tone, industry):
+        text = self.template.format(tone=tone, industry=industry)
+        return Prompt(self.version, f"{self.prefix}\n\n{text}" if self.prefix else text)
+
+    def render(self, tone, industry):
+        """Prompt(version, text) for tone and industry"""
+        key = (tone, industry)
+        with self._lock:
+            self._maybe_reload()
+            prompt = self._memo.get(key)
+            if prompt is not None:
+                self.hits += 1
+                self._memo.move_to_end(key)
+                return prompt
+
+            self.misses += 1
+            prompt = self._memo[key] = self._render(tone, industry)
+            if len(self._memo) > self.memo_size:
+                self._memo.popitem(last=False)
+            return prompt
+
+    def split(self, text):
+        """(shared prefix, per-request rest) of a rendered prompt, or None if it has no such prefix"""
+        prefix = self.prefix
+        if not prefix or not text.startswith(prefix + '\n\n'):
+            return None
+        return prefix, text[len(prefix) + 2:]
+
+    def stats(self):
+        """Current version, memo use and reloads"""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'version': self.version,
+                'prefix_tokens': self.prefix_tokens,
+                'memoized': len(self._memo),
+                'memo_hit_rate': round(self.hits / lookups * 100, 2) if lookups else 0,
+                'reloads': self.reloads
+            }
+
+
+def benchmark(renders=200000, pairs=50):
+    """Memoized render() vs formatting the template on every call"""
+    registry = PromptRegistry(config.PROMPT_TEMPLATE)
+    keys = [(tone, f"industry {i}") for i in range(pairs) for tone in ('professional', 'friendly')]
+
+    start = time.perf_counter()
+    for i in range(renders):
+        registry.render(*keys[i % len(keys)])
+    memo_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    for i in range(renders):
+        registry._render(*keys[i % len(keys)])
+    format_time = time.perf_counter() - start
+
+    print(f"📝 {renders} renders of {registry.version}, {len(keys)} tone/industry pairs")
+    print(f"   format every time:  {format_time / renders * 1e6:6.2f} µs/render")
+    print(f"   memoized:           {memo_time / renders * 1e6:6.2f} µs/render")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Benchmark the prompt registry")
+    parser.add_argument('--renders', type=int, default=200000)
+    benchmark(parser.parse_args().renders)
@@ -0,0 +1,811 @@
+#!/usr/bin/env python3
+"""
+Providers
+Model providers behind one interface, and a router that sends each reply
+to the fastest healthy provider.
+
+Every provider has generate(system_prompt, message, timeout, usage) ->
+reply text, stream(...) with the same arguments yielding the text in
+chunks, and available(); usage (a Usage, optional) receives the
+model and token counts of the response. ProviderRouter keeps a rolling window of latencies
+and failures per provider, ranks healthy providers by p50 stretched by
+their error rate and, with hedging on, asks the runner-up too once the
+first has been slower than its own hedge percentile. The first good reply
+wins and the other call is dropped; a blocking SDK call that is already
+running cannot be interrupted, so its late reply is discarded and its
+tokens and cost are added to the router's hedge loser totals. Streams go to the same
+ranked providers and fail over until their first chunk, but are not
+hedged.
+
+Each provider also has a circuit breaker (resilience.py): attempts time
+out at a multiple of the provider's own latency percentile (a modest cold
+timeout until it has enough samples), retryable errors (429, 5xx,
+timeouts) are retried with jittered backoff within one deadline for all
+attempts of a reply, and a
+provider whose circuit is open is skipped without waiting on it. With
+every circuit open, generate() raises CircuitOpenError at once and the
+app answers with its fallback reply. Only those transient errors count
+toward a circuit; a client error (400, 401, ...) means the provider
+answered. Streams go through the same breaker via call_stream(), and can
+only be retried until their first chunk.
+
+Fake providers (config.FAKE_PROVIDERS) have log-normal latency and a
+failure rate, for running the router offline:
+    python providers.py --requests 500 --hedge 90
+"""
+
+import argparse
+import asyncio
+import math
+import os
+import random
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from functools import partial
+
+import config
+from intents import DEFAULT_DEMO_RESPONSE, DEMO_RESPONSES, intent_classifier
+from resilience import CircuitBreaker, CircuitOpenError, backoff_seconds, is_retryable
+
+
+def claude_request_params(model, max_tokens, system_prompt, message):
+    """Messages API parameters, as AIAssistant._request_params in app_production.py"""
+    return {
+        'model': model,
+        'max_tokens': max_tokens,
+        'system': system_prompt,
+        'messages': [
+            {
+                "role": "user",
+                "content": f"Customer message: {message}\n\nPlease provide a helpful customer support reply."
+            }
+        ]
+    }
+
+
+def gemini_prompt(system_prompt, message):
+    """Single Gemini prompt, as AIAssistant._build_full_prompt in gemini.py"""
+    return f"{system_prompt}\n\nCustomer message: {message}\n\nPlease provide a helpful customer support reply."
+
+
+def token_counts(usage):
+    """(input, output, cached input, cache write) tokens from Anthropic `usage` or Gemini `usage_metadata`
+
+    Anthropic reports cache reads and writes apart from input_tokens;
+    input here is every prompt token, cached the ones read from the cache
+    and cache write the ones written to it.
+    """
+    if hasattr(usage, 'prompt_token_count'):
+        return (usage.prompt_token_count or 0, usage.candidates_token_count or 0,
+                getattr(usage, 'cached_content_token_count', 0) or 0, 0)
+    cached = getattr(usage, 'cache_read_input_tokens', 0) or 0
+    written = getattr(usage, 'cache_creation_input_tokens', 0) or 0
+    return ((getattr(usage, 'input_tokens', 0) or 0) + cached + written, getattr(usage, 'output_tokens', 0) or 0,
+            cached, written)
+
+
+def cost_usd(model, input_tokens, output_tokens, cached_tokens, cache_write_tokens=0):
+    """Price of one call from config.MODEL_PRICES, or None for an unknown model
+
+    Cache writes cost config.CACHE_WRITE_PRICE_FACTOR times the input price.
+    """
+    name = (model or '').split('/')[-1]  # Gemini names look like models/gemini-2.5-flash
+    for prefix, (input_price, output_price, cached_price) in config.MODEL_PRICES.items():
+        if name.startswith(prefix):
+            return ((input_tokens - cached_tokens - cache_write_tokens) * input_price
+                    + cache_write_tokens * input_price * config.CACHE_WRITE_PRICE_FACTOR
+                    + output_tokens * output_price + cached_tokens * cached_price) / 1e6
+    return None
+
+
+class Usage:
+    """Upstream latency and tokens of one reply, for its log entry
+
+    The provider call that produced the reply fills it in; callers that
+    shared another request's call leave it empty, so each call is
+    accounted for once. Hedged calls that lost are not part of any reply
+    and are totalled by ProviderRouter instead (hedge_loser_* in stats).
+    """
+
+    def __init__(self):
+        self.provider = None
+        self.model = None
+        self.seconds = None
+        self.ttft_seconds = None
+        self.input_tokens = 0
+        self.output_tokens = 0
+        self.cached_tokens = 0
+        self.cache_write_tokens = 0
+
+    def set_tokens(self, model, usage):
+        """Token counts from a response's usage / usage_metadata"""
+        self.model = model
+        if usage is not None:
+            (self.input_tokens, self.output_tokens,
+             self.cached_tokens, self.cache_write_tokens) = token_counts(usage)
+
+    def finish(self, provider, seconds, ttft_seconds=None):
+        """Provider and latency of the call once its reply is complete (None when unknown)"""
+        self.provider = provider
+        self.seconds = seconds
+        self.ttft_seconds = ttft_seconds
+
+    def update(self, other):
+        vars(self).update(vars(other))
+
+    def entry(self):
+        """The 'usage' field of a log entry, or None when no model call was made"""
+        if self.provider is None:
+            return None
+        return {
+            'provider': self.provider,
+            'model': self.model,
+            'latency_ms': round(self.seconds * 1000, 1) if self.seconds is not None else None,
+            'ttft_ms': round(self.ttft_seconds * 1000, 1) if self.ttft_seconds is not None else None,
+            'input_tokens': self.input_tokens,
+            'output_tokens': self.output_tokens,
+            'cached_tokens': self.cached_tokens,
+            'cost_usd': cost_usd(self.model, self.input_tokens, self.output_tokens, self.cached_tokens,
+                                 self.cache_write_tokens)
+        }
+
+
+class ClaudeProvider:
+    """Anthropic Messages API"""
+
+    name = 'claude'
+
+    def __init__(self, client, request_params=None, model=config.AI_MODEL, max_tokens=config.MAX_TOKENS, on_usage=None):
+        # Retries are the router's job, not the SDK's
+        self.client = client.with_options(max_retries=0) if client is not None else None
+        self.request_params = request_params or (
+            lambda system_prompt, message: claude_request_params(model, max_tokens, system_prompt, message)
+        )
+        self.on_usage = on_usage
+
+    def available(self):
+        return self.client is not None
+
+    def generate(self, system_prompt, message, timeout=None, usage=None):
+        response = self.client.messages.create(**self.request_params(system_prompt, message), timeout=timeout)
+        if self.on_usage:
+            self.on_usage(response.usage)
+        if usage is not None:
+            usage.set_tokens(response.model, response.usage)
+        return response.content[0].text
+
+    def stream(self, system_prompt, message, timeout=None, usage=None):
+        with self.client.messages.stream(**self.request_params(system_prompt, message), timeout=timeout) as stream:
+            yield from stream.text_stream
+            final = stream.get_final_message()
+        if self.on_usage:
+            self.on_usage(final.usage)
+        if usage is not None:
+            usage.set_tokens(final.model, final.usage)
+
+
+class PromptCacheStats:
+    """Prompt cache reads vs writes, from the usage of Messages API responses"""
+
+    def __init__(self):
+        self.requests = 0
+        self.hits = 0
+        self.read_tokens = 0
+        self.write_tokens = 0
+        self.uncached_tokens = 0
+        self._lock = threading.Lock()
+
+    def record(self, usage):
+        read = getattr(usage, 'cache_read_input_tokens', 0) or 0
+        written = getattr(usage, 'cache_creation_input_tokens', 0) or 0
+        with self._lock:
+            self.requests += 1
+            self.hits += read > 0
+            self.read_tokens += read
+            self.write_tokens += written
+            self.uncached_tokens += getattr(usage, 'input_tokens', 0) or 0
+
+    def stats(self, prefix_tokens=None):
+        """Share of requests that read the cache, and of input tokens served from it
+
+        With the estimated length of the cached prefix, also whether caching
+        can take effect at all: prefixes under config.PROMPT_CACHE_MIN_TOKENS
+        are billed as normal input.
+        """
+        with self._lock:
+            input_tokens = self.read_tokens + self.write_tokens + self.uncached_tokens
+            return {
+                'active': (config.PROMPT_CACHE_ENABLED and prefix_tokens is not None
+                           and prefix_tokens >= config.PROMPT_CACHE_MIN_TOKENS),
+                'prefix_tokens': prefix_tokens,
+                'requests': self.requests,
+                'hit_rate': round(self.hits / self.requests * 100, 2) if self.requests else 0,
+                'cache_read_tokens': self.read_tokens,
+                'cache_write_tokens': self.write_tokens,
+                'uncached_input_tokens': self.uncached_tokens,
+                'token_hit_rate': round(self.read_tokens / input_tokens * 100, 2) if input_tokens else 0
+            }
+
+
+class GeminiProvider:
+    """Google Gemini GenerativeModel"""
+
+    name = 'gemini'
+
+    def __init__(self, model, build_prompt=gemini_prompt):
+        self.model = model
+        self.build_prompt = build_prompt
+
+    def available(self):
+        return self.model is not None
+
+    def generate(self, system_prompt, message, timeout=None, usage=None):
+        request_options = {'timeout': timeout} if timeout else None
+        response = self.model.generate_content(self.build_prompt(system_prompt, message),
+                                               request_options=request_options)
+        if usage is not None:
+            usage.set_tokens(self.model.model_name, getattr(response, 'usage_metadata', None))
+        return response.text
+
+    def stream(self, system_prompt, message, timeout=None, usage=None):
+        request_options = {'timeout': timeout} if timeout else None
+        response = self.model.generate_content(self.build_prompt(system_prompt, message), stream=True,
+                                               request_options=request_options)
+        for chunk in response:
+            if chunk.text:
+                yield chunk.text
+        if usage is not None:
+            usage.set_tokens(self.model.model_name, getattr(response, 'usage_metadata', None))
+
+
+class FakeProviderError(Exception):
+    status_code = 503
+
+
+class FakeProvider:
+    """Offline provider: log-normal latency with the given p50/p95, random failures
+
+    Replies are the demo reply for the message's intent; token counts are
+    estimated at ~4 characters per token.
+    """
+
+    def __init__(self, name, p50_ms=500, p95_ms=1500, error_rate=0.0, seed=None):
+        self.name = name
+        self.median = p50_ms / 1000
+        # p95 of a log-normal is median * exp(1.645 * sigma)
+        self.sigma = math.log(max(p95_ms, p50_ms) / p50_ms) / 1.645
+        self.error_rate = error_rate
+        self.rng = random.Random(seed)
+
+    def available(self):
+        return True
+
+    def latency(self):
+        return self.median * math.exp(self.sigma * self.rng.gauss(0, 1))
+
+    def generate(self, system_prompt, message, timeout=None, usage=None):
+        latency = self.latency()
+        if timeout is not None and latency > timeout:
+            time.sleep(timeout)
+            raise TimeoutError(f"{self.name}: no reply within {timeout:.2f}s")
+        time.sleep(latency)
+        if self.rng.random() < self.error_rate:
+            raise FakeProviderError(f"{self.name}: simulated upstream error")
+        reply = DEMO_RESPONSES.get(intent_classifier.top(message), DEFAULT_DEMO_RESPONSE)
+        if usage is not None:
+            usage.model = self.name
+            usage.input_tokens = (len(system_prompt) + len(message)) // 4
+            usage.output_tokens = len(reply) // 4
+        return reply
+
+    def stream(self, system_prompt, message, timeout=None, usage=None):
+        """generate(), sent a word at a time once it is ready"""
+        words = self.generate(system_prompt, message, timeout, usage).split(' ')
+        yield words[0]
+        for word in words[1:]:
+            yield ' ' + word
+
+
+def claude_client():
+    """Anthropic client from ANTHROPIC_API_KEY, or None"""
+    if not os.environ.get('ANTHROPIC_API_KEY'):
+        return None
+    from anthropic import Anthropic
+    return Anthropic(api_key=os.environ.get('ANTHROPIC_API_KEY'))
+
+
+def gemini_model(model_name='gemini-2.5-flash'):
+    """Gemini model from GEMINI_API_KEY, or None (also when the SDK is missing)"""
+    if not os.environ.get('GEMINI_API_KEY'):
+        return None
+    try:
+        import google.generativeai as genai
+    except ImportError:
+        return None
+    genai.configure(api_key=os.environ.get('GEMINI_API_KEY'))
+    return genai.GenerativeModel(model_name)
+
+
+def build_providers(names, claude=None, gemini=None):
+    """Available providers for config.PROVIDERS names; an app passes its own client's provider"""
+    providers = []
+    for name in names:
+        if name == 'claude':
+            provider = claude or ClaudeProvider(claude_client())
+        elif name == 'gemini':
+            provider = gemini or GeminiProvider(gemini_model())
+        elif name in config.FAKE_PROVIDERS:
+            provider = FakeProvider(name, **config.FAKE_PROVIDERS[name])
+        else:
+            raise ValueError(f"Unknown provider: {name}")
+        if provider.available():
+            providers.append(provider)
+    return providers
+
+
+class ProviderStats:
+    """Rolling latency and failure window for one provider"""
+
+    def __init__(self, window=200):
+        self.latencies = deque(maxlen=window)
+        self.outcomes = deque(maxlen=window)
+        self.calls = 0
+        self.last_call = 0
+
+    def record(self, seconds, ok):
+        self.calls += 1
+        self.last_call = time.monotonic()
+        self.outcomes.append(ok)
+        if ok:
+            self.latencies.append(seconds)
+
+    def percentile(self, percent):
+        """Latency percentile in seconds, or None before any success"""
+        if not self.latencies:
+            return None
+        ordered = sorted(self.latencies)
+        return ordered[min(len(ordered) - 1, int(percent / 100 * len(ordered)))]
+
+    def error_rate(self):
+        return self.outcomes.count(False) / len(self.outcomes) if self.outcomes else 0.0
+
+
+class ProviderRouter:
+    """Latency-aware provider selection with optional hedged requests"""
+
+    def __init__(self, providers, hedge_percentile=None, window=200, min_samples=5,
+                 failure_threshold=5, reset_seconds=30, half_open_calls=1,
+                 timeout_percentile=99, timeout_multiplier=2.0, min_timeout=5, max_timeout=60, cold_timeout=15,
+                 max_retries=2, retry_base_seconds=0.5, retry_max_seconds=8, deadline_seconds=None):
+        self.providers = list(providers)
+        self.hedge_percentile = hedge_percentile
+        self.window = window
+        self.min_samples = min_samples
+        self.breaker_settings = (failure_threshold, reset_seconds, half_open_calls)
+        self.timeout_percentile = timeout_percentile
+        self.timeout_multiplier = timeout_multiplier
+        self.min_timeout = min_timeout
+        self.max_timeout = max_timeout
+        self.cold_timeout = cold_timeout
+        self.max_retries = max_retries
+        self.retry_base_seconds = retry_base_seconds
+        self.retry_max_seconds = retry_max_seconds
+        self.deadline_seconds = deadline_seconds
+        self.provider_stats = {}
+        self.breakers = {}
+        for provider in self.providers:
+            self._track(provider.name)
+        self.hedged = 0
+        self.hedge_wins = 0
+        self.hedge_losers = 0
+        self.hedge_loser_input_tokens = 0
+        self.hedge_loser_output_tokens = 0
+        self.hedge_loser_cost_usd = 0.0
+        self.retries = 0
+        self.timeouts = 0
+        self.fast_failed = 0
+        self._lock = threading.Lock()
+        self._pool = ThreadPoolExecutor(max_workers=64, thread_name_prefix='provider') if hedge_percentile else None
+
+    @classmethod
+    def from_config(cls, providers):
+        return cls(
+            providers,
+            hedge_percentile=config.PROVIDER_HEDGE_PERCENTILE,
+            window=config.PROVIDER_WINDOW,
+            failure_threshold=config.BREAKER_FAILURE_THRESHOLD,
+            reset_seconds=config.BREAKER_RESET_SECONDS,
+            half_open_calls=config.BREAKER_HALF_OPEN_CALLS,
+            timeout_percentile=config.UPSTREAM_TIMEOUT_PERCENTILE,
+            timeout_multiplier=config.UPSTREAM_TIMEOUT_MULTIPLIER,
+            min_timeout=config.UPSTREAM_TIMEOUT_MIN_SECONDS,
+            max_timeout=config.UPSTREAM_TIMEOUT_MAX_SECONDS,
+            cold_timeout=config.UPSTREAM_TIMEOUT_COLD_SECONDS,
+            max_retries=config.UPSTREAM_MAX_RETRIES,
+            retry_base_seconds=config.UPSTREAM_RETRY_BASE_SECONDS,
+            retry_max_seconds=config.UPSTREAM_RETRY_MAX_SECONDS,
+            deadline_seconds=config.ADMISSION_DEADLINE_SECONDS
+        )
+
+    def _track(self, name):
+        if name not in self.breakers:
+            self.provider_stats[name] = ProviderStats(self.window)
+            self.breakers[name] = CircuitBreaker(*self.breaker_settings)
+
+    def healthy(self, provider):
+        return self.breakers[provider.name].available()
+
+    def ranked(self):
+        """Healthy providers by expected latency (unmeasured ones first); open circuits last
+
+        A failed call costs a failover, so p50 is divided by the share of
+        calls that succeed: a fast provider failing half its calls ranks
+        like one twice as slow that never fails.
+        """
+        with self._lock:
+            def rank(provider):
+                stats = self.provider_stats[provider.name]
+                p50 = stats.percentile(50)
+                success_rate = 1 - stats.error_rate()
+                expected = (p50 or 0) / success_rate if success_rate else float('inf')
+                return (not self.healthy(provider), expected, stats.error_rate())
+            return sorted(self.providers, key=rank)
+
+    def timeout(self, name, deadline=None):
+        """Attempt timeout: the provider's latency percentile x multiplier, within [min, max]
+
+        cold_timeout until the provider has min_samples successes, and never
+        past deadline (a time.monotonic() value) when one is given.
+        """
+        stats = self.provider_stats[name]
+        if len(stats.latencies) < self.min_samples:
+            timeout = self.cold_timeout
+        else:
+            observed = stats.percentile(self.timeout_percentile) * self.timeout_multiplier
+            timeout = min(self.max_timeout, max(self.min_timeout, observed))
+        if deadline is not None:
+            timeout = min(timeout, max(0, deadline - time.monotonic()))
+        return timeout
+
+    def _deadline(self):
+        """time.monotonic() by which every attempt of one reply must be done, or None"""
+        return time.monotonic() + self.deadline_seconds if self.deadline_seconds else None
+
+    def generate(self, system_prompt, message, usage=None):
+        """Reply from the best provider; fails over, and hedges when enabled
+
+        usage (a Usage) receives the latency and tokens of the call that answered.
+        """
+        order = [provider for provider in self.ranked() if self.healthy(provider)]
+        if not order:
+            with self._lock:
+                self.fast_failed += 1
+            raise CircuitOpenError(f"All provider circuits are open: {', '.join(self.breakers)}")
+        deadline = self._deadline()
+        if not self._pool:
+            return self._generate_in_order(order, system_prompt, message, usage, deadline)
+
+        remaining = iter(order)
+        pending = {}
+        hedged = False
+        last_error = None
+
+        def launch():
+            provider = next(remaining, None)
+            if provider is not None:
+                # Each call gets its own Usage; only the winner's is kept
+                attempt = Usage()
+                future = self._pool.submit(self._call, provider, system_prompt, message, attempt, deadline)
+                pending[future] = provider, attempt
+            return provider
+
+        first = launch()
+        while pending:
+            delay = None
+            if not hedged and len(order) > 1:
+                delay = self.provider_stats[first.name].percentile(self.hedge_percentile)
+            done, _ = wait(pending, timeout=delay, return_when=FIRST_COMPLETED)
+
+            if not done:
+                # The first provider is slower than usual: ask the next one too
+                hedged = True
+                if launch() is not None:
+                    with self._lock:
+                        self.hedged += 1
+                continue
+
+            for future in done:
+                provider, attempt = pending.pop(future)
+                try:
+                    reply = future.result()
+                except Exception as e:
+                    last_error = e
+                    continue
+                for loser, (_, loser_usage) in pending.items():
+                    loser.cancel()
+                    loser.add_done_callback(partial(self._hedge_lost, loser_usage))
+                if usage is not None:
+                    usage.update(attempt)
+                if hedged and provider is not first:
+                    with self._lock:
+                        self.hedge_wins += 1
+                return reply
+
+            if not pending:
+                launch()
+
+        raise last_error
+
+    def stream(self, system_prompt, message, usage=None):
+        """Yield reply text from the best provider's stream; fails over until the first chunk
+
+        usage (a Usage) receives the latency, time to first chunk and tokens of the stream that answered.
+        """
+        order = [provider for provider in self.ranked() if self.healthy(provider)]
+        if not order:
+            with self._lock:
+                self.fast_failed += 1
+            raise CircuitOpenError(f"All provider circuits are open: {', '.join(self.breakers)}")
+
+        deadline = self._deadline()
+        last_error = None
+        for provider in order:
+            sent = False
+            try:
+                open_stream = partial(provider.stream, system_prompt, message, usage=usage)
+                for text in self.call_stream(provider.name, open_stream, usage, deadline):
+                    sent = True
+                    yield text
+                return
+            except Exception as e:
+                # Text already sent can't be taken back, so only fail over before it
+                if sent:
+                    raise
+                print(f"Provider {provider.name} error: {e}")
+                last_error = e
+        raise last_error
+
+    def _hedge_lost(self, attempt, future):
+        """Add a hedged call that lost to the hedge loser totals once it finishes"""
+        if future.cancelled():
+            return
+        cost = cost_usd(attempt.model, attempt.input_tokens, attempt.output_tokens,
+                        attempt.cached_tokens, attempt.cache_write_tokens)
+        with self._lock:
+            self.hedge_losers += 1
+            self.hedge_loser_input_tokens += attempt.input_tokens
+            self.hedge_loser_output_tokens += attempt.output_tokens
+            self.hedge_loser_cost_usd += cost or 0
+
+    def _generate_in_order(self, order, system_prompt, message, usage=None, deadline=None):
+        last_error = None
+        for provider in order:
+            try:
+                return self._call(provider, system_prompt, message, usage, deadline)
+            except Exception as e:
+                print(f"Provider {provider.name} error: {e}")
+                last_error = e
+        raise last_error
+
+    def _call(self, provider, system_prompt, message, usage=None, deadline=None):
+        """One provider behind its breaker, with an adaptive timeout and retries until deadline"""
+        if deadline is None:
+            deadline = self._deadline()
+        for attempt in range(self.max_retries + 1):
+            self._admit(provider.name)
+            start = time.perf_counter()
+            try:
+                timeout = self.timeout(provider.name, deadline)
+                reply = provider.generate(system_prompt, message, timeout=timeout, usage=usage)
+            except Exception as e:
+                delay = self._failed(provider.name, start, e, attempt, deadline)
+                if delay is None:
+                    raise
+                time.sleep(delay)
+                continue
+            self._succeeded(provider.name, start, usage)
+            return reply
+
+    async def call_async(self, name, call, usage=None):
+        """await call(timeout) as provider name, with the same breaker, timeouts and retries as generate()
+
+        call sets usage's tokens itself; the provider and latency are recorded here.
+        """
+        self._track(name)
+        deadline = self._deadline()
+        for attempt in range(self.max_retries + 1):
+            self._admit(name)
+            start = time.perf_counter()
+            try:
+                reply = await call(self.timeout(name, deadline))
+            except Exception as e:
+                delay = self._failed(name, start, e, attempt, deadline)
+                if delay is None:
+                    raise
+                await asyncio.sleep(delay)
+                continue
+            self._succeeded(name, start, usage)
+            return reply
+
+    def call_stream(self, name, open_stream, usage=None, deadline=None):
+        """Yield the text of open_stream(timeout) as provider name, behind its breaker
+
+        Attempts that fail before the first chunk are retried like
+        generate(); after it the reply is partly sent, so an error is
+        recorded and raised. open_stream sets usage's tokens itself.
+        """
+        self._track(name)
+        if deadline is None:
+            deadline = self._deadline()
+        for attempt in range(self.max_retries + 1):
+            self._admit(name)
+            start = time.perf_counter()
+            chunks = open_stream(self.timeout(name, deadline))
+            try:
+                try:
+                    first = next(chunks)
+                except StopIteration:
+                    self._succeeded(name, start, usage)
+                    return
+                except Exception as e:
+                    delay = self._failed(name, start, e, attempt, deadline)
+                    if delay is None:
+                        raise
+                    time.sleep(delay)
+                    continue
+                ttft = time.perf_counter() - start
+                yield first
+                try:
+                    yield from chunks
+                except Exception as e:
+                    self._failed(name, start, e, self.max_retries)
+                    raise
+                self._succeeded(name, start, usage, ttft)
+                return
+            finally:
+                chunks.close()
+
+    async def call_stream_async(self, name, open_stream, usage=None):
+        """Async call_stream: open_stream(timeout) returns an async iterator of text"""
+        self._track(name)
+        deadline = self._deadline()
+        for attempt in range(self.max_retries + 1):
+            self._admit(name)
+            start = time.perf_counter()
+            chunks = open_stream(self.timeout(name, deadline))
+            try:
+                try:
+                    first = await chunks.__anext__()
+                except StopAsyncIteration:
+                    self._succeeded(name, start, usage)
+                    return
+                except Exception as e:
+                    delay = self._failed(name, start, e, attempt, deadline)
+                    if delay is None:
+                        raise
+                    await asyncio.sleep(delay)
+                    continue
+                ttft = time.perf_counter() - start
+                yield first
+                try:
+                    async for chunk in chunks:
+                        yield chunk
+                except Exception as e:
+                    self._failed(name, start, e, self.max_retries)
+                    raise
+                self._succeeded(name, start, usage, ttft)
+                return
+            finally:
+                await chunks.aclose()
+
+    def _admit(self, name):
+        if not self.breakers[name].allow():
+            raise CircuitOpenError(f"{name} circuit is open")
+
+    def _succeeded(self, name, start, usage=None, ttft_seconds=None):
+        seconds = time.perf_counter() - start
+        self.breakers[name].record_success()
+        if usage is not None:
+            usage.finish(name, seconds, ttft_seconds)
+        with self._lock:
+            self.provider_stats[name].record(seconds, True)
+
+    def _failed(self, name, start, error, attempt, deadline=None):
+        """Record a failed attempt; the backoff before retrying it, or None when it should be raised
+
+        A retry that would start past deadline is not made.
+        """
+        retryable = is_retryable(error)
+        if retryable:
+            self.breakers[name].record_failure()
+        else:
+            # The provider answered; only the request was bad
+            self.breakers[name].record_success()
+        retry = None
+        if attempt < self.max_retries and retryable:
+            retry = backoff_seconds(attempt, self.retry_base_seconds, self.retry_max_seconds)
+            if deadline is not None and time.monotonic() + retry >= deadline:
+                retry = None
+        with self._lock:
+            self.provider_stats[name].record(time.perf_counter() - start, False)
+            if isinstance(error, TimeoutError) or type(error).__name__ in ('APITimeoutError', 'DeadlineExceeded'):
+                self.timeouts += 1
+            if retry is not None:
+                self.retries += 1
+        return retry
+
+    def stats(self):
+        """Rolling p50/p95 (ms), error rate, timeout and circuit state per provider, plus hedging and retry counts"""
+        providers = {}
+        with self._lock:
+            for name, stats in self.provider_stats.items():
+                p50, p95 = stats.percentile(50), stats.percentile(95)
+                providers[name] = {
+                    'calls': stats.calls,
+                    'p50_ms': round(p50 * 1000, 1) if p50 is not None else None,
+                    'p95_ms': round(p95 * 1000, 1) if p95 is not None else None,
+                    'error_rate': round(stats.error_rate(), 4),
+                    'timeout_seconds': round(self.timeout(name), 2),
+                    'circuit': self.breakers[name].stats()
+                }
+            return {
+                'providers': providers,
+                'hedge_percentile': self.hedge_percentile,
+                'hedged': self.hedged,
+                'hedge_wins': self.hedge_wins,
+                'hedge_losers': self.hedge_losers,
+                'hedge_loser_input_tokens': self.hedge_loser_input_tokens,
+                'hedge_loser_output_tokens': self.hedge_loser_output_tokens,
+                'hedge_loser_cost_usd': round(self.hedge_loser_cost_usd, 6),
+                'retries': self.retries,
+                'timeouts': self.timeouts,
+                'fast_failed': self.fast_failed
+            }
+
+
+def benchmark(requests=300, hedge_percentile=90, concurrency=16):
+    """End-to-end latency with fake providers: best single provider vs routed vs hedged"""
+    def run(router):
+        latencies, failures = [], 0
+
+        def one(_):
+            start = time.perf_counter()
+            try:
+                router.generate("system", "Where is my delivery?")
+                return time.perf_counter() - start, True
+            except Exception:
+                return time.perf_counter() - start, False
+
+        with ThreadPoolExecutor(max_workers=concurrency) as pool:
+            for latency, ok in pool.map(one, range(requests)):
+                latencies.append(latency)
+                failures += not ok
+        latencies.sort()
+        pick = lambda percent: latencies[min(len(latencies) - 1, int(percent / 100 * len(latencies)))] * 1000
+        return f"p50 {pick(50):7.1f} ms  p95 {pick(95):7.1f} ms  p99 {pick(99):7.1f} ms  failed {failures}"
+
+    def fakes(seed):
+        return [FakeProvider(name, seed=seed + i, **settings)
+                for i, (name, settings) in enumerate(config.FAKE_PROVIDERS.items())]
+
+    print(f"🔀 {requests} requests, {concurrency} concurrent, providers: {', '.join(config.FAKE_PROVIDERS)}")
+    print(f"   single ({fakes(0)[0].name}):  {run(ProviderRouter(fakes(0)[:1]))}")
+    print(f"   routed:             {run(ProviderRouter(fakes(0)))}")
+    hedged = ProviderRouter(fakes(0), hedge_percentile=hedge_percentile)
+    print(f"   hedged at p{hedge_percentile}:     {run(hedged)}  ({hedged.hedged} hedged, {hedged.hedge_wins} won)")
+
+    # A provider that never answers: attempts time out until its circuit opens, then fail fast
+    down = FakeProvider('fake-down', p50_ms=5000, p95_ms=6000)
+    brownout = ProviderRouter([down], max_timeout=1, cold_timeout=1, max_retries=1, retry_base_seconds=0.05)
+    circuit = brownout.breakers[down.name]
+    print(f"   brownout:           {run(brownout)}  (circuit {circuit.state}, {brownout.fast_failed} failed fast)")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Run the provider router against fake providers")
+    parser.add_argument('--requests', type=int, default=300)
+    parser.add_argument('--hedge', type=int, default=90, help="Hedge percentile")
+    args = parser.parse_args()
+    benchmark(args.requests, args.hedge)
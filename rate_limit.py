@@ -0,0 +1,211 @@
+#!/usr/bin/env python3
+"""
+Rate Limit
+Token buckets for the generation endpoints, shared by all workers
+through a memory-mapped file.
+
+Every client has a request bucket and a model-token bucket, and all
+clients share a global pair. A request is admitted only when all four
+buckets have room, and then takes from all four; otherwise nothing is
+taken and the caller gets the seconds until it would fit (Retry-After).
+A batch is charged up front as one request per message.
+Buckets hold one hour's allowance and refill continuously.
+
+The file is a fixed hash table of client slots guarded by flock, so a
+check is a few struct reads and writes (Unix; elsewhere the buckets are
+per process). Benchmark:
+    python rate_limit.py --checks 200000
+"""
+
+import argparse
+import hashlib
+import mmap
+import os
+import struct
+import threading
+import time
+
+import config
+
+try:
+    import fcntl
+except ImportError:  # Windows: no cross-process lock
+    fcntl = None
+
+# Slot: client key, requests left, tokens left, last refill (unix time)
+SLOT = struct.Struct('<Qddd')
+PROBES = 8  # Slots tried per client before the least recently used one is taken over
+
+
+def estimate_tokens(message, per_request=600):
+    """Model tokens a reply will likely cost: ~4 characters per message token plus prompt and reply"""
+    return len(message) // 4 + per_request
+
+
+class RateLimiter:
+    """Per-client and global request / token buckets in a shared mmap file"""
+
+    def __init__(self, path, requests_per_hour=100, tokens_per_hour=None,
+                 global_requests_per_hour=None, global_tokens_per_hour=None, slots=65536):
+        self.path = path
+        self.slots = slots
+        # (capacity, refill per second) for requests and tokens; None = unlimited
+        self.client_limits = (self._limit(requests_per_hour), self._limit(tokens_per_hour))
+        self.global_limits = (self._limit(global_requests_per_hour), self._limit(global_tokens_per_hour))
+        self.allowed = 0
+        self.limited = 0
+        self._lock = threading.Lock()
+        self._pid = None
+        self._file = None
+        self._map = None
+
+    @classmethod
+    def from_config(cls):
+        return cls(
+            config.RATE_LIMIT_PATH,
+            requests_per_hour=config.RATE_LIMIT_PER_HOUR,
+            tokens_per_hour=config.RATE_LIMIT_TOKENS_PER_HOUR,
+            global_requests_per_hour=config.RATE_LIMIT_GLOBAL_PER_HOUR,
+            global_tokens_per_hour=config.RATE_LIMIT_GLOBAL_TOKENS_PER_HOUR
+        )
+
+    @staticmethod
+    def _limit(per_hour):
+        return (per_hour, per_hour / 3600) if per_hour else None
+
+    def _open(self):
+        """Map the bucket file (again after a fork, so flock separates the workers)"""
+        if self._map is not None:
+            self._map.close()
+            os.close(self._file)
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        size = (self.slots + 1) * SLOT.size  # Slot 0 holds the global buckets
+        self._file = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o644)
+        self._flock(fcntl.LOCK_EX if fcntl else None)
+        try:
+            if os.fstat(self._file).st_size != size:
+                # New file, or a different slot count: start from empty buckets
+                os.ftruncate(self._file, 0)
+                os.ftruncate(self._file, size)
+        finally:
+            self._flock(fcntl.LOCK_UN if fcntl else None)
+        self._map = mmap.mmap(self._file, size)
+        self._pid = os.getpid()
+
+    def _flock(self, operation):
+        if fcntl:
+            fcntl.flock(self._file, operation)
+
+    def _slot(self, client):
+        """Offset of the client's slot, claiming a free or the stalest one"""
+        key = int.from_bytes(hashlib.blake2b(client.encode('utf-8'), digest_size=8).digest(), 'little') or 1
+        first = key % self.slots
+        stalest, stalest_time = None, None
+        for probe in range(PROBES):
+            offset = ((first + probe) % self.slots + 1) * SLOT.size
+            slot_key, _, _, updated = SLOT.unpack_from(self._map, offset)
+            if slot_key == key:
+                return offset
+            if slot_key == 0:
+                stalest = offset
+                break
+            if stalest is None or updated < stalest_time:
+                stalest, stalest_time = offset, updated
+        SLOT.pack_into(self._map, stalest, key, 0, 0, 0)  # Never refilled: full buckets
+        return stalest
+
+    @staticmethod
+    def _refill(limits, offset, buffer, now):
+        """Current (requests, tokens) levels of the buckets at offset"""
+        _, requests, tokens, updated = SLOT.unpack_from(buffer, offset)
+        levels = []
+        for limit, level in zip(limits, (requests, tokens)):
+            if limit is None:
+                levels.append(0)
+            elif not updated:
+                levels.append(limit[0])
+            else:
+                levels.append(min(limit[0], level + (now - updated) * limit[1]))
+        return levels
+
+    def acquire(self, client, tokens=0, requests=1):
+        """Take requests and tokens from the buckets: 0 when admitted, else seconds to wait"""
+        with self._lock:
+            if self._pid != os.getpid():
+                self._open()
+            now = time.time()
+            self._flock(fcntl.LOCK_EX if fcntl else None)
+            try:
+                client_offset = self._slot(client)
+                wait = 0
+                levels = []
+                for limits, offset in ((self.client_limits, client_offset), (self.global_limits, 0)):
+                    current = self._refill(limits, offset, self._map, now)
+                    for limit, level, cost in zip(limits, current, (requests, tokens)):
+                        # A cost above the capacity needs a full bucket (and leaves it in debt)
+                        needed = min(cost, limit[0]) if limit else 0
+                        if level < needed:
+                            wait = max(wait, (needed - level) / limit[1])
+                    levels.append((offset, current))
+
+                if not wait:
+                    for offset, (request_level, token_level) in levels:
+                        key = SLOT.unpack_from(self._map, offset)[0]
+                        SLOT.pack_into(self._map, offset, key, request_level - requests, token_level - tokens, now)
+            finally:
+                self._flock(fcntl.LOCK_UN if fcntl else None)
+
+            if wait:
+                self.limited += 1
+            else:
+                self.allowed += 1
+            return wait
+
+    def stats(self):
+        """Admitted and limited requests in this worker, limits, and the global buckets' levels"""
+        with self._lock:
+            if self._pid != os.getpid():
+                self._open()
+            requests, tokens = self._refill(self.global_limits, 0, self._map, time.time())
+            return {
+                'allowed': self.allowed,
+                'limited': self.limited,
+                'limits_per_hour': {
+                    'client_requests': self.client_limits[0] and self.client_limits[0][0],
+                    'client_tokens': self.client_limits[1] and self.client_limits[1][0],
+                    'global_requests': self.global_limits[0] and self.global_limits[0][0],
+                    'global_tokens': self.global_limits[1] and self.global_limits[1][0]
+                },
+                'global_available': {
+                    'requests': round(requests, 1) if self.global_limits[0] else None,
+                    'tokens': round(tokens) if self.global_limits[1] else None
+                }
+            }
+
+
+def benchmark(checks=200000, clients=5000, path='cache/rate_limit_benchmark.bin'):
+    """Time per acquire() against a fresh bucket file"""
+    if os.path.exists(path):
+        os.remove(path)
+    limiter = RateLimiter(path, requests_per_hour=100, tokens_per_hour=200000,
+                          global_requests_per_hour=10 ** 9, global_tokens_per_hour=10 ** 12)
+    names = [f'10.0.{i // 256}.{i % 256}' for i in range(clients)]
+    limiter.acquire(names[0])
+
+    start = time.perf_counter()
+    for i in range(checks):
+        limiter.acquire(names[i % clients], 700)
+    elapsed = time.perf_counter() - start
+
+    print(f"🪣 {checks} checks over {clients} clients{'' if fcntl else ' (no flock on this platform)'}")
+    print(f"   acquire():  {elapsed / checks * 1e6:6.2f} µs/check")
+    print(f"   admitted {limiter.allowed - 1}, limited {limiter.limited}")
+    os.remove(path)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Benchmark the shared rate limiter")
+    parser.add_argument('--checks', type=int, default=200000)
+    benchmark(parser.parse_args().checks)
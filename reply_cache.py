@@ -0,0 +1,85 @@
+"""
+Reply Cache
+Bounded in-memory cache of raw AI replies for repeat customer messages
+"""
+
+import threading
+import time
+from collections import OrderedDict
+
+
+class ReplyCache:
+    """Exact-match LRU cache with TTL for raw model replies"""
+
+    def __init__(self, max_entries=1000, ttl_seconds=600):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    @staticmethod
+    def make_key(cleaned_message, settings, prompt_version=None):
+        """Build a cache key from the cleaned message, reply settings and prompt version
+
+        Only settings that change what the model writes are part of the key.
+        Business name and signature are applied later by _format_response.
+        The prompt version keeps replies written under an older template
+        from being served (and logged) as the current one's.
+        """
+        settings = settings or {}
+        return (
+            cleaned_message.casefold(),
+            settings.get('tone', 'professional'),
+            settings.get('industry', 'general business'),
+            prompt_version,
+        )
+
+    def get(self, key):
+        """Return the cached reply for key, or None on a miss"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+
+            value, expires_at = entry
+            if expires_at < time.monotonic():
+                del self._entries[key]
+                self.misses += 1
+                return None
+
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def set(self, key, value):
+        """Store a raw reply, evicting the least recently used entry if full"""
+        with self._lock:
+            self._entries[key] = (value, time.monotonic() + self.ttl_seconds)
+            self._entries.move_to_end(key)
+
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self):
+        """Drop all cached replies"""
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        """Hit/miss counters for the stats endpoint"""
+        with self._lock:
+            lookups = self.hits + self.misses
+            hit_rate = (self.hits / lookups * 100) if lookups > 0 else 0
+            return {
+                'size': len(self._entries),
+                'max_entries': self.max_entries,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'hit_rate': round(hit_rate, 2)
+            }
@@ -0,0 +1,125 @@
+"""
+Resilience
+Circuit breaker, retry classification and jittered backoff for upstream
+model calls (used by ProviderRouter in providers.py)
+"""
+
+import random
+import threading
+import time
+
+# HTTP statuses worth retrying: timeouts, conflicts, rate limits, overload and 5xx
+RETRYABLE_STATUS_CODES = {408, 409, 429, 500, 502, 503, 504, 529}
+
+# SDK errors without a status code that are still transient
+RETRYABLE_ERROR_NAMES = {
+    'APIConnectionError', 'APITimeoutError',  # anthropic
+    'DeadlineExceeded', 'ServiceUnavailable', 'ResourceExhausted', 'InternalServerError',  # google.api_core
+}
+
+
+class CircuitOpenError(Exception):
+    """Raised instead of calling a provider whose circuit is open"""
+
+
+def is_retryable(error):
+    """True for transient upstream errors (by status code, or by SDK error type)"""
+    status = getattr(error, 'status_code', None)
+    if status is None:
+        status = getattr(error, 'code', None)
+    if isinstance(status, int):
+        return status in RETRYABLE_STATUS_CODES
+    if isinstance(error, (TimeoutError, ConnectionError)):
+        return True
+    return any(cls.__name__ in RETRYABLE_ERROR_NAMES for cls in type(error).__mro__)
+
+
+def backoff_seconds(attempt, base=0.5, cap=8.0):
+    """Full-jitter exponential backoff before retry number attempt + 1"""
+    return random.uniform(0, min(cap, base * 2 ** attempt))
+
+
+class CircuitBreaker:
+    """Closed -> open after consecutive failures -> half-open trial calls -> closed
+
+    While open every call is refused at once; after reset_seconds up to
+    half_open_calls trial calls are let through, and the first result
+    closes the circuit again or reopens it. Trials that never report back
+    (e.g. a cancelled request) are given up after another reset_seconds.
+    """
+
+    CLOSED = 'closed'
+    OPEN = 'open'
+    HALF_OPEN = 'half_open'
+
+    def __init__(self, failure_threshold=5, reset_seconds=30, half_open_calls=1):
+        self.failure_threshold = failure_threshold
+        self.reset_seconds = reset_seconds
+        self.half_open_calls = half_open_calls
+        self._state = self.CLOSED
+        self._failures = 0
+        self._opened_at = 0
+        self._trials = 0
+        self._trial_at = 0
+        self._lock = threading.Lock()
+        self.opened = 0
+        self.rejected = 0
+
+    @property
+    def state(self):
+        with self._lock:
+            return self._current_state()
+
+    def _current_state(self):
+        now = time.monotonic()
+        if self._state == self.OPEN and now - self._opened_at >= self.reset_seconds:
+            self._state = self.HALF_OPEN
+            self._trials = 0
+        elif self._state == self.HALF_OPEN and now - self._trial_at >= self.reset_seconds:
+            self._trials = 0
+        return self._state
+
+    def available(self):
+        """Would a call be let through now? (claims nothing)"""
+        with self._lock:
+            state = self._current_state()
+            return state == self.CLOSED or (state == self.HALF_OPEN and self._trials < self.half_open_calls)
+
+    def allow(self):
+        """Claim permission for one call; False means fail fast"""
+        with self._lock:
+            state = self._current_state()
+            if state == self.CLOSED:
+                return True
+            if state == self.HALF_OPEN and self._trials < self.half_open_calls:
+                self._trials += 1
+                self._trial_at = time.monotonic()
+                return True
+            self.rejected += 1
+            return False
+
+    def record_success(self):
+        with self._lock:
+            self._state = self.CLOSED
+            self._failures = 0
+
+    def record_failure(self):
+        with self._lock:
+            self._failures += 1
+            if self._current_state() == self.HALF_OPEN or self._failures >= self.failure_threshold:
+                if self._state != self.OPEN:
+                    self.opened += 1
+                self._state = self.OPEN
+                self._opened_at = time.monotonic()
+
+    def stats(self):
+        with self._lock:
+            state = self._current_state()
+            return {
+                'state': state,
+                'consecutive_failures': self._failures,
+                'opened': self.opened,
+                'rejected': self.rejected,
+                'retry_in_seconds': round(max(0, self.reset_seconds - (time.monotonic() - self._opened_at)), 1)
+                if state == self.OPEN else 0
+            }
@@ -0,0 +1,159 @@
+#!/usr/bin/env python3
+"""
+Sanitizer
+Input cleaning and content filtering shared by app.py, app_production.py
+and gemini.py.
+
+All unsafe patterns (config.UNSAFE_PATTERNS plus an optional pattern file)
+are compiled into one case-insensitive regex. Plain-text patterns are
+merged into a trie-shaped alternation, so each position of a message is
+checked in time bounded by the longest pattern, not the number of
+patterns, and a message is scanned once however large the list grows.
+
+Benchmark with 10k patterns:
+    python sanitizer.py --patterns 10000
+"""
+
+import argparse
+import random
+import re
+import string
+import time
+
+import config
+
+REGEX_CHARS = set('.^$*+?{}[]\\|()')
+
+
+def load_patterns(patterns=None, path=None):
+    """Patterns from config, plus one per line from the optional pattern file"""
+    patterns = list(config.UNSAFE_PATTERNS if patterns is None else patterns)
+    path = config.UNSAFE_PATTERNS_FILE if path is None else path
+    if path:
+        with open(path, 'r', encoding='utf-8') as f:
+            patterns.extend(line.strip() for line in f if line.strip() and not line.startswith('#'))
+    return patterns
+
+
+def _trie_regex(words):
+    """One alternation for many literal words, factored by shared prefixes"""
+    trie = {}
+    for word in words:
+        node = trie
+        for char in word:
+            node = node.setdefault(char, {})
+        # Any match is enough, so longer words below a complete one never matter
+        node.clear()
+        node[''] = True
+    return _node_regex(trie)
+
+
+def _node_regex(node):
+    if '' in node:
+        return ''
+
+    branches, single_chars = [], []
+    for char in sorted(node):
+        rest = _node_regex(node[char])
+        if rest:
+            branches.append(re.escape(char) + rest)
+        else:
+            single_chars.append(re.escape(char))
+
+    if len(single_chars) == 1:
+        branches.append(single_chars[0])
+    elif single_chars:
+        branches.append('[' + ''.join(single_chars) + ']')
+
+    if len(branches) == 1:
+        return branches[0]
+    return '(?:' + '|'.join(branches) + ')'
+
+
+def compile_patterns(patterns):
+    """Single case-insensitive regex matching any of the patterns (None if empty)"""
+    literals = sorted({pattern.lower() for pattern in patterns if not REGEX_CHARS & set(pattern)})
+    regexes = [f'(?:{pattern})' for pattern in patterns if REGEX_CHARS & set(pattern)]
+
+    alternatives = ([_trie_regex(literals)] if literals else []) + regexes
+    if not alternatives:
+        return None
+    return re.compile('|'.join(alternatives), re.IGNORECASE)
+
+
+class Sanitizer:
+    """Whitespace cleanup, length limit and content filter for customer messages"""
+
+    def __init__(self, max_length=None, patterns=None, pattern_file=None):
+        self.max_length = max_length or config.MAX_INPUT_LENGTH
+        self.unsafe = compile_patterns(load_patterns(patterns, pattern_file))
+
+    def clean(self, message):
+        """Sanitize and validate user input"""
+        if not message:
+            raise ValueError("Message cannot be empty")
+
+        # str.split() collapses every whitespace run in one C-level pass
+        cleaned = ' '.join(message.split())
+
+        if len(cleaned) > self.max_length:
+            cleaned = cleaned[:self.max_length] + "..."
+
+        if self.is_unsafe(cleaned):
+            raise ValueError("Message contains inappropriate content")
+
+        return cleaned
+
+    def is_unsafe(self, text):
+        return self.unsafe is not None and self.unsafe.search(text) is not None
+
+
+def benchmark(pattern_count=10000, message_length=2000, messages=2000):
+    """Single compiled regex vs one re.search per pattern"""
+    rng = random.Random(0)
+    words = [''.join(rng.choices(string.ascii_lowercase, k=rng.randint(5, 12))) for _ in range(pattern_count)]
+    patterns = list(config.UNSAFE_PATTERNS) + words
+
+    vocabulary = ['order', 'refund', 'shipping', 'account', 'please', 'help', 'thanks', 'delivery', 'the', 'my']
+    samples = []
+    for _ in range(messages):
+        text = ' '.join(rng.choice(vocabulary) for _ in range(message_length // 6))
+        samples.append(text[:message_length])
+
+    start = time.perf_counter()
+    sanitizer = Sanitizer(max_length=message_length, patterns=patterns, pattern_file='')
+    compile_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    for text in samples:
+        sanitizer.is_unsafe(text)
+    single_time = time.perf_counter() - start
+
+    per_pattern = [re.compile(pattern, re.IGNORECASE) for pattern in patterns]
+    loop_samples = samples[:max(1, messages // 100)]
+    start = time.perf_counter()
+    for text in loop_samples:
+        any(regex.search(text) for regex in per_pattern)
+    loop_time = (time.perf_counter() - start) * len(samples) / len(loop_samples)
+
+    print(f"🧪 {len(patterns)} patterns, {messages} messages of {message_length} chars")
+    print(f"   compile:                 {compile_time * 1000:8.1f} ms")
+    print(f"   single regex:            {single_time / messages * 1e6:8.1f} µs/message "
+          f"({messages * message_length / single_time / 1e6:.1f} MB/s)")
+    print(f"   one search per pattern:  {loop_time / messages * 1e6:8.1f} µs/message (estimated from a sample)")
+
+    for length in (500, 2000, 8000):
+        text = samples[0] * (length // len(samples[0]) + 1)
+        text = text[:length]
+        start = time.perf_counter()
+        for _ in range(200):
+            sanitizer.unsafe.search(text)
+        print(f"   {length:5d} chars:             {(time.perf_counter() - start) / 200 * 1e6:8.1f} µs/message")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Benchmark the compiled content filter")
+    parser.add_argument('--patterns', type=int, default=10000)
+    parser.add_argument('--length', type=int, default=2000)
+    args = parser.parse_args()
+    benchmark(args.patterns, args.length)
@@ -0,0 +1,403 @@
+"""
+Semantic Cache
+Near-duplicate reply cache using a local hashing vectorizer (no network)
+"""
+
+import atexit
+import json
+import os
+import re
+import threading
+import time
+import zlib
+
+import numpy as np
+
+TOKEN_PATTERN = re.compile(r"[a-z0-9]+(?:'[a-z]+)?")
+
+STOP_WORDS = frozenset([
+    'a', 'an', 'the', 'i', "i'm", "i'd", "i've", 'me', 'my', 'we', 'our',
+    'you', 'your', 'it', "it's", 'is', 'am', 'are', 'was', 'be', 'been',
+    'to', 'of', 'and', 'or', 'for', 'on', 'in', 'at', 'with', 'this', 'that',
+    'please', 'hi', 'hello', 'hey', 'thanks', 'thank', 'can', 'could',
+    'would', 'will', 'do', 'does', 'just', 'so', 'like', 'get', 'want',
+])
+
+
+class HashingVectorizer:
+    """Turns text into sparse, L2-normalized hashed term vectors"""
+
+    def __init__(self, n_features=2 ** 20, max_terms=32):
+        self.n_features = n_features
+        self.max_terms = max_terms
+
+    def _terms(self, text):
+        """Words without stop words or plural/possessive 's', plus word bigrams"""
+        words = []
+        for word in TOKEN_PATTERN.findall(text.casefold()):
+            if word in STOP_WORDS:
+                continue
+            if word.endswith("'s"):
+                word = word[:-2]
+            if len(word) > 3 and word.endswith('s') and not word.endswith('ss'):
+                word = word[:-1]
+            words.append(word)
+        return words + [f"{a} {b}" for a, b in zip(words, words[1:])]
+
+    def transform(self, text):
+        """Return (feature indices, weights) for text, at most max_terms long"""
+        counts = {}
+        for term in self._terms(text):
+            feature = zlib.crc32(term.encode('utf-8')) % self.n_features
+            counts[feature] = counts.get(feature, 0) + 1
+
+        top = sorted(counts.items(), key=lambda item: -item[1])[:self.max_terms]
+        indices = np.array([feature for feature, _ in top], dtype=np.int32)
+        weights = np.sqrt(np.array([count for _, count in top], dtype=np.float32))
+
+        norm = np.linalg.norm(weights)
+        if norm > 0:
+            weights /= norm
+        return indices, weights
+
+
+class _Postings:
+    """Growable (slot, weight) arrays for one feature in one bucket"""
+
+    __slots__ = ('slots', 'weights', 'size')
+
+    def __init__(self):
+        self.slots = np.empty(8, dtype=np.int32)
+        self.weights = np.empty(8, dtype=np.float32)
+        self.size = 0
+
+    def append(self, slot, weight):
+        if self.size == len(self.slots):
+            self.slots = np.resize(self.slots, self.size * 2)
+            self.weights = np.resize(self.weights, self.size * 2)
+        self.slots[self.size] = slot
+        self.weights[self.size] = weight
+        self.size += 1
+
+    def remove(self, slot):
+        matches = np.flatnonzero(self.slots[:self.size] == slot)
+        if len(matches) == 0:
+            return
+        last = self.size - 1
+        position = matches[0]
+        self.slots[position] = self.slots[last]
+        self.weights[position] = self.weights[last]
+        self.size = last
+
+
+class SemanticCache:
+    """Cosine-similarity cache of raw replies, bucketed by tone, industry and prompt version
+
+    Vectors live in a fixed-capacity sparse matrix (one row of hashed
+    feature ids and weights per entry). An inverted index over that matrix
+    keeps nearest-neighbour lookups proportional to the entries that share
+    a term with the query rather than to the size of the cache.
+
+    Entries older than ttl_seconds are neither served nor restored.
+    snapshot_tag, if given, is called to name what the cached replies
+    depend on (model, prompt version, ...); a snapshot saved under another
+    tag is dropped instead of loaded.
+    """
+
+    def __init__(self, threshold=0.9, max_entries=100000, max_bytes=64 * 1024 * 1024,
+                 snapshot_path=None, snapshot_every=100, vectorizer=None, ttl_seconds=None, snapshot_tag=None):
+        self.threshold = threshold
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.snapshot_path = snapshot_path
+        self.snapshot_every = snapshot_every
+        self.vectorizer = vectorizer or HashingVectorizer()
+        self.ttl_seconds = ttl_seconds
+        self.snapshot_tag = snapshot_tag
+
+        width = self.vectorizer.max_terms
+        self._indices = np.zeros((max_entries, width), dtype=np.int32)
+        self._weights = np.zeros((max_entries, width), dtype=np.float32)
+        self._buckets = np.full(max_entries, -1, dtype=np.int32)
+        self._last_used = np.full(max_entries, np.inf)
+        self._created = np.zeros(max_entries)
+        self._replies = [None] * max_entries
+        self._free = list(range(max_entries - 1, -1, -1))
+        self._postings = {}
+        self._bucket_ids = {}
+        self._reply_bytes = 0
+        self._unsaved = 0
+        self._lock = threading.RLock()
+        self._save_lock = threading.Lock()
+        self._saver = None
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expired = 0
+
+        if snapshot_path:
+            self.load()
+            atexit.register(self.save)
+
+    def _bucket_id(self, tone, industry, prompt_version=None, create=False):
+        key = f"{tone}\x1f{industry}\x1f{prompt_version or ''}"
+        if key not in self._bucket_ids and create:
+            self._bucket_ids[key] = len(self._bucket_ids)
+        return self._bucket_ids.get(key)
+
+    def get(self, cleaned_message, tone, industry, prompt_version=None):
+        """Return the cached reply closest to cleaned_message, or None"""
+        indices, weights = self.vectorizer.transform(cleaned_message)
+
+        with self._lock:
+            bucket = self._bucket_id(tone, industry, prompt_version)
+            slot, score = self._nearest(bucket, indices, weights)
+
+            if slot is None or score < self.threshold:
+                self.misses += 1
+                return None
+
+            now = time.time()
+            if self._is_expired(self._created[slot], now):
+                self._evict(slot)
+                self.expired += 1
+                self.misses += 1
+                return None
+
+            self._last_used[slot] = now
+            self.hits += 1
+            return self._replies[slot]
+
+    def _is_expired(self, created, now):
+        return self.ttl_seconds is not None and now - created > self.ttl_seconds
+
+    def _nearest(self, bucket, indices, weights):
+        """Best matching slot and its cosine similarity within a bucket"""
+        if bucket is None:
+            return None, 0.0
+
+        slots, products = [], []
+        for feature, weight in zip(indices.tolist(), weights.tolist()):
+            postings = self._postings.get((bucket, feature))
+            if postings is not None and postings.size:
+                slots.append(postings.slots[:postings.size])
+                products.append(postings.weights[:postings.size] * weight)
+
+        if not slots:
+            return None, 0.0
+
+        slots = np.concatenate(slots)
+        scores = np.bincount(slots, weights=np.concatenate(products),
+                             minlength=self.max_entries)
+        best = slots[np.argmax(scores[slots])]
+        return int(best), float(scores[best])
+
+    def put(self, cleaned_message, tone, industry, reply, prompt_version=None):
+        """Store a raw reply, evicting least recently used entries if needed"""
+        indices, weights = self.vectorizer.transform(cleaned_message)
+        if len(indices) == 0 or len(reply) > self.max_bytes:
+            return
+
+        with self._lock:
+            bucket = self._bucket_id(tone, industry, prompt_version, create=True)
+            slot, score = self._nearest(bucket, indices, weights)
+            if slot is not None and score >= 0.9999:
+                self._evict(slot)
+
+            self._reply_bytes += len(reply)
+            while len(self._free) < self.max_entries and (
+                    not self._free or self._reply_bytes > self.max_bytes):
+                self._evict(int(np.argmin(self._last_used)))
+                self.evictions += 1
+
+            slot = self._free.pop()
+            width = len(indices)
+            self._indices[slot, :width] = indices
+            self._weights[slot, :width] = weights
+            self._buckets[slot] = bucket
+            self._last_used[slot] = self._created[slot] = time.time()
+            self._replies[slot] = reply
+            self._index_row(slot)
+
+            self._unsaved += 1
+            if self.snapshot_path and self._unsaved >= self.snapshot_every and not (
+                    self._saver and self._saver.is_alive()):
+                # Written off the request path; lookups only wait for the copy
+                self._saver = threading.Thread(target=self.save, daemon=True)
+                self._saver.start()
+
+    def _index_row(self, slot):
+        bucket = int(self._buckets[slot])
+        for feature, weight in zip(self._indices[slot].tolist(), self._weights[slot].tolist()):
+            if weight == 0:
+                break
+            key = (bucket, feature)
+            if key not in self._postings:
+                self._postings[key] = _Postings()
+            self._postings[key].append(slot, weight)
+
+    def _evict(self, slot):
+        reply = self._replies[slot]
+        if reply is None:
+            return
+
+        bucket = int(self._buckets[slot])
+        for feature, weight in zip(self._indices[slot].tolist(), self._weights[slot].tolist()):
+            if weight == 0:
+                break
+            postings = self._postings.get((bucket, feature))
+            if postings is not None:
+                postings.remove(slot)
+
+        self._reply_bytes -= len(reply)
+        self._indices[slot] = 0
+        self._weights[slot] = 0
+        self._buckets[slot] = -1
+        self._last_used[slot] = np.inf
+        self._created[slot] = 0
+        self._replies[slot] = None
+        self._free.append(slot)
+
+    def save(self):
+        """Write an atomic on-disk snapshot of the cache
+
+        The entries are copied under the lock and written outside it. Both
+        files carry the same snapshot id, so load() never pairs the arrays
+        of one worker's snapshot with another worker's replies.
+        """
+        if not self.snapshot_path:
+            return
+
+        with self._save_lock:
+            with self._lock:
+                used = np.flatnonzero(self._buckets >= 0)
+                arrays = {
+                    'indices': self._indices[used],
+                    'weights': self._weights[used],
+                    'buckets': self._buckets[used],
+                    'last_used': self._last_used[used],
+                    'created': self._created[used],
+                }
+                meta = {
+                    'tag': self.snapshot_tag() if self.snapshot_tag else None,
+                    'n_features': self.vectorizer.n_features,
+                    'buckets': dict(self._bucket_ids),
+                    'replies': [self._replies[slot] for slot in used.tolist()],
+                }
+                self._unsaved = 0
+
+            directory = os.path.dirname(self.snapshot_path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+
+            snapshot_id = f"{os.getpid()}-{time.time_ns()}"
+            meta['snapshot'] = snapshot_id
+            tmp_path = f"{self.snapshot_path}.{os.getpid()}.tmp.npz"
+            np.savez_compressed(tmp_path, snapshot=np.array(snapshot_id), **arrays)
+            meta_tmp_path = f"{self.snapshot_path}.json.{os.getpid()}.tmp"
+            with open(meta_tmp_path, 'w') as f:
+                json.dump(meta, f)
+
+            os.replace(tmp_path, self.snapshot_path + '.npz')
+            os.replace(meta_tmp_path, self.snapshot_path + '.json')
+
+    def load(self):
+        """Restore a snapshot written by save(), if one exists"""
+        try:
+            with open(self.snapshot_path + '.json', 'r') as f:
+                meta = json.load(f)
+            arrays = np.load(self.snapshot_path + '.npz')
+        except (OSError, ValueError) as e:
+            if not isinstance(e, FileNotFoundError):
+                print(f"⚠️ Semantic cache snapshot not loaded: {e}")
+            return
+
+        width = min(arrays['indices'].shape[1], self.vectorizer.max_terms)
+        if meta.get('n_features') != self.vectorizer.n_features or len(arrays['buckets']) != len(meta['replies']):
+            print("⚠️ Semantic cache snapshot does not match this vectorizer, ignoring it")
+            return
+        if 'created' not in arrays.files or meta.get('tag') != (self.snapshot_tag() if self.snapshot_tag else None):
+            print("⚠️ Semantic cache snapshot was saved for another model, prompt version or format, ignoring it")
+            return
+        if 'snapshot' in arrays.files and str(arrays['snapshot']) != meta.get('snapshot'):
+            print("⚠️ Semantic cache snapshot files are from different saves, ignoring them")
+            return
+
+        now = time.time()
+        with self._lock:
+            self._bucket_ids = meta['buckets']
+            # Most recently used entries first, so a smaller cache keeps them
+            order = np.argsort(-arrays['last_used'])
+            for row in order.tolist():
+                if len(self._free) == 0:
+                    break
+                if self._is_expired(arrays['created'][row], now):
+                    continue
+                reply = meta['replies'][row]
+                self._reply_bytes += len(reply)
+                if self._reply_bytes > self.max_bytes:
+                    self._reply_bytes -= len(reply)
+                    break
+
+                slot = self._free.pop()
+                self._indices[slot, :width] = arrays['indices'][row, :width]
+                self._weights[slot, :width] = arrays['weights'][row, :width]
+                self._buckets[slot] = arrays['buckets'][row]
+                self._last_used[slot] = arrays['last_used'][row]
+                self._created[slot] = arrays['created'][row]
+                self._replies[slot] = reply
+                self._index_row(slot)
+
+        print(f"📦 Semantic cache: restored {self.max_entries - len(self._free)} entries")
+
+    def stats(self):
+        """Hit/miss counters for the stats endpoint"""
+        with self._lock:
+            lookups = self.hits + self.misses
+            hit_rate = (self.hits / lookups * 100) if lookups > 0 else 0
+            return {
+                'size': self.max_entries - len(self._free),
+                'max_entries': self.max_entries,
+                'reply_bytes': self._reply_bytes,
+                'threshold': self.threshold,
+                'ttl_seconds': self.ttl_seconds,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'expired': self.expired,
+                'hit_rate': round(hit_rate, 2)
+            }
+
+
+def benchmark(entries=100000, lookups=2000):
+    """Time nearest-neighbour lookups against a full cache"""
+    import random
+
+    random.seed(7)
+    topics = ['refund', 'order', 'delivery', 'shipping', 'cancel', 'subscription',
+              'account', 'password', 'invoice', 'charge', 'broken', 'login', 'package',
+              'tracking', 'return', 'exchange', 'size', 'color', 'discount', 'coupon']
+    vocabulary = topics + [f"word{i}" for i in range(5000)]
+
+    def message():
+        words = random.sample(topics, 2) + random.choices(vocabulary, k=random.randint(3, 12))
+        random.shuffle(words)
+        return ' '.join(words)
+
+    cache = SemanticCache(max_entries=entries, max_bytes=1024 * 1024 * 1024)
+    start = time.perf_counter()
+    for _ in range(entries):
+        cache.put(message(), 'professional', 'e-commerce', 'cached reply')
+    print(f"Filled {entries} entries in {time.perf_counter() - start:.1f}s")
+
+    queries = [message() for _ in range(lookups)]
+    start = time.perf_counter()
+    for query in queries:
+        cache.get(query, 'professional', 'e-commerce')
+    per_lookup = (time.perf_counter() - start) / lookups * 1000
+    print(f"Average lookup: {per_lookup:.3f} ms over {lookups} queries")
+
+
+if __name__ == '__main__':
+    benchmark()
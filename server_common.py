@@ -0,0 +1,500 @@
+"""
+Server Common
+What app_production.py and gemini.py (and app_async.py, through
+app_production) share: log storage and Logger, the per-worker metrics and
+rate limiter, BaseAssistant with everything about a reply except the model
+call, and the request helpers for rate limits, shedding, SSE and batches.
+"""
+
+import contextlib
+import json
+import math
+import os
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import datetime
+
+import config
+from admission import AdmissionController, Overloaded
+from canned_replies import CannedReplies
+from intents import DEFAULT_DEMO_RESPONSE, DEMO_RESPONSES, intent_classifier
+from log_storage import create_storage
+from metrics import Metrics
+from prompt_registry import PromptRegistry
+from providers import Usage
+from rate_limit import RateLimiter, estimate_tokens
+from reply_cache import ReplyCache
+from sanitizer import Sanitizer
+from semantic_cache import SemanticCache
+from single_flight import SingleFlight
+
+# Configuration
+LOG_DIR = "logs"
+os.makedirs(LOG_DIR, exist_ok=True)
+log_storage = create_storage(
+    config.LOG_BACKEND,
+    LOG_DIR,
+    db_path=config.LOG_DB_PATH,
+    max_batch=config.LOG_WRITER_MAX_BATCH,
+    flush_interval=config.LOG_WRITER_FLUSH_INTERVAL
+)
+
+metrics = Metrics()
+rate_limiter = RateLimiter.from_config() if config.RATE_LIMIT_ENABLED else None
+
+
+class DemoMode(Exception):
+    """Raised by the model calls when no provider is configured; the demo reply is used and never cached"""
+
+
+class PendingReply:
+    """One reply on its way through BaseAssistant: what _prepare found, then the model's text"""
+
+    def __init__(self, cleaned_message, settings, prompt, intents, routing, use_cache, ai_response):
+        self.cleaned_message = cleaned_message
+        self.settings = settings
+        self.prompt = prompt
+        self.intents = intents
+        self.routing = routing
+        self.use_cache = use_cache
+        self.ai_response = ai_response
+        self.cached = use_cache and ai_response is not None
+        self.usage = Usage()
+
+
+class BaseAssistant:
+    """Input cleaning, routing, caches, admission and formatting around a model call
+
+    Subclasses set self.model (before calling __init__) and self.providers
+    (a ProviderRouter), and implement _call_model and _stream_model; the
+    reply pipelines only differ in how they call those.
+    """
+
+    def __init__(self):
+        self.max_input_length = 2000
+        self.sanitizer = Sanitizer(max_length=self.max_input_length)
+        self.prompts = PromptRegistry.from_config()
+        self.canned_replies = CannedReplies.from_config(log_storage) if config.CANNED_REPLIES_ENABLED else None
+        self.routers = [self.canned_replies] if self.canned_replies else []
+        self.max_output_length = 1000
+        self.reply_cache = ReplyCache(
+            max_entries=config.REPLY_CACHE_SIZE,
+            ttl_seconds=config.REPLY_CACHE_TTL_SECONDS
+        )
+        self.admission = None
+        self.admission_async = None
+        if config.ADMISSION_ENABLED:
+            self.admission = AdmissionController(
+                max_in_flight=config.ADMISSION_MAX_IN_FLIGHT,
+                max_queue=config.ADMISSION_MAX_QUEUE,
+                deadline_seconds=config.ADMISSION_DEADLINE_SECONDS
+            )
+            self.admission_async = AdmissionController(
+                max_in_flight=config.ADMISSION_ASYNC_MAX_IN_FLIGHT,
+                max_queue=config.ADMISSION_ASYNC_MAX_QUEUE,
+                deadline_seconds=config.ADMISSION_DEADLINE_SECONDS
+            )
+        self.single_flight = None
+        if config.SINGLE_FLIGHT_ENABLED:
+            self.single_flight = SingleFlight(
+                lock_dir=config.SINGLE_FLIGHT_LOCK_DIR,
+                wait_seconds=config.SINGLE_FLIGHT_WAIT_SECONDS
+            )
+        self.semantic_cache = None
+        if config.SEMANTIC_CACHE_ENABLED:
+            self.semantic_cache = SemanticCache(
+                threshold=config.SEMANTIC_CACHE_THRESHOLD,
+                max_entries=config.SEMANTIC_CACHE_MAX_ENTRIES,
+                max_bytes=config.SEMANTIC_CACHE_MAX_BYTES,
+                snapshot_path=config.SEMANTIC_CACHE_SNAPSHOT,
+                ttl_seconds=config.SEMANTIC_CACHE_TTL_SECONDS,
+                snapshot_tag=self._cache_tag
+            )
+
+    def _cache_tag(self):
+        """What the cached replies depend on besides the message and settings (see SemanticCache)"""
+        return json.dumps([self.model, config.PROVIDERS, config.MAX_TOKENS, self.prompts.version])
+
+    def _build_system_prompt(self, tone="professional", industry="general"):
+        """The competitive advantage - your unique AI personality (see prompts/)"""
+        return self.prompts.render(tone, industry).text
+
+    def clean_input(self, message):
+        """Sanitize and validate user input (see sanitizer.py)"""
+        return self.sanitizer.clean(message)
+
+    def generate_reply(self, customer_message, business_name="our team", settings=None, use_cache=True):
+        """Generate an AI reply"""
+        cleaned_message = self.clean_input(customer_message)
+
+        return self._reply_for_cleaned(customer_message, cleaned_message, business_name, settings, use_cache)
+
+    def _reply_for_cleaned(self, customer_message, cleaned_message, business_name, settings, use_cache):
+        """Generate a reply for a message that already passed clean_input"""
+        reply = self._prepare(cleaned_message, settings, use_cache)
+
+        if reply.ai_response is None:
+            try:
+                self._model_replied(reply, self._call_model_coalesced(reply.prompt.text, cleaned_message, reply.usage))
+            except Exception as e:
+                self._model_failed(reply, e)
+
+        return self._result(reply, customer_message, business_name)
+
+    def stream_reply(self, customer_message, business_name="our team", settings=None, use_cache=True):
+        """Stream an AI reply as ('chunk', text) events, then ('done', result)
+
+        The result matches generate_reply; the signature only exists in it.
+        """
+        cleaned_message = self.clean_input(customer_message)
+        reply = self._prepare(cleaned_message, settings, use_cache)
+
+        if reply.ai_response is not None:
+            yield 'chunk', reply.ai_response
+        else:
+            chunks = []
+            try:
+                for chunk in self._stream_model(reply.prompt.text, cleaned_message, reply.usage):
+                    chunks.append(chunk)
+                    yield 'chunk', chunk
+                self._model_replied(reply, ''.join(chunks))
+            except Exception as e:
+                self._model_failed(reply, e, ''.join(chunks))
+                if not chunks:
+                    yield 'chunk', reply.ai_response
+
+        yield 'done', self._result(reply, customer_message, business_name)
+
+    def generate_replies(self, items, max_workers=8):
+        """Generate replies for a batch, yielding (index, result, error) as each finishes
+
+        Items are dicts with message, business_name, settings and use_cache.
+        Every message is cleaned up front; invalid ones are reported straight
+        away and never reach the model.
+        """
+        pending = []
+        for index, item in enumerate(items):
+            try:
+                pending.append((index, item, self.clean_input(item['message'])))
+            except ValueError as e:
+                yield index, None, str(e)
+
+        if not pending:
+            return
+
+        executor = ThreadPoolExecutor(max_workers=min(max_workers, len(pending)))
+        try:
+            futures = {
+                executor.submit(
+                    self._reply_for_cleaned,
+                    item['message'],
+                    cleaned_message,
+                    item['business_name'],
+                    item['settings'],
+                    item['use_cache']
+                ): index
+                for index, item, cleaned_message in pending
+            }
+
+            for future in as_completed(futures):
+                try:
+                    yield futures[future], future.result(), None
+                except Overloaded:
+                    yield futures[future], None, 'The service is busy. Please try again shortly.'
+                except Exception as e:
+                    print(f"Batch item error: {e}")
+                    yield futures[future], None, 'An unexpected error occurred'
+        finally:
+            # Stop queued work if the client goes away mid-batch
+            executor.shutdown(wait=False, cancel_futures=True)
+
+    def _prepare(self, cleaned_message, settings, use_cache):
+        """Render the system prompt, then let the routers or the caches answer if they can
+
+        Routers may answer before the caches and the model; repeat messages
+        and paraphrases are answered from the caches. The signature is
+        still applied per request by _format_response.
+        """
+        settings = settings or {}
+        prompt = self.prompts.render(settings.get('tone', 'professional'), settings.get('industry', 'general business'))
+
+        intents, routed, routing = self._route(cleaned_message, settings)
+        use_cache = use_cache and config.REPLY_CACHE_ENABLED and routed is None
+        ai_response = self._get_cached_response(cleaned_message, settings, prompt.version) if use_cache else routed
+        return PendingReply(cleaned_message, settings, prompt, intents, routing, use_cache, ai_response)
+
+    def _model_replied(self, reply, ai_response):
+        """Take the model's reply text, caching it for repeats and paraphrases
+
+        Only replies that came from a provider get here; shed templates,
+        partial streams and demo replies go through _model_failed.
+        """
+        reply.ai_response = ai_response
+        if reply.use_cache:
+            self._cache_response(reply.cleaned_message, reply.settings, reply.prompt.version, ai_response)
+
+    def _model_failed(self, reply, error, partial=''):
+        """Fall back after a failed model call: a shed template (or Overloaded, re-raised),
+        the text already streamed, or the demo reply
+        """
+        if isinstance(error, Overloaded):
+            reply.ai_response, reply.routing = self._shed_reply(error, reply.intents, reply.settings, reply.routing)
+            return
+        if isinstance(error, DemoMode):
+            print("⚠️ WARNING: Using DEMO responses (no API client)")
+        else:
+            print(f"API Error: {error}")
+        reply.ai_response = partial or self._generate_demo_response(reply.cleaned_message)
+
+    def _result(self, reply, customer_message, business_name):
+        """Result dict of generate_reply (and of the 'done' event of stream_reply)"""
+        return {
+            'reply': self._format_response(reply.ai_response, business_name, reply.settings.get('add_signature', True)),
+            'original_message': customer_message,
+            'cleaned_message': reply.cleaned_message,
+            'settings_used': reply.settings,
+            'cached': reply.cached,
+            'intent': reply.intents[0].name if reply.intents else None,
+            'prompt_version': reply.prompt.version,
+            'routing': reply.routing,
+            'usage': reply.usage.entry()
+        }
+
+    def _route(self, cleaned_message, settings):
+        """Pre-LLM routing hook: classify the message, then offer it to self.routers
+
+        Routers are called as router(cleaned_message, settings, intents) and
+        return (raw reply or None, routing decision or None). A reply skips
+        the caches and the model; the decision is logged with the interaction.
+        """
+        intents = intent_classifier.classify(cleaned_message)
+        routing = None
+        for router in self.routers:
+            ai_response, decision = router(cleaned_message, settings, intents)
+            routing = decision or routing
+            if ai_response is not None:
+                return intents, ai_response, routing
+        return intents, None, routing
+
+    def _get_cached_response(self, cleaned_message, settings, prompt_version):
+        """Look up a raw reply in the exact-match cache, then the semantic cache
+
+        Both are keyed by prompt version, so a hit was written under the
+        version the reply is logged with.
+        """
+        ai_response = self.reply_cache.get(ReplyCache.make_key(cleaned_message, settings, prompt_version))
+
+        # Fall back to a paraphrase match for the same tone, industry and prompt version
+        if ai_response is None and self.semantic_cache:
+            ai_response = self.semantic_cache.get(
+                cleaned_message,
+                settings.get('tone', 'professional'),
+                settings.get('industry', 'general business'),
+                prompt_version
+            )
+        return ai_response
+
+    def _cache_response(self, cleaned_message, settings, prompt_version, ai_response):
+        """Store a raw model reply in both caches, under the prompt version it was written with"""
+        self.reply_cache.set(ReplyCache.make_key(cleaned_message, settings, prompt_version), ai_response)
+        if self.semantic_cache:
+            self.semantic_cache.put(
+                cleaned_message,
+                settings.get('tone', 'professional'),
+                settings.get('industry', 'general business'),
+                ai_response,
+                prompt_version
+            )
+
+    def _shed_reply(self, error, intents, settings, routing):
+        """Template reply for a request shed by admission control; re-raises Overloaded (503) without one"""
+        template = None
+        if self.canned_replies and intents:
+            template = self.canned_replies.template(intents[0].name, settings.get('tone', 'professional'))
+        if template is None:
+            raise error
+        return template, dict(routing or {}, route='degraded', reason=error.reason)
+
+    def _call_model_coalesced(self, system_prompt, message, usage=None):
+        """_call_model, shared by identical concurrent requests (see single_flight.py)
+
+        Only the caller that makes the call gets its usage; the others cost nothing.
+        """
+        if not self.single_flight:
+            return self._call_model(system_prompt, message, usage)
+        key = SingleFlight.make_key(self.model, system_prompt, message)
+        return self.single_flight.do(key, lambda: self._call_model(system_prompt, message, usage))
+
+    def _call_model(self, system_prompt, message, usage=None):
+        """Reply text from the model - raises on API errors, DemoMode without a provider"""
+        raise NotImplementedError
+
+    def _stream_model(self, system_prompt, message, usage=None):
+        """Yield reply text from the model's stream - raises on API errors, DemoMode without a provider"""
+        raise NotImplementedError
+
+    def _admitted(self):
+        """Context holding an admission slot for one model call"""
+        return self.admission.admit() if self.admission else contextlib.nullcontext()
+
+    def _admitted_async(self):
+        """Same for an awaited call, under the async server's own limits"""
+        return self.admission_async.admit_async() if self.admission_async else contextlib.nullcontext()
+
+    def _generate_demo_response(self, message):
+        """Demo fallback when API unavailable"""
+        return DEMO_RESPONSES.get(intent_classifier.top(message), DEFAULT_DEMO_RESPONSE)
+
+    def _format_response(self, ai_response, business_name, add_signature):
+        """Polish the AI output"""
+        formatted = ai_response.strip()
+
+        if add_signature:
+            formatted += f"\n\nBest regards,\n{business_name}"
+
+        if len(formatted) > self.max_output_length:
+            formatted = formatted[:self.max_output_length] + "..."
+
+        return formatted
+
+
+class Logger:
+    """Logging system for continuous improvement"""
+
+    @staticmethod
+    def log_interaction(customer_message, ai_reply, settings, user_edit=None, routing=None, prompt_version=None,
+                        usage=None):
+        """Save interaction for analysis and training"""
+        log_entry = Logger.build_entry(customer_message, ai_reply, settings, user_edit, routing, prompt_version, usage)
+        Logger.log_interactions([log_entry])
+        return log_entry
+
+    @staticmethod
+    def build_entry(customer_message, ai_reply, settings, user_edit=None, routing=None, prompt_version=None,
+                    usage=None):
+        """Build one log record without writing it
+
+        routing is the pre-LLM routing decision (see CannedReplies), if any;
+        prompt_version names the system prompt template (see PromptRegistry);
+        usage is the model call's latency, tokens and cost (see Usage), if one was made.
+        """
+        timestamp = datetime.now().isoformat()
+
+        log_entry = {
+            'timestamp': timestamp,
+            'customer_message': customer_message,
+            'ai_reply': ai_reply,
+            'settings': settings,
+            'user_edit': user_edit,
+            'edited': user_edit is not None,
+            'prompt_version': prompt_version
+        }
+        if routing:
+            log_entry['routing'] = routing
+        if usage:
+            log_entry['usage'] = usage
+        return log_entry
+
+    @staticmethod
+    def log_interactions(log_entries):
+        """Queue log records for the background writer (one group commit)"""
+        log_storage.write(log_entries)
+
+    @staticmethod
+    def get_stats():
+        """Usage and accuracy totals across all logged interactions, plus
+        p50/p95/p99 model latency and cost per tone and industry
+
+        JSONL storage serves these from the incrementally maintained stats
+        index; SQLite storage aggregates them in SQL.
+        """
+        return log_storage.stats()
+
+
+def rate_limit_wait(req, *customer_messages):
+    """Seconds the client must wait before generating replies to these messages (0 = go ahead)"""
+    if not rate_limiter:
+        return 0
+    client = req.remote_addr or 'unknown'
+    if config.RATE_LIMIT_TRUST_PROXY and req.headers.get('X-Forwarded-For'):
+        client = req.headers['X-Forwarded-For'].split(',')[0].strip()
+    tokens = sum(estimate_tokens(message, config.RATE_LIMIT_TOKENS_PER_REQUEST) for message in customer_messages)
+    return rate_limiter.acquire(client, tokens, requests=len(customer_messages))
+
+
+def rate_limited(wait):
+    """429 response with Retry-After (Flask and Quart both send a dict as JSON)"""
+    metrics.incr('generate_reply.rate_limited')
+    retry_after = math.ceil(wait)
+    return {
+        'success': False,
+        'error': f'Rate limit exceeded. Try again in {retry_after} seconds.'
+    }, 429, {'Retry-After': str(retry_after)}
+
+
+def overloaded(error):
+    """503 response with Retry-After for a request shed by admission control"""
+    metrics.incr('generate_reply.shed')
+    return {
+        'success': False,
+        'error': 'The service is busy. Please try again shortly.'
+    }, 503, {'Retry-After': str(math.ceil(error.retry_after))}
+
+
+def sse_event(event, data):
+    """Format one Server-Sent Event"""
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+
+def parse_batch(data):
+    """Turn a /api/generate-replies body into batch items
+
+    Top-level business_name/tone/industry/add_signature are defaults that
+    each entry in 'messages' (an object or a plain string) can override.
+    """
+    messages = data.get('messages')
+    if not isinstance(messages, list) or not messages:
+        raise ValueError("messages must be a non-empty list")
+    if len(messages) > config.BATCH_MAX_ITEMS:
+        raise ValueError(f"A batch can contain at most {config.BATCH_MAX_ITEMS} messages")
+
+    return [batch_item(entry, data) for entry in messages]
+
+
+def batch_item(entry, defaults=None):
+    """Normalize one batch entry (an object or a plain string) into an item"""
+    if not isinstance(entry, dict):
+        entry = {'message': entry}
+    item_data = {**(defaults or {}), **entry}
+
+    return {
+        'id': entry.get('id'),
+        'message': item_data.get('message') or '',
+        'business_name': item_data.get('business_name', 'Our Support Team'),
+        'settings': {
+            'tone': item_data.get('tone', 'professional'),
+            'industry': item_data.get('industry', 'general business'),
+            'add_signature': item_data.get('add_signature', True)
+        },
+        'use_cache': not item_data.get('bypass_cache', False)
+    }
+
+
+def batch_result_line(item, index, result, error):
+    """One NDJSON line for a finished batch item"""
+    if error is not None:
+        line = {'index': index, 'id': item['id'], 'success': False, 'error': error}
+    else:
+        line = {
+            'index': index,
+            'id': item['id'],
+            'success': True,
+            'reply': result['reply'],
+            'metadata': {
+                'cleaned_message': result['cleaned_message'],
+                'settings_used': result['settings_used'],
+                'cached': result['cached'],
+                'intent': result['intent'],
+                'prompt_version': result['prompt_version']
+            }
+        }
+    return json.dumps(line) + '\n'
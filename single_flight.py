@@ -0,0 +1,183 @@
+"""
+Single Flight
+Coalesces identical concurrent model calls: the first caller makes the
+call and everyone asking for the same key meanwhile gets its result.
+
+With a lock directory, gunicorn workers coalesce with each other too: the
+worker holding a key's file lock makes the call and leaves the reply in a
+result file for the workers waiting on that lock (Unix only, uses fcntl).
+"""
+
+import asyncio
+import hashlib
+import json
+import os
+import threading
+import time
+
+
+class _Call:
+    """One in-flight call that followers wait on"""
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class SingleFlight:
+    """Per-key call deduplication for threads, asyncio tasks and (optionally) workers"""
+
+    def __init__(self, lock_dir=None, wait_seconds=60, result_ttl=60):
+        self.lock_dir = lock_dir
+        self.wait_seconds = wait_seconds
+        self.result_ttl = result_ttl
+        self._calls = {}
+        self._async_calls = {}
+        self._lock = threading.Lock()
+        self._next_prune = 0
+        self.calls = 0
+        self.coalesced = 0
+        self.cross_worker = 0
+        if lock_dir:
+            os.makedirs(lock_dir, exist_ok=True)
+
+    @staticmethod
+    def make_key(*parts):
+        """Stable key for everything the upstream call depends on"""
+        return hashlib.sha256(json.dumps(parts).encode('utf-8')).hexdigest()
+
+    def do(self, key, fn):
+        """Return fn(), unless a call for key is in flight - then wait and share its result"""
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+            else:
+                self.coalesced += 1
+
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        try:
+            call.result = self._run_shared(key, fn) if self.lock_dir else self._run(fn)
+            return call.result
+        except Exception as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+
+    async def do_async(self, key, coro_fn):
+        """Async do(): tasks in this event loop share one call (no cross-worker mode)"""
+        task = self._async_calls.get(key)
+        if task is None:
+            with self._lock:
+                self.calls += 1
+            task = asyncio.ensure_future(coro_fn())
+            self._async_calls[key] = task
+            task.add_done_callback(lambda done: self._forget_async(key, done))
+        else:
+            with self._lock:
+                self.coalesced += 1
+
+        # A caller that goes away does not cancel the call for the others
+        return await asyncio.shield(task)
+
+    def _forget_async(self, key, task):
+        self._async_calls.pop(key, None)
+        if not task.cancelled():
+            task.exception()  # Marks an error nobody awaited as retrieved
+
+    def _run(self, fn):
+        with self._lock:
+            self.calls += 1
+        return fn()
+
+    def _run_shared(self, key, fn):
+        """Leader across workers: whoever holds the key's file lock makes the call"""
+        import fcntl
+
+        started = time.time()
+        lock_path = os.path.join(self.lock_dir, f'{key}.lock')
+        result_path = os.path.join(self.lock_dir, f'{key}.json')
+
+        with open(lock_path, 'a') as lock_file:
+            os.utime(lock_path)  # Marks the lock as in use for _maybe_prune
+            deadline = time.monotonic() + self.wait_seconds
+            while True:
+                try:
+                    fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                    break
+                except BlockingIOError:
+                    if time.monotonic() > deadline:
+                        # Stop waiting on a stuck worker and make our own call
+                        return self._run(fn)
+                    time.sleep(0.02)
+
+            try:
+                # Another worker finished this call while we waited for the lock
+                result = self._read_result(result_path, started)
+                if result is not None:
+                    with self._lock:
+                        self.cross_worker += 1
+                    return result['reply']
+
+                reply = self._run(fn)
+                if isinstance(reply, str):
+                    self._write_result(result_path, reply)
+                return reply
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+                self._maybe_prune()
+
+    @staticmethod
+    def _read_result(result_path, since):
+        try:
+            if os.path.getmtime(result_path) < since:
+                return None
+            with open(result_path, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    @staticmethod
+    def _write_result(result_path, reply):
+        tmp_path = f"{result_path}.{os.getpid()}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump({'reply': reply}, f)
+        os.replace(tmp_path, result_path)
+
+    def _maybe_prune(self):
+        """Delete files of keys unused for longer than any wait, at most once per result_ttl"""
+        now = time.time()
+        if now < self._next_prune:
+            return
+        self._next_prune = now + self.result_ttl
+        cutoff = now - self.result_ttl - self.wait_seconds
+        for filename in os.listdir(self.lock_dir):
+            path = os.path.join(self.lock_dir, filename)
+            try:
+                if os.path.getmtime(path) < cutoff:
+                    os.remove(path)
+            except OSError:
+                continue
+
+    def stats(self):
+        """Upstream calls made vs calls saved by sharing another caller's result"""
+        with self._lock:
+            saved = self.coalesced + self.cross_worker
+            return {
+                'calls': self.calls,
+                'saved_calls': saved,
+                'coalesced_in_process': self.coalesced,
+                'coalesced_across_workers': self.cross_worker,
+                'in_flight': len(self._calls) + len(self._async_calls),
+                'saved_rate': round(saved / (self.calls + saved) * 100, 2) if self.calls + saved else 0
+            }
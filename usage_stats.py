@@ -0,0 +1,160 @@
+"""
+Usage Stats
+Latency, token and cost aggregates over the 'usage' field of log entries
+(see providers.Usage), shared by /api/stats and analyze_log.py
+
+A group is a JSON dict of running sums plus latency and time-to-first-
+token sketches (quantiles.py), so groups can be saved, merged and
+subtracted like the other counters. Cost is summed in whole micro-dollars
+so every engine adds it up to the same total.
+"""
+
+import numpy as np
+
+from quantiles import QuantileSketch, empty_sketch
+
+TOKEN_KEYS = ('input_tokens', 'output_tokens', 'cached_tokens')
+# Per-row arrays for the columnar engines; requests is 1 for rows that
+# called a model, whose latency may still be NaN (batch API results)
+USAGE_COLUMNS = ('latency_ms', 'ttft_ms') + TOKEN_KEYS + ('cost_micro_usd', 'requests')
+
+
+def empty_usage():
+    return {
+        'requests': 0,
+        'input_tokens': 0,
+        'output_tokens': 0,
+        'cached_tokens': 0,
+        'cost_micro_usd': 0,
+        'latency_ms': empty_sketch(),
+        'ttft_ms': empty_sketch()
+    }
+
+
+def micro_usd(cost_usd):
+    return round((cost_usd or 0) * 1e6)
+
+
+def add_usage(group, usage, sign=1):
+    """Count one log entry's usage in a group"""
+    group['requests'] += sign
+    for key in TOKEN_KEYS:
+        group[key] += sign * (usage.get(key) or 0)
+    group['cost_micro_usd'] += sign * micro_usd(usage.get('cost_usd'))
+    for key in ('latency_ms', 'ttft_ms'):
+        if usage.get(key) is not None:
+            QuantileSketch(group[key]).add(usage[key], sign)
+
+
+def merge_usage(target, group, sign=1):
+    for key in ('requests', 'cost_micro_usd') + TOKEN_KEYS:
+        target[key] += sign * group[key]
+    for key in ('latency_ms', 'ttft_ms'):
+        QuantileSketch(target[key]).merge(group[key], sign)
+
+
+def empty_usage_counts():
+    """Usage overall and per tone and industry"""
+    return {'overall': empty_usage(), 'by_tone': {}, 'by_industry': {}}
+
+
+def add_usage_counts(counts, log_entry, sign=1):
+    """Count a log entry in usage counts, if it called a model"""
+    usage = log_entry.get('usage')
+    if not usage:
+        return
+    settings = log_entry.get('settings') or {}
+    add_usage(counts['overall'], usage, sign)
+    for key, value in (('by_tone', settings.get('tone', 'unknown')),
+                       ('by_industry', settings.get('industry', 'unknown'))):
+        add_usage(counts[key].setdefault(value, empty_usage()), usage, sign)
+
+
+def merge_usage_counts(target, counts, sign=1):
+    merge_usage(target['overall'], counts['overall'], sign)
+    for key in ('by_tone', 'by_industry'):
+        for value, group in counts[key].items():
+            merge_usage(target[key].setdefault(value, empty_usage()), group, sign)
+
+
+def usage_report(group):
+    """p50/p95/p99 latency and TTFT (ms), tokens and cost of a group"""
+    requests, cost = group['requests'], group['cost_micro_usd'] / 1e6
+    return {
+        'requests': requests,
+        'latency_ms': QuantileSketch(group['latency_ms']).percentiles(),
+        'ttft_ms': QuantileSketch(group['ttft_ms']).percentiles(),
+        'input_tokens': group['input_tokens'],
+        'output_tokens': group['output_tokens'],
+        'cached_tokens': group['cached_tokens'],
+        'cost_usd': round(cost, 4),
+        'avg_cost_usd': round(cost / requests, 6) if requests else 0
+    }
+
+
+def usage_summary(counts):
+    """Reports for usage counts, overall and per tone and industry"""
+    return {
+        'overall': usage_report(counts['overall']),
+        'by_tone': {value: usage_report(group) for value, group in counts['by_tone'].items() if group['requests'] > 0},
+        'by_industry': {
+            value: usage_report(group) for value, group in counts['by_industry'].items() if group['requests'] > 0
+        }
+    }
+
+
+def usage_row(log_entry):
+    """One entry's values for USAGE_COLUMNS"""
+    usage = log_entry.get('usage')
+    if not usage:
+        return (np.nan, np.nan, 0, 0, 0, 0, 0)
+    latency, ttft = usage.get('latency_ms'), usage.get('ttft_ms')
+    return (
+        latency if latency is not None else np.nan,
+        ttft if ttft is not None else np.nan,
+        usage.get('input_tokens') or 0,
+        usage.get('output_tokens') or 0,
+        usage.get('cached_tokens') or 0,
+        micro_usd(usage.get('cost_usd')),
+        1
+    )
+
+
+def usage_arrays(rows):
+    """{column: array} for a list of usage_row() tuples"""
+    table = np.array(rows, dtype=np.float64).reshape(-1, len(USAGE_COLUMNS))
+    return {
+        name: table[:, i].astype(np.float64 if name.endswith('_ms') else np.int64)
+        for i, name in enumerate(USAGE_COLUMNS)
+    }
+
+
+def usage_groups(codes, values, columns):
+    """{value: group} from per-row codes of a string column and USAGE_COLUMNS arrays
+
+    Groups are ordered by their first row with a model call, as in a loop.
+    """
+    called = (columns['requests'] > 0) & (codes >= 0)
+    present, first = np.unique(codes[called], return_index=True)
+    groups = {}
+    for code in present[np.argsort(first)]:
+        rows = called & (codes == code)
+        group = groups[values[code]] = empty_usage()
+        group['requests'] = int(rows.sum())
+        for key in TOKEN_KEYS + ('cost_micro_usd',):
+            group[key] = int(columns[key][rows].sum())
+        for key in ('latency_ms', 'ttft_ms'):
+            timings = columns[key][rows]
+            QuantileSketch(group[key]).add_many(timings[~np.isnan(timings)])
+    return groups
+
+
+def usage_counts_from_columns(tone, industry, columns):
+    """Usage counts from (codes, values) of the tone and industry columns and USAGE_COLUMNS arrays"""
+    counts = empty_usage_counts()
+    counts['by_tone'] = usage_groups(*tone, columns)
+    counts['by_industry'] = usage_groups(*industry, columns)
+    # Every call has a tone, so the overall group is the sum over tones
+    for group in counts['by_tone'].values():
+        merge_usage(counts['overall'], group)
+    return counts